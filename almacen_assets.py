@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Almacén de assets direccionado por contenido (fotos, PDFs, logos)
+- Cada archivo se guarda una sola vez como assets/<hash>.<ext>: las copias
+  repetidas (raíz del repo e imgs/) quedan deduplicadas
+- Las URLs cambian cuando cambia el contenido, así se pueden cachear para siempre
+- reescribir_catalogo() cambia fotos y documentos del catálogo por esas URLs
+
+    python almacen_assets.py --catalogo propiedades.json --salida assets
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from typing import Dict, Iterable, List, Optional
+
+ASSETS_DIR = 'assets'
+MANIFEST_NAME = 'manifest.json'
+
+# Carpetas (relativas a la base) donde se buscan assets además de los del catálogo
+SCAN_DIRS = ['.', 'imgs']
+ASSET_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.svg', '.pdf'}
+
+HASH_LENGTH = 20
+ASSET_NAME = re.compile(r'^[0-9a-f]{%d}\.[a-z0-9]{1,5}$' % HASH_LENGTH)
+
+
+def content_hash(path: str) -> str:
+    """SHA-256 del archivo (truncado), leído por bloques"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def _resolver(base_dir: str, ruta: str) -> Optional[str]:
+    """Ruta real del archivo; tolera diferencias de mayúsculas en el nombre"""
+    completa = os.path.join(base_dir, ruta)
+    if os.path.isfile(completa):
+        return completa
+    carpeta, nombre = os.path.split(completa)
+    try:
+        for candidato in os.listdir(carpeta or '.'):
+            if candidato.lower() == nombre.lower():
+                return os.path.join(carpeta, candidato)
+    except OSError:
+        pass
+    return None
+
+
+def catalog_references(propiedades: Iterable[Dict]) -> List[str]:
+    """Rutas de fotos y documentos del catálogo, sin repetir y en orden"""
+    vistas = {}
+    for propiedad in propiedades:
+        for campo in ('fotos', 'documentos'):
+            for ruta in propiedad.get(campo) or []:
+                if isinstance(ruta, str) and ruta and '://' not in ruta:
+                    vistas.setdefault(ruta, None)
+    return list(vistas)
+
+
+def _archivos_sueltos(base_dir: str) -> List[str]:
+    """Assets de las carpetas habituales (rutas relativas a base_dir)"""
+    rutas = []
+    for carpeta in SCAN_DIRS:
+        directorio = os.path.join(base_dir, carpeta)
+        if not os.path.isdir(directorio):
+            continue
+        for nombre in sorted(os.listdir(directorio)):
+            if os.path.splitext(nombre)[1].lower() in ASSET_EXTENSIONS:
+                if os.path.isfile(os.path.join(directorio, nombre)):
+                    rutas.append(os.path.normpath(os.path.join(carpeta, nombre)).replace(os.sep, '/'))
+    return rutas
+
+
+def _guardar(origen: str, destino: str):
+    """Copia única del contenido (hard link si se puede)"""
+    if os.path.exists(destino):
+        return
+    temporal = f"{destino}.{os.getpid()}.tmp"
+    try:
+        os.link(origen, temporal)
+    except OSError:
+        shutil.copyfile(origen, temporal)
+    os.replace(temporal, destino)
+
+
+def build_assets(catalogo: str = 'propiedades.json', salida: str = ASSETS_DIR,
+                 base_dir: Optional[str] = None) -> Dict:
+    """Guarda cada asset una sola vez por contenido y escribe el manifest
+
+    El manifest relaciona cada ruta original (relativa a base_dir) con el
+    nombre direccionado por contenido dentro de `salida`.
+    """
+    base_dir = base_dir if base_dir is not None else os.path.dirname(os.path.abspath(catalogo))
+    with open(catalogo, 'r', encoding='utf-8') as f:
+        propiedades = json.load(f)
+    os.makedirs(salida, exist_ok=True)
+
+    referencias = catalog_references(propiedades)
+    rutas = list(dict.fromkeys(referencias + _archivos_sueltos(base_dir)))
+
+    archivos: Dict[str, str] = {}     # ruta original -> nombre del asset
+    tamanos: Dict[str, int] = {}      # nombre del asset -> bytes
+    faltantes = []
+    bytes_totales = 0
+    for ruta in rutas:
+        origen = _resolver(base_dir, ruta)
+        if origen is None:
+            if ruta in referencias:
+                faltantes.append(ruta)
+            continue
+        extension = os.path.splitext(origen)[1].lower() or '.bin'
+        nombre = content_hash(origen) + extension
+        _guardar(origen, os.path.join(salida, nombre))
+        archivos[ruta] = nombre
+        tamano = os.path.getsize(origen)
+        tamanos[nombre] = tamano
+        bytes_totales += tamano
+
+    manifest = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'files': archivos,
+    }
+    temporal = os.path.join(salida, MANIFEST_NAME + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, os.path.join(salida, MANIFEST_NAME))
+
+    manifest['stats'] = {
+        'files': len(archivos),
+        'unique': len(tamanos),
+        'bytes_saved': bytes_totales - sum(tamanos.values()),
+        'missing': faltantes,
+    }
+    return manifest
+
+
+def load_manifest(salida: str = ASSETS_DIR) -> Dict:
+    """Manifest de assets ({} si todavía no se generó)"""
+    try:
+        with open(os.path.join(salida, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def rewrite_catalog(propiedades: Iterable[Dict], manifest: Dict, url_prefix: str = 'assets/') -> List[Dict]:
+    """Copias de las propiedades con fotos y documentos apuntando a URLs inmutables
+
+    Las claves de 'fotos_variantes' siguen a la foto, para que el front
+    encuentre las variantes con la URL nueva.
+    """
+    archivos = manifest.get('files', {}) if manifest else {}
+
+    def url(ruta):
+        nombre = archivos.get(ruta) if isinstance(ruta, str) else None
+        return url_prefix + nombre if nombre else ruta
+
+    resultado = []
+    for propiedad in propiedades:
+        propiedad = dict(propiedad)
+        for campo in ('fotos', 'documentos'):
+            if isinstance(propiedad.get(campo), list):
+                propiedad[campo] = [url(ruta) for ruta in propiedad[campo]]
+        if isinstance(propiedad.get('fotos_variantes'), dict):
+            propiedad['fotos_variantes'] = {url(foto): v for foto, v in propiedad['fotos_variantes'].items()}
+        resultado.append(propiedad)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera el almacén de assets deduplicado por contenido')
+    parser.add_argument('--catalogo', default='propiedades.json')
+    parser.add_argument('--salida', default=ASSETS_DIR)
+    args = parser.parse_args()
+
+    manifest = build_assets(args.catalogo, args.salida)
+    stats = manifest['stats']
+    print(f"📦 {stats['files']} archivos -> {stats['unique']} assets únicos "
+          f"({stats['bytes_saved'] / 1024 / 1024:.1f} MB de duplicados)")
+    for ruta in stats['missing']:
+        print(f"⚠️ No existe: {ruta}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Almacén de consultas (leads) como log append-only en JSON Lines
+- Cada consulta es una línea: guardar cuesta O(1) sin importar el historial
+- Group commit: las escrituras concurrentes se juntan en un solo write + fsync
+- Segmentos que rotan por tamaño; al juntarse compact_after cerrados se unen
+  en un solo archivo en segundo plano
+- Importa consultas_completas.json (formato anterior) la primera vez, de forma atómica
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import registro
+
+logger = registro.get_logger('almacen_consultas')
+
+SEGMENT_PREFIX = 'consultas-'
+SEGMENT_SUFFIX = '.jsonl'
+
+# Segmento a medio importar: no coincide con el patrón de los segmentos
+IMPORT_SUFFIX = '.import'
+
+# Reintentos de un listener que falla antes de desconectarlo (espera inicial en segundos)
+LISTENER_RETRIES = 3
+LISTENER_RETRY_DELAY = 0.05
+
+
+class LeadStore:
+    """Log de consultas en segmentos JSONL con commits agrupados"""
+
+    def __init__(self, directory: str = 'consultas_log', flush_interval: float = 0.01,
+                 fsync: bool = True, segment_max_bytes: int = 64 * 1024 * 1024,
+                 compact_after: int = 8, legacy_file: Optional[str] = 'consultas_completas.json'):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_after = compact_after  # segmentos cerrados que disparan compact() (0 = nunca)
+        os.makedirs(directory, exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._pending: List[tuple] = []   # (secuencia, línea, consulta)
+        self._next_seq = 1
+        self._done_seq = 0                 # última secuencia procesada (escrita o fallida)
+        self._failed: List[tuple] = []     # (desde, hasta, error) de lotes que fallaron
+        self._committer: Optional[threading.Thread] = None
+        self._closing = False
+        self._segment_lock = threading.Lock()  # protege la lista de segmentos
+        self._compact_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+
+        self.commits = 0
+        self.records_written = 0
+
+        # Funciones que reciben cada lote ya guardado (índices, estadísticas...).
+        # Deben ser idempotentes ante un reintento del mismo lote (p. ej. una transacción).
+        self.listeners: List[Callable[[List[Dict]], None]] = []
+        # Listeners que fallaron todos los reintentos: ya no reciben lotes
+        self.detached: List[Callable[[List[Dict]], None]] = []
+
+        # El primer segmento aparece recién cuando la importación terminó:
+        # si el proceso se corta a mitad, el próximo arranque la repite completa
+        segments = self.segments()
+        if not segments and legacy_file and os.path.exists(legacy_file):
+            self._import_legacy(legacy_file, self._segment_path(1))
+            segments = self.segments()
+        self._segment_number = self._number(segments[-1]) if segments else 1
+        self._file = self._open_segment(self._segment_number)
+
+    # ------------------------------------------------------------------
+    # Segmentos
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+    @staticmethod
+    def _number(path: str) -> int:
+        nombre = os.path.basename(path)
+        return int(nombre[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    def _open_segment(self, number: int):
+        """Abre un segmento para agregar, cerrando una línea que quedó cortada"""
+        path = self._segment_path(number)
+        with open(path, 'ab') as f:
+            if f.tell() > 0:
+                with open(path, 'rb') as lectura:
+                    lectura.seek(-1, os.SEEK_END)
+                    if lectura.read(1) != b'\n':
+                        f.write(b'\n')
+        return open(path, 'a', encoding='utf-8')
+
+    def segments(self) -> List[str]:
+        """Segmentos existentes, del más viejo al más nuevo"""
+        patron = os.path.join(self.directory, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+        return sorted(glob.glob(patron), key=self._number)
+
+    def _rotate_if_needed(self):
+        """Abre un segmento nuevo si el actual superó el tamaño máximo"""
+        if self._file.tell() < self.segment_max_bytes:
+            return
+        with self._segment_lock:
+            self._file.close()
+            self._segment_number += 1
+            self._file = self._open_segment(self._segment_number)
+            cerrados = len(self.segments()) - 1
+
+        # Muchos segmentos cerrados: se unen en segundo plano, sin frenar los commits
+        if self.compact_after and cerrados >= self.compact_after:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self._compact_background,
+                                                   name='lead-store-compact', daemon=True)
+                self._compactor.start()
+
+    def _compact_background(self):
+        try:
+            total = self.compact()
+            registro.log_event(logger, 'leads_compacted', consultas=total, segments=len(self.segments()))
+        except Exception as e:
+            registro.log_event(logger, 'leads_compact_failed', logging.ERROR, exc_info=True, error=str(e))
+
+    def compact(self) -> int:
+        """Une los segmentos cerrados en un solo archivo, descartando líneas cortadas
+
+        Solo reduce la cantidad de archivos: el log no tiene registros
+        repetidos ni borrados, así que todas las consultas se conservan en el
+        mismo orden. El segmento activo no se toca. Se dispara sola al rotar
+        (compact_after) y también se puede llamar a mano. Devuelve la cantidad
+        de registros del resultado.
+        """
+        with self._compact_lock:
+            with self._segment_lock:
+                cerrados = [s for s in self.segments() if self._number(s) < self._segment_number]
+            if len(cerrados) < 2:
+                return 0
+
+            # Los segmentos cerrados no cambian: se unen sin bloquear escrituras.
+            # El resultado toma el número del último para conservar el orden.
+            destino = cerrados[-1]
+            temporal = destino + '.compact'
+            total = 0
+            with open(temporal, 'w', encoding='utf-8') as out:
+                for segmento in cerrados:
+                    for consulta in self._read_segment(segmento):
+                        out.write(json.dumps(consulta, ensure_ascii=False) + '\n')
+                        total += 1
+                out.flush()
+                os.fsync(out.fileno())
+
+            with self._segment_lock:
+                os.replace(temporal, destino)
+                for segmento in cerrados[:-1]:
+                    os.remove(segmento)
+            return total
+
+    # ------------------------------------------------------------------
+    # Escritura con group commit
+    # ------------------------------------------------------------------
+
+    def _start_committer(self):
+        if self._committer is None or not self._committer.is_alive():
+            self._committer = threading.Thread(target=self._commit_loop, name='lead-store-commit', daemon=True)
+            self._committer.start()
+
+    def append(self, consulta: Dict, wait: bool = True):
+        """Agrega una consulta; con wait=True vuelve cuando ya está en disco"""
+        line = json.dumps(consulta, ensure_ascii=False) + '\n'
+        with self._cond:
+            if self._closing:
+                raise RuntimeError('El almacén de consultas está cerrado')
+            self._start_committer()
+            seq = self._next_seq
+            self._next_seq += 1
+            self._pending.append((seq, line, consulta))
+            self._cond.notify_all()
+            if wait:
+                while self._done_seq < seq:
+                    self._cond.wait()
+                for desde, hasta, error in self._failed:
+                    if desde <= seq <= hasta:
+                        raise IOError(f"No se pudo guardar la consulta: {error}")
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending and self._closing:
+                    return
+
+            # Ventana de agrupación: deja que lleguen más escrituras concurrentes
+            if self.flush_interval > 0:
+                time.sleep(self.flush_interval)
+
+            with self._cond:
+                lote, self._pending = self._pending, []
+            error = None
+            try:
+                self._file.write(''.join(line for _, line, _ in lote))
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                self._rotate_if_needed()
+            except Exception as e:
+                error = e
+                registro.log_event(logger, 'leads_write_failed', logging.ERROR, consultas=len(lote), error=str(e))
+
+            if error is None:
+                consultas = [consulta for _, _, consulta in lote]
+                for listener in list(self.listeners):
+                    self._notify(listener, consultas)
+
+            with self._cond:
+                self._done_seq = lote[-1][0]
+                if error is None:
+                    self.commits += 1
+                    self.records_written += len(lote)
+                else:
+                    self._failed = self._failed[-99:] + [(lote[0][0], lote[-1][0], error)]
+                self._cond.notify_all()
+
+    def _notify(self, listener: Callable[[List[Dict]], None], consultas: List[Dict]):
+        """Entrega un lote a un listener, con reintentos
+
+        Si sigue fallando se desconecta en vez de saltear el lote: un listener
+        que recibiera los lotes siguientes quedaría con un hueco sin saberlo.
+        Quien lo alimentaba debe ponerse al día desde el log (p. ej. al reiniciar).
+        """
+        for intento in range(LISTENER_RETRIES + 1):
+            try:
+                listener(consultas)
+                return
+            except Exception as e:
+                if intento < LISTENER_RETRIES:
+                    registro.log_event(logger, 'leads_index_failed', logging.WARNING,
+                                       intento=intento + 1, consultas=len(consultas), error=str(e))
+                    time.sleep(LISTENER_RETRY_DELAY * (2 ** intento))
+                else:
+                    registro.log_event(logger, 'leads_listener_detached', logging.ERROR, exc_info=True,
+                                       listener=getattr(listener, '__qualname__', repr(listener)), error=str(e))
+        self.listeners.remove(listener)
+        self.detached.append(listener)
+
+    def flush(self):
+        """Espera a que todo lo encolado esté procesado"""
+        with self._cond:
+            objetivo = self._next_seq - 1
+            while self._done_seq < objetivo:
+                self._cond.wait()
+
+    def close(self):
+        """Vacía lo pendiente y cierra el segmento activo"""
+        self.flush()
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._committer is not None:
+            self._committer.join(timeout=5)
+        if self._compactor is not None:
+            self._compactor.join()
+        self._file.close()
+
+    # ------------------------------------------------------------------
+    # Lectura e importación
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _read_segment(path: str) -> Iterator[Dict]:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from LeadStore._read_lines(f)
+
+    @staticmethod
+    def _read_lines(f) -> Iterator[Dict]:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Línea incompleta (p. ej. corte durante una escritura)
+                continue
+
+    def iter_consultas(self) -> Iterator[Dict]:
+        """Recorre todas las consultas en orden de llegada sin cargarlas en memoria"""
+        # Se abren todos los segmentos juntos: aunque una compactación los
+        # reemplace o borre mientras se recorren, los archivos abiertos
+        # conservan la versión del momento de la lectura
+        with self._segment_lock:
+            archivos = [open(segmento, 'r', encoding='utf-8') for segmento in self.segments()]
+        try:
+            for f in archivos:
+                yield from self._read_lines(f)
+        finally:
+            for f in archivos:
+                f.close()
+
+    def _import_legacy(self, path: str, destino: str) -> int:
+        """Importa el archivo del formato anterior como primer segmento
+
+        Se escribe en un archivo temporal y se renombra al terminar, así un
+        corte a mitad no deja un segmento parcial que impida reintentar.
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            consultas = json.load(f)
+        temporal = destino + IMPORT_SUFFIX
+        with open(temporal, 'w', encoding='utf-8') as out:
+            for consulta in consultas:
+                out.write(json.dumps(consulta, ensure_ascii=False) + '\n')
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporal, destino)
+        registro.log_event(logger, 'leads_legacy_imported', consultas=len(consultas), path=path)
+        return len(consultas)
+
+    def import_json(self, path: str) -> int:
+        """Agrega al log las consultas de un archivo JSON con una lista (formato anterior)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            consultas = json.load(f)
+        for consulta in consultas:
+            self.append(consulta, wait=False)
+        self.flush()
+        return len(consultas)
+
+    def stats(self) -> Dict:
+        """Contadores del almacén"""
+        return {
+            'segments': len(self.segments()),
+            'commits': self.commits,
+            'records_written': self.records_written,
+            'avg_batch': round(self.records_written / self.commits, 2) if self.commits else 0,
+            'detached_listeners': len(self.detached),
+        }
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del motor del chatbot con catálogos sintéticos
+- Catálogos deterministas con el esquema de propiedades.json (1k, 10k, 100k, 1M)
+- Corpus de consultas reales en español (búsquedas, seguimientos y saludos)
+- Mide ops/seg, latencia p50/p99 y memoria pico (tracemalloc) por operación
+- Guarda los resultados en JSON para comparar corridas
+
+    python benchmark_chatbot.py --tamanos 1000,10000 --salida bench.json
+    python benchmark_chatbot.py --tamanos 1000,10000 --comparar bench.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Sin vigilante de catálogo ni workers del webhook durante las mediciones
+os.environ.setdefault('CATALOG_RELOAD_INTERVAL', '0')
+os.environ.setdefault('WEBHOOK_MODE', 'sync')
+
+from corpus_consultas import FOLLOW_UPS, GREETINGS, QUERY_CORPUS  # noqa: E402
+from whatsapp_chatbot import ChatbotAI, WhatsAppChatbot, WhatsAppResponseGenerator  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_SEED = 20240601
+
+BARRIOS = [
+    'Palermo', 'Palermo Soho', 'Palermo Hollywood', 'Microcentro', 'Recoleta', 'Núñez',
+    'Belgrano', 'Caballito', 'Villa Crespo', 'San Telmo', 'Retiro', 'Abasto', 'Almagro',
+    'Parque Avellaneda', 'Boedo', 'Colegiales', 'Villa Urquiza', 'Flores', 'Saavedra',
+]
+TIPOS = ['departamento', 'casa', 'monoambiente', 'ph', 'oficina', 'local', 'terreno', 'cochera']
+OPERACIONES = ['venta', 'alquiler']
+ESTADOS = ['Excelente', 'Muy bueno', 'Bueno', 'A reciclar']
+ORIENTACIONES = ['Norte', 'Sur', 'Este', 'Oeste']
+CALLES = ['Av. Corrientes', 'Av. Santa Fe', 'Espinillo', 'Av. Cabildo', 'Gurruchaga',
+          'Billinghurst', 'Av. Rivadavia', 'Defensa', 'Juramento', 'Av. Triunvirato']
+ADJETIVOS = ['luminoso', 'amplio', 'reciclado', 'moderno', 'a estrenar', 'con vista abierta',
+             'silencioso', 'de categoría', 'en esquina', 'contrafrente']
+AMBIENTES_DESC = ['terraza', 'parrilla', 'jardín', 'balcón aterrazado', 'quincho', 'lavadero',
+                  'dependencia de servicio', 'vestidor', 'patio', 'solarium']
+
+
+# ----------------------------------------------------------------------
+# Catálogo sintético
+# ----------------------------------------------------------------------
+
+def generar_propiedades(cantidad: int, seed: int = DEFAULT_SEED) -> Iterator[Dict]:
+    """Propiedades sintéticas con el esquema de propiedades.json (deterministas por seed)"""
+    r = random.Random(seed)
+    si_no = ['Si', 'No', 'x', '']
+    for i in range(cantidad):
+        tipo = r.choice(TIPOS)
+        operacion = r.choice(OPERACIONES)
+        barrio = r.choice(BARRIOS)
+        ambientes = 1 if tipo == 'monoambiente' else r.randint(1, 6)
+        metros = r.randint(20, 60) if ambientes == 1 else r.randint(35 * ambientes, 80 * ambientes)
+        if operacion == 'venta':
+            precio, moneda = r.randint(40, 900) * 1000, 'USD'
+        else:
+            precio, moneda = r.randint(150, 2500) * 1000, 'ARS'
+        extras = r.sample(AMBIENTES_DESC, 2)
+        yield {
+            'id_temporal': f'SYN{i:07d}',
+            'titulo': f'{tipo.capitalize()} {r.choice(ADJETIVOS)} en {barrio}',
+            'barrio': barrio,
+            'precio': precio,
+            'ambientes': ambientes,
+            'metros_cuadrados': metros,
+            'operacion': operacion,
+            'tipo': tipo,
+            'descripcion': (f'{tipo.capitalize()} {r.choice(ADJETIVOS)} de {ambientes} ambientes '
+                            f'con {extras[0]} y {extras[1]}, a metros de {r.choice(CALLES)}.'),
+            'direccion': f'{r.choice(CALLES)} al {r.randint(1, 60) * 100}',
+            'antiguedad': r.randint(0, 80),
+            'estado': r.choice(ESTADOS),
+            'orientacion': r.choice(ORIENTACIONES),
+            'expensas': r.choice([0, r.randint(10, 300) * 1000]),
+            'amenities': r.choice(['Si', 'No']),
+            'cochera': r.choice(si_no),
+            'balcon': r.choice(si_no),
+            'pileta': r.choice(si_no),
+            'acepta_mascotas': r.choice(si_no),
+            'aire_acondicionado': r.choice(si_no),
+            'info_multimedia': 'Set de fotos de alta calidad',
+            'documentos': [],
+            'fotos': [f'imgs/SYN{i:07d}-{n}.jpg' for n in range(1, r.randint(2, 6))],
+            'moneda_precio': moneda,
+            'moneda_expensas': 'ARS',
+            'fecha_procesamiento': '2025-01-01T00:00:00',
+        }
+
+
+def escribir_catalogo(path: str, cantidad: int, seed: int = DEFAULT_SEED):
+    """Escribe el catálogo como lista JSON sin armarlo completo en memoria"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for n, propiedad in enumerate(generar_propiedades(cantidad, seed)):
+            f.write(',\n' if n else '\n')
+            f.write(json.dumps(propiedad, ensure_ascii=False))
+        f.write('\n]')
+
+
+# ----------------------------------------------------------------------
+# Medición
+# ----------------------------------------------------------------------
+
+def _percentil(muestras: List[float], p: float) -> float:
+    if not muestras:
+        return 0.0
+    k = min(len(muestras) - 1, max(0, int(round(p / 100 * (len(muestras) - 1)))))
+    return muestras[k]
+
+
+def medir(nombre: str, operacion: Callable[[int], object], ops: int, min_time: float = 0.0,
+          setup: Optional[Callable[[], None]] = None) -> Dict:
+    """Corre operacion(i) ops veces (o hasta min_time) y devuelve las métricas
+
+    La memoria pico se mide en una segunda pasada corta con tracemalloc
+    activo, para que no distorsione las latencias.
+    """
+    if setup:
+        setup()
+    gc.collect()
+    latencias = []
+    inicio = time.perf_counter()
+    i = 0
+    while i < ops or time.perf_counter() - inicio < min_time:
+        t0 = time.perf_counter()
+        operacion(i)
+        latencias.append(time.perf_counter() - t0)
+        i += 1
+    total = time.perf_counter() - inicio
+    latencias.sort()
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    for j in range(min(ops, 50)):
+        operacion(j)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'bench': nombre,
+        'ops': i,
+        'ops_per_sec': round(i / total, 1) if total else 0.0,
+        'p50_us': round(_percentil(latencias, 50) * 1e6, 1),
+        'p99_us': round(_percentil(latencias, 99) * 1e6, 1),
+        'max_us': round(latencias[-1] * 1e6, 1) if latencias else 0.0,
+        'peak_kb': round(pico / 1024, 1),
+    }
+
+
+def benchmarks_para(path: str, ops: int, min_time: float) -> List[Dict]:
+    """Todas las mediciones sobre un catálogo ya escrito"""
+    resultados = []
+
+    # Carga e indexado del catálogo
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    bot = WhatsAppChatbot(path)
+    carga = time.perf_counter() - t0
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    resultados.append({'bench': 'load_catalog', 'ops': 1, 'ops_per_sec': round(1 / carga, 3),
+                       'p50_us': round(carga * 1e6, 1), 'p99_us': round(carga * 1e6, 1),
+                       'max_us': round(carga * 1e6, 1), 'peak_kb': round(pico / 1024, 1)})
+
+    ai: ChatbotAI = bot.ai
+    generador: WhatsAppResponseGenerator = bot.response_generator
+    corpus = QUERY_CORPUS
+    consultas = [ai.parse_query(q) for q in corpus]
+
+    def limpiar():
+        ai.parse_cache.clear()
+        ai.results_cache.clear()
+
+    # parse_query: sin cache (cada consulta se analiza) y con cache caliente
+    resultados.append(medir('parse_query',
+                            lambda i: (ai.parse_cache.clear(), ai.parse_query(corpus[i % len(corpus)])),
+                            ops, min_time))
+    resultados.append(medir('parse_query_cached', lambda i: ai.parse_query(corpus[i % len(corpus)]),
+                            ops, min_time, setup=lambda: [ai.parse_query(q) for q in corpus]))
+
+    # search_properties: ranking completo y respuesta desde la cache de resultados
+    resultados.append(medir('search_properties',
+                            lambda i: (ai.results_cache.clear(), ai.search_properties(consultas[i % len(consultas)])),
+                            ops, min_time, setup=limpiar))
+    resultados.append(medir('search_properties_cached',
+                            lambda i: ai.search_properties(consultas[i % len(consultas)]),
+                            ops, min_time, setup=lambda: [ai.search_properties(q) for q in consultas]))
+
+    # Formateo de respuestas (con las propiedades del catálogo, como en reply())
+    resultados_busqueda = [[ai.get_property(r) for r in ai.rank_properties(q, limit=10)[0]] for q in consultas]
+    con_resultados = [r for r in resultados_busqueda if r] or [ai.propiedades[:10]]
+    propiedades = [p for r in con_resultados for p in r]
+    resultados.append(medir('format_property_message',
+                            lambda i: generador.format_property_message(propiedades[i % len(propiedades)]),
+                            ops, min_time))
+    resultados.append(medir('format_result_summary',
+                            lambda i: generador.format_result_summary(i % 3 + 1, propiedades[i % len(propiedades)]),
+                            ops, min_time))
+    resultados.append(medir('format_search_results_message',
+                            lambda i: generador.format_search_results_message(
+                                con_resultados[i % len(con_resultados)][:generador.page_size], corpus[i % len(corpus)]),
+                            ops, min_time))
+    resultados.append(medir('format_all_results_pages',
+                            lambda i: generador.format_all_results_pages(con_resultados[i % len(con_resultados)]),
+                            ops, min_time))
+
+    # process_message: búsquedas de usuarios nuevos (sin cache, como search_properties)
+    # y conversaciones con seguimiento
+    resultados.append(medir('process_message_search',
+                            lambda i: (limpiar(), bot.process_message(corpus[i % len(corpus)], f'549110{i:07d}')),
+                            ops, min_time))
+
+    conversacion = [corpus[0]] + FOLLOW_UPS + [GREETINGS[0]]
+
+    def conversar(i):
+        telefono = f'549119{i // len(conversacion):07d}'
+        bot.process_message(conversacion[i % len(conversacion)], telefono)
+
+    resultados.append(medir('process_message_conversation', conversar, ops, min_time))
+    return resultados
+
+
+def metadata() -> Dict:
+    """Datos de la corrida para poder comparar resultados"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def comparar(actual: Dict, anterior: Dict):
+    """Muestra la variación de ops/seg y p99 contra una corrida anterior"""
+    previos = {(r['size'], r['bench']): r for r in anterior.get('results', [])}
+    print(f"\n📊 Comparación con {anterior.get('meta', {}).get('commit') or 'corrida anterior'}")
+    for r in actual['results']:
+        previo = previos.get((r['size'], r['bench']))
+        if not previo or not previo['ops_per_sec']:
+            continue
+        delta_ops = (r['ops_per_sec'] / previo['ops_per_sec'] - 1) * 100
+        delta_p99 = (r['p99_us'] / previo['p99_us'] - 1) * 100 if previo['p99_us'] else 0.0
+        print(f"   {r['size']:>8} {r['bench']:<30} ops/s {delta_ops:+7.1f}%   p99 {delta_p99:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks del motor del chatbot')
+    parser.add_argument('--tamanos', default=','.join(str(n) for n in DEFAULT_SIZES),
+                        help='Tamaños de catálogo separados por coma (p. ej. 1000,10000,100000,1000000)')
+    parser.add_argument('--ops', type=int, default=500, help='Operaciones por benchmark')
+    parser.add_argument('--min-time', type=float, default=0.0, help='Segundos mínimos por benchmark')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--salida', default='benchmark_resultados.json', help='Archivo JSON de resultados')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para comparar')
+    args = parser.parse_args()
+
+    tamanos = [int(n) for n in args.tamanos.split(',') if n.strip()]
+    informe = {'meta': dict(metadata(), seed=args.seed, ops=args.ops), 'results': []}
+
+    with tempfile.TemporaryDirectory(prefix='bench_catalogo_') as carpeta:
+        for tamano in tamanos:
+            path = os.path.join(carpeta, f'propiedades_{tamano}.json')
+            print(f"\n🏗️ Catálogo sintético de {tamano:,} propiedades...")
+            escribir_catalogo(path, tamano, args.seed)
+            for resultado in benchmarks_para(path, args.ops, args.min_time):
+                resultado['size'] = tamano
+                informe['results'].append(resultado)
+                print(f"   {resultado['bench']:<30} {resultado['ops_per_sec']:>11,.1f} ops/s   "
+                      f"p50 {resultado['p50_us']:>10,.1f}µs   p99 {resultado['p99_us']:>10,.1f}µs   "
+                      f"pico {resultado['peak_kb']:>10,.1f} KB")
+            os.remove(path)
+            gc.collect()
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(informe, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
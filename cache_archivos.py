@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Cache en memoria de archivos servidos por HTTP (p. ej. propiedades.json)
+- Guarda los bytes ya codificados y sus variantes gzip y brotli
+- Se invalida cuando cambia el mtime o el tamaño del archivo
+- ETag fuerte y Last-Modified para responder 304 a las revalidaciones
+brotli es opcional: si no está instalado solo se ofrecen gzip y sin comprimir
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Debajo de este tamaño comprimir no compensa
+COMPRESS_MIN_BYTES = 1024
+
+
+@dataclass(frozen=True)
+class CachedFile:
+    """Contenido de un archivo y sus variantes comprimidas"""
+    path: str
+    mtime_ns: int
+    size: int
+    etag: str                       # sin comillas; cada codificación agrega un sufijo
+    last_modified: str
+    variants: Dict[str, bytes] = field(default_factory=dict)  # codificación -> bytes
+    dependencies: Tuple = ()        # (ruta, mtime_ns, tamaño) de los archivos que usa transform
+    modified_ns: int = 0            # el más reciente entre el archivo y sus dependencias
+
+    @property
+    def mtime(self) -> float:
+        return max(self.mtime_ns, self.modified_ns) / 1e9
+
+    def etag_for(self, encoding: str) -> str:
+        """ETag de la representación (cada codificación es una representación distinta)"""
+        sufijo = '' if encoding == 'identity' else f'-{encoding}'
+        return f'"{self.etag}{sufijo}"'
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """True si la copia del cliente sigue vigente (If-None-Match tiene prioridad)"""
+        if if_none_match:
+            etiquetas = [e.strip() for e in if_none_match.split(',')]
+            if '*' in etiquetas:
+                return True
+            # Comparación débil (RFC 9110): se ignora W/ y vale cualquier codificación
+            for etiqueta in etiquetas:
+                etiqueta = etiqueta[2:] if etiqueta.startswith('W/') else etiqueta
+                if etiqueta.strip('"').split('-')[0] == self.etag:
+                    return True
+            return False
+        if if_modified_since:
+            try:
+                return int(self.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    """Codificaciones aceptadas por el cliente (q > 0) según Accept-Encoding"""
+    aceptadas = []
+    for parte in (accept_encoding or '').split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            aceptadas.append(nombre)
+    return aceptadas
+
+
+def choose_encoding(entry: CachedFile, accept_encoding: Optional[str]) -> str:
+    """La variante más chica que el cliente acepta"""
+    aceptadas = accepted_encodings(accept_encoding)
+    for encoding in ('br', 'gzip'):
+        if encoding in entry.variants and (encoding in aceptadas or '*' in aceptadas):
+            return encoding
+    return 'identity'
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Rango pedido en un header Range (inicio y fin inclusivos)
+
+    Devuelve None si no hay rango o se piden varios (se responde el archivo
+    completo) y lanza ValueError si el rango no se puede satisfacer (416).
+    """
+    if not range_header or not range_header.startswith('bytes='):
+        return None
+    especificacion = range_header[len('bytes='):].strip()
+    if ',' in especificacion:
+        return None
+    inicio, guion, fin = especificacion.partition('-')
+    if not guion:
+        return None
+    try:
+        if not inicio:
+            # bytes=-N: los últimos N bytes
+            largo = int(fin)
+            if largo <= 0:
+                raise ValueError('rango vacío')
+            return max(0, size - largo), size - 1
+        inicio = int(inicio)
+        fin = int(fin) if fin else size - 1
+    except ValueError:
+        raise ValueError(f'Range inválido: {range_header}')
+    if inicio >= size or fin < inicio:
+        raise ValueError(f'Range fuera del archivo: {range_header}')
+    return inicio, min(fin, size - 1)
+
+
+class StaticFileCache:
+    """Archivos en memoria con sus variantes comprimidas, invalidados por mtime
+
+    transform(bytes) -> bytes permite servir una versión procesada del
+    archivo; el resultado también queda en cache hasta que cambie el archivo
+    o alguna de las dependencias indicadas en get().
+    """
+
+    def __init__(self, transform: Optional[Callable[[bytes], bytes]] = None,
+                 compress_min: int = COMPRESS_MIN_BYTES, gzip_level: int = 9, brotli_quality: int = 11):
+        self.transform = transform
+        self.compress_min = compress_min
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._entries: Dict[str, CachedFile] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _firma_dependencias(dependencies: Iterable[str]) -> Tuple:
+        firmas = []
+        for dependencia in dependencies:
+            try:
+                st = os.stat(dependencia)
+                firmas.append((dependencia, st.st_mtime_ns, st.st_size))
+            except OSError:
+                firmas.append((dependencia, None, None))
+        return tuple(firmas)
+
+    def get(self, path: str, dependencies: Iterable[str] = ()) -> CachedFile:
+        """Entrada vigente del archivo (lanza OSError si no existe)
+
+        dependencies son otros archivos que usa transform: si cambian, también
+        se regenera la entrada.
+        """
+        st = os.stat(path)
+        firma: Tuple[int, int] = (st.st_mtime_ns, st.st_size)
+        extra = self._firma_dependencias(dependencies)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and (entry.mtime_ns, entry.size) == firma and entry.dependencies == extra:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Se arma fuera del lock: comprimir un archivo grande no frena a los demás
+        entry = self._build(path, firma, extra)
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def _build(self, path: str, firma: Tuple[int, int], extra: Tuple) -> CachedFile:
+        with open(path, 'rb') as f:
+            body = f.read()
+        if self.transform is not None:
+            body = self.transform(body)
+
+        variants = {'identity': body}
+        if len(body) >= self.compress_min:
+            variants['gzip'] = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+            if brotli is not None:
+                variants['br'] = brotli.compress(body, quality=self.brotli_quality)
+
+        mtime_ns, size = firma
+        modificado = max([mtime_ns] + [d[1] for d in extra if d[1] is not None])
+        return CachedFile(
+            path=path,
+            mtime_ns=mtime_ns,
+            size=size,
+            etag=hashlib.sha256(body).hexdigest()[:32],
+            last_modified=formatdate(modificado / 1e9, usegmt=True),
+            variants=variants,
+            dependencies=extra,
+            modified_ns=modificado,
+        )
+
+    def invalidate(self, path: Optional[str] = None):
+        """Descarta un archivo (o todos) de la cache"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def stats(self) -> Dict:
+        """Aciertos, fallos y tamaño en memoria"""
+        with self._lock:
+            return {
+                'files': len(self._entries),
+                'bytes': sum(len(v) for e in self._entries.values() for v in e.variants.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
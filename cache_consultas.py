@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Cache LRU con expiración (TTL) para consultas del chatbot
+Segura para usar desde varios hilos (Flask sirve cada request en un hilo)
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Cache acotada por cantidad de entradas y por tiempo de vida"""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Devuelve el valor cacheado (o default si no está o expiró)"""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                valor, expira = item
+                if expira is None or expira > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return valor
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, valor: Any):
+        """Guarda un valor, descartando el menos usado si se supera el tamaño"""
+        if self.maxsize <= 0:
+            return
+        expira = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (valor, expira)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Quita una entrada y devuelve su valor (default si no estaba)"""
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def clear(self):
+        """Vacía la cache (los contadores se conservan)"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso de la cache"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
@@ -4,48 +4,403 @@ Backend simple para el chatbot sin dependencias externas
 Usa solo el servidor HTTP estándar de Python
 """
 
+import argparse
+import hmac
 import json
+import logging
+import mimetypes
 import os
+import threading
+import time
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from datetime import datetime
-import csv
-from io import StringIO
 
-# Archivo para guardar todas las consultas
+from almacen_consultas import LeadStore
+import metricas
+import registro
+import almacen_assets
+import derivados_imagenes
+from cache_archivos import StaticFileCache, choose_encoding, parse_byte_range
+from exportar_consultas import filas_consultas, iter_csv, iter_xlsx
+from perfilado import PROFILE_DIR, PROFILE_HEADER, SUMMARY_PATH, RequestProfiler
+from repositorio_consultas import LeadRepository
+
+logger = registro.get_logger('chatbot_backend')
+
+# Archivo del formato anterior (se importa al log la primera vez)
 CONSULTAS_FILE = 'consultas_completas.json'
 
+# Log append-only de consultas (JSON Lines por segmentos)
+CONSULTAS_DIR = os.environ.get('CONSULTAS_DIR', 'consultas_log')
+CONSULTAS_FLUSH_INTERVAL = float(os.environ.get('CONSULTAS_FLUSH_INTERVAL', '0.01'))
+CONSULTAS_FSYNC = os.environ.get('CONSULTAS_FSYNC', '1') != '0'
+CONSULTAS_SEGMENT_MB = int(os.environ.get('CONSULTAS_SEGMENT_MB', '64'))
+# Segmentos cerrados que disparan la compactación en segundo plano (0 = nunca)
+CONSULTAS_COMPACT_AFTER = int(os.environ.get('CONSULTAS_COMPACT_AFTER', '8'))
+
+# Base SQLite con índices para consultar (se alimenta del log)
+CONSULTAS_DB = os.environ.get('CONSULTAS_DB', os.path.join(CONSULTAS_DIR, 'consultas.sqlite3'))
+
+# Operaciones de administración (?rebuild=1): header X-Admin-Token con ADMIN_TOKEN.
+# Sin ADMIN_TOKEN configurado quedan deshabilitadas.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+ADMIN_HEADER = 'X-Admin-Token'
+
+# Paginación de /api/consultas
+CONSULTAS_PAGE_SIZE = 100
+CONSULTAS_MAX_PAGE_SIZE = 1000
+
+# Servidor: hilos que atienden conexiones y tiempo máximo de espera por socket
+BACKEND_WORKERS = int(os.environ.get('BACKEND_WORKERS', '16'))
+BACKEND_REQUEST_TIMEOUT = float(os.environ.get('BACKEND_REQUEST_TIMEOUT', '15'))
+# Espera del próximo request en una conexión keep-alive (retiene un hilo del pool)
+BACKEND_IDLE_TIMEOUT = float(os.environ.get('BACKEND_IDLE_TIMEOUT', '2'))
+
+# propiedades.json: segundos que el navegador lo usa sin revalidar
+PROPIEDADES_MAX_AGE = int(os.environ.get('PROPIEDADES_MAX_AGE', '60'))
+
+# Manifest de miniaturas y variantes WebP/JPEG (derivados_imagenes.py)
+DERIVADOS_MANIFEST = os.path.join(derivados_imagenes.DERIVADOS_DIR, derivados_imagenes.MANIFEST_NAME)
+
+# Assets deduplicados con URLs inmutables (almacen_assets.py)
+ASSETS_DIR = os.environ.get('ASSETS_DIR', almacen_assets.ASSETS_DIR)
+ASSETS_MANIFEST = os.path.join(ASSETS_DIR, almacen_assets.MANIFEST_NAME)
+ASSETS_URL_PREFIX = os.environ.get('ASSETS_URL_PREFIX', 'assets/')
+ASSETS_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+ASSETS_BLOCK_SIZE = 64 * 1024
+
+# Métricas por ruta (se exponen en /metrics); el resto se agrupa como not_found
+METRIC_ROUTES = {'/api/consulta', '/api/consultas', '/api/estadisticas', '/api/exportar-excel',
+                 '/propiedades.json', '/metrics', SUMMARY_PATH}
+HTTP_SECONDS = metricas.histogram('http_request_duration_seconds', 'Latencia de los requests HTTP', ['handler'])
+HTTP_REQUESTS = metricas.counter('http_requests_total', 'Requests HTTP por handler y status', ['handler', 'status'])
+ERRORS = metricas.counter('backend_errors_total', 'Requests que terminaron en error 5xx o excepción', ['handler'])
+
+def preparar_catalogo(contenido):
+    """Catálogo servido: variantes de fotos y URLs inmutables si ya se generaron"""
+    variantes = derivados_imagenes.load_manifest(derivados_imagenes.DERIVADOS_DIR)
+    assets = almacen_assets.load_manifest(ASSETS_DIR)
+    if not variantes.get('images') and not assets.get('files'):
+        return contenido
+    propiedades = json.loads(contenido.decode('utf-8'))
+    propiedades = derivados_imagenes.apply_variants(propiedades, variantes)
+    propiedades = almacen_assets.rewrite_catalog(propiedades, assets, ASSETS_URL_PREFIX)
+    return json.dumps(propiedades, ensure_ascii=False, indent=2).encode('utf-8')
+
+# Perfilado opt-in (PROFILE_SAMPLE_RATE o header X-Profile con PROFILE_TOKEN)
+profiler = RequestProfiler(os.path.join(PROFILE_DIR, 'backend'))
+
+# Archivos servidos desde memoria (con variantes gzip/brotli)
+static_cache = StaticFileCache(transform=preparar_catalogo)
+
+def collect_cache_metrics():
+    """Aciertos de la cache de archivos, leídos recién al exportar /metrics"""
+    stats = static_cache.stats()
+    yield ('backend_cache_hits_total', 'counter', 'Aciertos de la cache de archivos', [({'cache': 'static'}, stats['hits'])])
+    yield ('backend_cache_misses_total', 'counter', 'Fallos de la cache de archivos', [({'cache': 'static'}, stats['misses'])])
+    yield ('backend_cache_bytes', 'gauge', 'Bytes en la cache de archivos', [({'cache': 'static'}, stats['bytes'])])
+
+metricas.REGISTRY.add_collector(collect_cache_metrics)
+
+_lead_store = None
+_lead_repository = None
+_lead_store_lock = threading.Lock()
+
+def _open_lead_store():
+    """Abre el log y la base SQLite, poniendo la base al día con el log"""
+    global _lead_store, _lead_repository
+    store = LeadStore(
+        CONSULTAS_DIR,
+        flush_interval=CONSULTAS_FLUSH_INTERVAL,
+        fsync=CONSULTAS_FSYNC,
+        segment_max_bytes=CONSULTAS_SEGMENT_MB * 1024 * 1024,
+        compact_after=CONSULTAS_COMPACT_AFTER,
+        legacy_file=CONSULTAS_FILE,
+    )
+    repository = LeadRepository(CONSULTAS_DB)
+    agregadas = repository.sync_from(store.iter_consultas())
+    if agregadas:
+        registro.log_event(logger, 'leads_indexed', consultas=agregadas, db=CONSULTAS_DB)
+    store.listeners.append(repository.add_many)
+    _lead_repository = repository
+    _lead_store = store
+
+def admin_authorized(header_value):
+    """True si el header trae el token de administración"""
+    if not ADMIN_TOKEN or not header_value:
+        return False
+    return hmac.compare_digest(header_value.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def get_lead_store():
+    """Devuelve el almacén de consultas (se abre la primera vez que se usa)"""
+    with _lead_store_lock:
+        if _lead_store is None:
+            _open_lead_store()
+        return _lead_store
+
+def get_lead_repository():
+    """Devuelve el repositorio SQLite de consultas"""
+    get_lead_store()
+    return _lead_repository
+
 def cargar_consultas():
-    """Cargar todas las consultas desde el archivo JSON"""
-    if os.path.exists(CONSULTAS_FILE):
-        with open(CONSULTAS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+    """Cargar todas las consultas del log"""
+    return list(get_lead_store().iter_consultas())
 
 def guardar_consulta(consulta):
-    """Guardar una nueva consulta"""
-    consultas = cargar_consultas()
-    consultas.append(consulta)
-    with open(CONSULTAS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(consultas, f, ensure_ascii=False, indent=2)
+    """Guardar una nueva consulta (append + group commit, O(1))"""
+    get_lead_store().append(consulta)
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer que atiende cada conexión en un pool acotado de hilos
+    
+    El hilo que acepta conexiones nunca se bloquea (así shutdown() no se
+    cuelga): con todos los hilos ocupados las conexiones esperan en la cola
+    del pool, hasta max_pending, y las que no entran reciben un 503.
+    """
+    
+    request_queue_size = 128
+    
+    def __init__(self, server_address, handler_class, workers=BACKEND_WORKERS, max_pending=None):
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, workers)
+        self.max_pending = self.request_queue_size if max_pending is None else max_pending
+        self._lock = threading.Lock()
+        self._connections = 0  # aceptadas y sin cerrar: atendidas o esperando un hilo
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backend-http')
+    
+    def saturated(self):
+        """True si hay conexiones esperando un hilo libre"""
+        return self._connections > self.workers
+    
+    def process_request(self, request, client_address):
+        with self._lock:
+            lleno = self._connections >= self.workers + self.max_pending
+            if lleno:
+                self.rejected += 1
+            else:
+                self._connections += 1
+        if lleno:
+            self._reject(request)
+            return
+        self._executor.submit(self._process_request, request, client_address)
+    
+    def _reject(self, request):
+        """Responde 503 sin pasar por el pool (el socket recién aceptado tiene lugar para escribir)"""
+        try:
+            request.settimeout(0)
+            request.sendall(b'HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n'
+                            b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+        except OSError:
+            pass
+        self.shutdown_request(request)
+    
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._lock:
+                self._connections -= 1
+    
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
 
 class ChatbotHandler(BaseHTTPRequestHandler):
+    # Keep-alive: cada respuesta lleva Content-Length o va en chunks
+    protocol_version = 'HTTP/1.1'
+    # Clientes lentos liberan el hilo al vencer el timeout de lectura
+    timeout = BACKEND_REQUEST_TIMEOUT
+    # Entre requests de una conexión keep-alive se espera menos: un cliente
+    # inactivo no debe retener un hilo mientras otros esperan
+    idle_timeout = BACKEND_IDLE_TIMEOUT
+    # Headers y cuerpo en un mismo write (evita la espera de delayed ACK)
+    wbufsize = 64 * 1024
+    
+    def handle(self):
+        self.requests_served = 0
+        super().handle()
+    
+    def handle_one_request(self):
+        if self.requests_served and not self.wait_next_request():
+            self.close_connection = True
+            return
+        self.requests_served += 1
+        super().handle_one_request()
+    
+    def wait_next_request(self):
+        """Espera el próximo request de la conexión keep-alive; False si hay que cerrarla
+        
+        Con conexiones esperando un hilo no se espera nada: solo sigue si el
+        cliente ya mandó el request siguiente.
+        """
+        self.connection.settimeout(0 if self.server.saturated() else self.idle_timeout)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            # Venció la espera (socket.timeout) o no había nada para leer
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
+    def send_response(self, code, message=None):
+        # Se guarda el status para las métricas
+        self.status_code = code
+        super().send_response(code, message)
+    
+    def medir(self, responder):
+        """Atiende el request registrando latencia, status y errores por ruta"""
+        ruta = urllib.parse.urlparse(self.path).path
+        if ruta in METRIC_ROUTES:
+            handler = ruta
+        elif ruta.startswith('/assets/'):
+            handler = '/assets/'
+        else:
+            handler = 'not_found'
+        self.status_code = None
+        capture = None
+        if ruta != SUMMARY_PATH:
+            capture = profiler.begin(f'{self.command} {ruta}', self.headers.get(PROFILE_HEADER),
+                                     query=urllib.parse.urlparse(self.path).query)
+        inicio = time.perf_counter()
+        try:
+            responder()
+        finally:
+            if capture is not None:
+                capture.stop(status=self.status_code)
+            HTTP_SECONDS.labels(handler).observe(time.perf_counter() - inicio)
+            HTTP_REQUESTS.labels(handler, self.status_code or 'error').inc()
+            if self.status_code is None or self.status_code >= 500:
+                ERRORS.labels(handler).inc()
+    
+    def log_message(self, format, *args):
+        # Línea de acceso por request: evento muestreable con LOG_SAMPLE=http_access=0.1
+        registro.log_event(logger, 'http_access', client=self.address_string(),
+                           request=getattr(self, 'requestline', ''), status=getattr(self, 'status_code', None))
+    
+    def log_error(self, format, *args):
+        registro.log_event(logger, 'http_error', logging.WARNING, client=self.address_string(), error=format % args)
+    
     def add_cors_headers(self):
         """Agregar cabeceras CORS a todas las respuestas"""
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Accept')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Accept, Range')
         self.send_header('Access-Control-Max-Age', '86400')
 
-    def do_OPTIONS(self):
-        """Manejar peticiones OPTIONS para CORS"""
-        self.send_response(200)
+    def send_json(self, status, body):
+        """Responde un JSON con Content-Length"""
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
         self.add_cors_headers()
         self.end_headers()
+        self.wfile.write(data)
+    
+    def send_empty(self, status):
+        """Responde sin cuerpo"""
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.add_cors_headers()
+        self.end_headers()
+    
+    def send_cached_file(self, path, content_type, cache_control, dependencies=()):
+        """Sirve un archivo desde la cache: ETag, Last-Modified, 304 y compresión"""
+        entry = static_cache.get(path, dependencies)
+        encoding = choose_encoding(entry, self.headers.get('Accept-Encoding'))
+        
+        if entry.not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')):
+            self.send_response(304)
+            body = b''
+        else:
+            self.send_response(200)
+            body = entry.variants[encoding]
+            self.send_header('Content-Type', content_type)
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', entry.etag_for(encoding))
+        self.send_header('Last-Modified', entry.last_modified)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.add_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_asset(self, nombre):
+        """Sirve un asset inmutable desde disco, con soporte de Range (PDFs grandes)"""
+        path = os.path.join(ASSETS_DIR, nombre)
+        if not almacen_assets.ASSET_NAME.match(nombre) or not os.path.isfile(path):
+            self.send_empty(404)
+            return
+        
+        # El nombre es el hash del contenido: sirve como ETag fuerte
+        etag = f'"{nombre.split(".")[0]}"'
+        size = os.path.getsize(path)
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in if_none_match):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', ASSETS_CACHE_CONTROL)
+            self.send_header('Content-Length', '0')
+            self.add_cors_headers()
+            self.end_headers()
+            return
+        
+        rango = None
+        if_range = self.headers.get('If-Range')
+        if not if_range or if_range.strip() == etag:
+            try:
+                rango = parse_byte_range(self.headers.get('Range'), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.add_cors_headers()
+                self.end_headers()
+                return
+        
+        inicio, fin = rango if rango else (0, size - 1)
+        largo = fin - inicio + 1 if size else 0
+        self.send_response(206 if rango else 200)
+        self.send_header('Content-Type', mimetypes.guess_type(nombre)[0] or 'application/octet-stream')
+        self.send_header('Content-Length', str(largo))
+        if rango:
+            self.send_header('Content-Range', f'bytes {inicio}-{fin}/{size}')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', ASSETS_CACHE_CONTROL)
+        self.send_header('Access-Control-Expose-Headers', 'Content-Range, Accept-Ranges, Content-Length')
+        self.add_cors_headers()
+        self.end_headers()
+        
+        with open(path, 'rb') as f:
+            f.seek(inicio)
+            restante = largo
+            while restante > 0:
+                bloque = f.read(min(ASSETS_BLOCK_SIZE, restante))
+                if not bloque:
+                    break
+                self.wfile.write(bloque)
+                restante -= len(bloque)
+    
+    def do_OPTIONS(self):
+        """Manejar peticiones OPTIONS para CORS"""
+        self.send_empty(200)
 
     def do_POST(self):
         """Manejar peticiones POST"""
+        self.medir(self.responder_post)
+    
+    def responder_post(self):
         if self.path == '/api/consulta':
             try:
                 content_length = int(self.headers['Content-Length'])
@@ -64,167 +419,240 @@ class ChatbotHandler(BaseHTTPRequestHandler):
                 guardar_consulta(consulta)
                 
                 # Respuesta
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                
                 response = {
                     'success': True,
                     'mensaje': 'Consulta guardada exitosamente',
                     'id_consulta': consulta['id']
                 }
                 
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self.send_json(200, response)
                 
             except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                
-                error_response = {'error': str(e)}
-                self.wfile.write(json.dumps(error_response).encode('utf-8'))
+                # El cuerpo pudo quedar sin leer: no se reutiliza la conexión
+                self.close_connection = True
+                self.send_json(500, {'error': str(e)})
         
         else:
-            self.send_response(404)
-            self.end_headers()
+            self.close_connection = True
+            self.send_empty(404)
+
+    def enviar_consultas(self, params):
+        """Página de consultas con filtros, transmitida fila por fila
+        
+        Parámetros: limit, cursor, from/desde, to/hasta, telefono, email, propiedad.
+        El cursor de la página siguiente va en X-Next-Cursor y en Link.
+        """
+        def param(*nombres):
+            for nombre in nombres:
+                if params.get(nombre):
+                    return params[nombre][0]
+            return None
+        
+        try:
+            limit = min(int(param('limit') or CONSULTAS_PAGE_SIZE), CONSULTAS_MAX_PAGE_SIZE)
+            cursor = param('cursor')
+            filtros = {
+                'cursor': int(cursor) if cursor else None,
+                'desde': param('from', 'desde'),
+                'hasta': param('to', 'hasta'),
+                'telefono': param('telefono'),
+                'email': param('email'),
+                'property_id': param('propiedad', 'property_id'),
+            }
+            if limit < 1:
+                raise ValueError('limit debe ser mayor que 0')
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        
+        repository = get_lead_repository()
+        next_cursor = repository.next_cursor(limit, **filtros)
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if next_cursor is not None:
+            siguiente = dict((k, v[0]) for k, v in params.items())
+            siguiente['cursor'] = str(next_cursor)
+            self.send_header('X-Next-Cursor', str(next_cursor))
+            self.send_header('Link', f'</api/consultas?{urllib.parse.urlencode(siguiente)}>; rel="next"')
+        self.send_header('Access-Control-Expose-Headers', 'X-Next-Cursor, Link')
+        self.add_cors_headers()
+        
+        # Se escribe un arreglo JSON sin armarlo en memoria
+        def arreglo():
+            yield b'['
+            for n, (_, data) in enumerate(repository.iter_json(limit=limit, **filtros)):
+                yield (b',' if n else b'') + data.encode('utf-8')
+            yield b']'
+        self.send_chunked(arreglo())
+
+    def send_chunked(self, chunks):
+        """Envía los bloques con Transfer-Encoding: chunked (HTTP/1.1)
+        
+        Con clientes HTTP/1.0 se escriben tal cual y se cierra la conexión.
+        """
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if chunked:
+                self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+            else:
+                self.wfile.write(chunk)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def exportar_consultas(self, params):
+        """Exporta las consultas en CSV (por defecto) o .xlsx, fila por fila
+        
+        Parámetros: formato=csv|xlsx, from/desde y to/hasta para filtrar por fecha.
+        """
+        formato = (params.get('formato') or params.get('format') or ['csv'])[0].lower()
+        if formato not in ('csv', 'xlsx'):
+            self.send_json(400, {'error': 'formato debe ser csv o xlsx'})
+            return
+        filtros = {
+            'desde': (params.get('from') or params.get('desde') or [None])[0],
+            'hasta': (params.get('to') or params.get('hasta') or [None])[0],
+        }
+        
+        repository = get_lead_repository()
+        if next(repository.iter_json(limit=1, **filtros), None) is None:
+            self.send_empty(404)
+            return
+        
+        consultas = (json.loads(data) for _, data in repository.iter_json(limit=None, **filtros))
+        filas = filas_consultas(consultas)
+        filename = f"consultas_dante_completas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+        
+        self.send_response(200)
+        if formato == 'xlsx':
+            self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            chunks = iter_xlsx(filas)
+        else:
+            self.send_header('Content-Type', 'text/csv; charset=utf-8')
+            chunks = iter_csv(filas)
+        self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
+        self.add_cors_headers()
+        self.send_chunked(chunks)
 
     def do_GET(self):
         """Manejar peticiones GET"""
-        if self.path == '/api/consultas':
-            # Obtener todas las consultas
-            consultas = cargar_consultas()
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.add_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps(consultas).encode('utf-8'))
-            
-        elif self.path == '/api/estadisticas':
-            # Obtener estadísticas
-            consultas = cargar_consultas()
-            
-            stats = {
-                'total_consultas': len(consultas),
-                'consultas_por_fecha': {},
-                'tipos_propiedades_interes': {},
-                'barrios_interes': {},
-                'operaciones_interes': {}
-            }
+        self.medir(self.responder_get)
+    
+    def responder_get(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(parsed.query)
+        
+        if parsed.path == '/api/consultas':
+            self.enviar_consultas(params)
             
-            for consulta in consultas:
-                fecha = consulta['fecha'][:10]
-                stats['consultas_por_fecha'][fecha] = stats['consultas_por_fecha'].get(fecha, 0) + 1
-                
-                for prop in consulta.get('propiedades_interes', []):
-                    tipo = prop.get('tipo', 'No especificado')
-                    barrio = prop.get('barrio', 'No especificado')
-                    operacion = prop.get('operacion', 'No especificado')
-                    
-                    stats['tipos_propiedades_interes'][tipo] = stats['tipos_propiedades_interes'].get(tipo, 0) + 1
-                    stats['barrios_interes'][barrio] = stats['barrios_interes'].get(barrio, 0) + 1
-                    stats['operaciones_interes'][operacion] = stats['operaciones_interes'].get(operacion, 0) + 1
+        elif parsed.path == '/api/estadisticas':
+            # Contadores mantenidos en cada escritura (from/to suman los acumulados diarios)
+            repository = get_lead_repository()
+            if params.get('rebuild', [''])[0] in ('1', 'true'):
+                # Recorre todas las consultas: solo con el token de administración
+                if not admin_authorized(self.headers.get(ADMIN_HEADER)):
+                    self.send_json(403, {'error': f'rebuild requiere el header {ADMIN_HEADER}'})
+                    return
+                repository.rebuild_stats()
+            desde = (params.get('from') or params.get('desde') or [None])[0]
+            hasta = (params.get('to') or params.get('hasta') or [None])[0]
+            stats = repository.estadisticas(desde, hasta)
             
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.add_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps(stats).encode('utf-8'))
+            self.send_json(200, stats)
             
-        elif self.path.startswith('/api/exportar-excel'):
-            # Exportar a CSV (más simple que Excel)
-            consultas = cargar_consultas()
+        elif parsed.path == '/api/exportar-excel':
+            self.exportar_consultas(params)
             
-            if not consultas:
-                self.send_response(404)
-                self.end_headers()
+        elif parsed.path == '/propiedades.json':
+            # Servir archivo de propiedades (desde memoria, revalidable con ETag)
+            try:
+                self.send_cached_file('propiedades.json', 'application/json; charset=utf-8',
+                                      f'public, max-age={PROPIEDADES_MAX_AGE}, must-revalidate',
+                                      dependencies=[DERIVADOS_MANIFEST, ASSETS_MANIFEST])
+            except Exception as e:
+                self.send_empty(500)
+        
+        elif parsed.path.startswith('/assets/'):
+            self.send_asset(parsed.path[len('/assets/'):])
+        
+        elif parsed.path == SUMMARY_PATH:
+            # Resumen de las capturas de perfilado, solo con el token de administración
+            if not profiler.authorized(self.headers.get(PROFILE_HEADER)):
+                self.send_empty(404)
                 return
-            
-            # Crear CSV en memoria
-            output = StringIO()
-            writer = csv.writer(output)
-            
-            # Headers
-            writer.writerow([
-                'ID_Consulta', 'Fecha', 'Nombre', 'Telefono', 'Email',
-                'ID_Propiedad', 'Titulo', 'Barrio', 'Tipo', 'Precio', 
-                'Moneda', 'Ambientes', 'Metros_Cuadrados', 'Operacion', 'Descripcion'
-            ])
-            
-            # Datos
-            for consulta in consultas:
-                for prop in consulta.get('propiedades_interes', []):
-                    writer.writerow([
-                        consulta['id'],
-                        consulta['fecha'],
-                        consulta['nombre'],
-                        consulta['telefono'],
-                        consulta['email'],
-                        prop.get('id_temporal', ''),
-                        prop.get('titulo', ''),
-                        prop.get('barrio', ''),
-                        prop.get('tipo', ''),
-                        prop.get('precio', ''),
-                        prop.get('moneda_precio', ''),
-                        prop.get('ambientes', ''),
-                        prop.get('metros_cuadrados', ''),
-                        prop.get('operacion', ''),
-                        prop.get('descripcion', '')
-                    ])
-            
-            csv_content = output.getvalue()
-            output.close()
-            
-            # Enviar archivo
-            filename = f"consultas_dante_completas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            
+            try:
+                limit = int(params.get('limit', ['25'])[0])
+            except ValueError:
+                limit = 25
+            self.send_json(200, profiler.summary(limit, params.get('sort', ['tottime'])[0]))
+        
+        elif parsed.path == '/metrics':
+            data = metricas.REGISTRY.render().encode('utf-8')
             self.send_response(200)
-            self.send_header('Content-Type', 'text/csv')
-            self.send_header('Content-Disposition', f'attachment; filename="{filename}"')
-            self.add_cors_headers()
+            self.send_header('Content-Type', metricas.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(data)))
             self.end_headers()
-            
-            self.wfile.write(csv_content.encode('utf-8'))
-            
-        elif self.path == '/propiedades.json':
-            # Servir archivo de propiedades
-            try:
-                with open('propiedades.json', 'r', encoding='utf-8') as f:
-                    contenido = f.read()
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.add_cors_headers()
-                self.end_headers()
-                self.wfile.write(contenido.encode('utf-8'))
-            except Exception as e:
-                self.send_response(500)
-                self.add_cors_headers()
-                self.end_headers()
+            self.wfile.write(data)
         
         else:
-            self.send_response(404)
-            self.end_headers()
+            self.send_empty(404)
 
 def main():
-    print("🚀 Iniciando backend del chatbot (sin dependencias externas)...")
-    print("📊 Endpoints disponibles:")
-    print("   POST /api/consulta - Guardar consulta")
-    print("   GET  /api/consultas - Obtener todas las consultas")
-    print("   GET  /api/exportar-excel - Exportar a CSV")
-    print("   GET  /api/estadisticas - Ver estadísticas")
-    print("   GET  /propiedades.json - Servir propiedades")
-    
-    server = HTTPServer(('0.0.0.0', 5000), ChatbotHandler)
-    print("\n🌐 Backend funcionando en: http://localhost:5000")
-    print("💡 Ahora puedes abrir: http://localhost:8081/index.html")
-    print("\n⏹️  Para cerrar el servidor: Ctrl+C")
+    parser = argparse.ArgumentParser(description='Backend del chatbot (sin dependencias externas)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=BACKEND_WORKERS,
+                        help='Hilos que atienden conexiones en paralelo')
+    parser.add_argument('--timeout', type=float, default=BACKEND_REQUEST_TIMEOUT,
+                        help='Segundos de espera por socket mientras llega un request (clientes lentos)')
+    parser.add_argument('--idle-timeout', type=float, default=BACKEND_IDLE_TIMEOUT,
+                        help='Segundos que una conexión keep-alive inactiva retiene su hilo')
+    parser.add_argument('--rebuild-stats', action='store_true',
+                        help='Recalcula los acumulados de /api/estadisticas y termina')
+    args = parser.parse_args()
+    ChatbotHandler.timeout = args.timeout
+    ChatbotHandler.idle_timeout = args.idle_timeout
+    
+    # Logs en JSON escritos desde un hilo aparte (LOG_LEVEL, LOG_SAMPLE, LOG_REDACT_PHONES)
+    registro.configure_logging()
+    
+    if args.rebuild_stats:
+        registro.log_event(logger, 'stats_rebuilt', consultas=get_lead_repository().rebuild_stats())
+        get_lead_store().close()
+        registro.shutdown_logging()
+        return
+    
+    # El log y la base se abren antes de aceptar conexiones
+    get_lead_store()
+    server = PooledHTTPServer((args.host, args.port), ChatbotHandler, workers=args.workers)
+    registro.log_event(logger, 'server_started', url=f'http://localhost:{args.port}', workers=server.workers,
+                       endpoints=[
+                           'POST /api/consulta',
+                           'GET /api/consultas?limit=&cursor=&from=&to=&telefono=&email=&propiedad=',
+                           'GET /api/exportar-excel?formato=csv|xlsx&from=&to=',
+                           'GET /api/estadisticas?from=&to= (rebuild=1 con X-Admin-Token)',
+                           'GET /propiedades.json',
+                           'GET /assets/<hash>.<ext>',
+                           'GET /metrics',
+                           'GET /debug/profiles (X-Profile)',
+                       ])
     
     try:
         server.serve_forever()
     except KeyboardInterrupt:
-        print("\n🛑 Servidor detenido.")
-        server.shutdown()
+        registro.log_event(logger, 'server_stopped')
+        server.server_close()
+        get_lead_store().close()
+        registro.shutdown_logging()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
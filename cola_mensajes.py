@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Cola de mensajes entrantes del webhook con un pool de workers
+El webhook solo valida y encola; los workers procesan y entregan la respuesta al sender
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import registro
+
+logger = registro.get_logger('cola_mensajes')
+
+
+@dataclass
+class IncomingMessage:
+    """Mensaje recibido por el webhook, pendiente de procesar"""
+    message_id: str
+    phone_number: str
+    text: str
+    received_at: float = field(default_factory=time.monotonic)
+
+
+def _percentil(muestras: List[float], p: float) -> float:
+    """Percentil p (0-100) de una lista ya ordenada"""
+    if not muestras:
+        return 0.0
+    k = min(len(muestras) - 1, max(0, int(round(p / 100 * (len(muestras) - 1)))))
+    return muestras[k]
+
+
+class MessageDispatcher:
+    """Pool de workers que consume la cola de mensajes del webhook
+
+    handler(texto, teléfono) devuelve la lista de mensajes de respuesta y
+    sender(teléfono, mensajes) los entrega (API de WhatsApp, log, etc.).
+    Cada worker tiene su propia cola y los mensajes de un mismo teléfono van
+    siempre al mismo worker, así se procesan en el orden en que llegaron
+    (un 'Más' nunca se adelanta a la búsqueda que lo precede).
+    """
+
+    def __init__(self, handler: Callable[[str, str], List[str]],
+                 sender: Callable[[str, List[str]], Any],
+                 workers: int = 4, max_queue: int = 1000, latency_samples: int = 1000):
+        self.handler = handler
+        self.sender = sender
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        per_worker = max(1, max_queue // self.workers)
+        self.queues: List["queue.Queue[Optional[IncomingMessage]]"] = [
+            queue.Queue(maxsize=per_worker) for _ in range(self.workers)
+        ]
+        self._ids = itertools.count(1)
+        self._threads: List[Optional[threading.Thread]] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        # Métricas
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._latencies = deque(maxlen=latency_samples)   # recibido -> respondido
+        self._wait_times = deque(maxlen=latency_samples)  # tiempo en cola
+
+    def start(self) -> 'MessageDispatcher':
+        """Lanza los workers (daemon)"""
+        with self._lock:
+            self._stopping.clear()
+            if not self._threads:
+                self._threads = [None] * self.workers
+            for n, t in enumerate(self._threads):
+                if t is None or not t.is_alive():
+                    t = threading.Thread(target=self._worker, args=(self.queues[n],),
+                                         name=f'webhook-worker-{n + 1}', daemon=True)
+                    t.start()
+                    self._threads[n] = t
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Deja de aceptar mensajes y detiene los workers después de vaciar la cola
+
+        Espera como mucho timeout segundos en total: con una cola llena el aviso
+        de fin entra cuando el worker libera lugar, y si no llega a entrar (o un
+        handler no termina) se sigue sin bloquear el apagado.
+        """
+        self._stopping.set()
+        limite = time.monotonic() + timeout
+        for cola in self.queues:
+            try:
+                cola.put(None, timeout=max(0.0, limite - time.monotonic()))
+            except queue.Full:
+                pass
+        for t in self._threads:
+            if t is not None:
+                t.join(timeout=max(0.0, limite - time.monotonic()))
+        vivos = sum(1 for t in self._threads if t is not None and t.is_alive())
+        if vivos:
+            registro.log_event(logger, 'dispatcher_stop_timeout', logging.WARNING, workers_alive=vivos,
+                               queue_depth=sum(cola.qsize() for cola in self.queues))
+        self._threads = []
+
+    def submit(self, text: str, phone_number: str) -> Optional[str]:
+        """Encola un mensaje; devuelve su id o None si la cola está llena (o detenida)"""
+        if self._stopping.is_set():
+            with self._lock:
+                self.rejected += 1
+            return None
+        mensaje = IncomingMessage(f"MSG_{next(self._ids)}", phone_number, text)
+        cola = self.queues[hash(phone_number) % self.workers]
+        try:
+            cola.put_nowait(mensaje)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return None
+        with self._lock:
+            self.enqueued += 1
+        return mensaje.message_id
+
+    def _worker(self, cola: "queue.Queue[Optional[IncomingMessage]]"):
+        while True:
+            mensaje = cola.get()
+            try:
+                if mensaje is None:
+                    return
+                self._process(mensaje)
+            finally:
+                cola.task_done()
+
+    def _process(self, mensaje: IncomingMessage):
+        inicio = time.monotonic()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            respuestas = self.handler(mensaje.text, mensaje.phone_number)
+            self.sender(mensaje.phone_number, respuestas)
+            ok = True
+        except Exception as e:
+            ok = False
+            registro.log_event(logger, 'message_failed', logging.ERROR, exc_info=True,
+                               message_id=mensaje.message_id, phone_number=mensaje.phone_number, error=str(e))
+        fin = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self._wait_times.append(inicio - mensaje.received_at)
+            self._latencies.append(fin - mensaje.received_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidad de la cola, workers y latencias (en milisegundos)"""
+        with self._lock:
+            latencias = sorted(self._latencies)
+            esperas = sorted(self._wait_times)
+            return {
+                'queue_depth': sum(cola.qsize() for cola in self.queues),
+                'queue_capacity': sum(cola.maxsize for cola in self.queues),
+                'workers': self.workers,
+                'workers_alive': sum(1 for t in self._threads if t is not None and t.is_alive()),
+                'in_flight': self.in_flight,
+                'enqueued': self.enqueued,
+                'rejected': self.rejected,
+                'processed': self.processed,
+                'failed': self.failed,
+                'latency_ms': {
+                    'p50': round(_percentil(latencias, 50) * 1000, 2),
+                    'p99': round(_percentil(latencias, 99) * 1000, 2),
+                    'max': round(latencias[-1] * 1000, 2) if latencias else 0.0,
+                },
+                'queue_wait_ms': {
+                    'p50': round(_percentil(esperas, 50) * 1000, 2),
+                    'p99': round(_percentil(esperas, 99) * 1000, 2),
+                },
+            }
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Corpus de mensajes reales de usuarios para benchmarks y pruebas de carga
+"""
+
+# Consultas típicas de los usuarios por WhatsApp
+QUERY_CORPUS = [
+    'Busco departamento en Palermo',
+    'departamento 2 ambientes en Belgrano hasta 150000 dólares',
+    'casa con pileta en venta',
+    'Quiero alquilar un monoambiente en Recoleta',
+    'ph con terraza en Villa Crespo',
+    'oficina en microcentro para alquilar',
+    'necesito una casa de 4 ambientes con cochera',
+    'depto 3 amb con balcón en Caballito',
+    'algo barato en San Telmo',
+    'departamento que acepte mascotas en Núñez',
+    'busco casa en parque avellaneda hasta 200 mil',
+    'alquiler de local en Almagro',
+    'departamento con aire acondicionado y balcón',
+    'terreno en venta en Saavedra',
+    'me interesa un 2 ambientes luminoso cerca de Cabildo',
+    'casa con jardín y parrilla para comprar',
+    'departamento en Palermo Soho entre 100000 y 180000 usd',
+    'cochera en alquiler en Belgrano',
+    'monoambiente a estrenar',
+    'ph reciclado de 3 ambientes con patio',
+    'quiero ver opciones en Colegiales',
+    'Hola, busco algo para alquilar con mi perro',
+    'departamento de 80 metros en Villa Urquiza',
+    'casa en venta de 300 m2',
+    'algo en Retiro o Microcentro para oficina',
+]
+
+# Mensajes de una conversación después de una búsqueda
+FOLLOW_UPS = ['1', 'más', '2', 'todas', '3']
+GREETINGS = ['hola', 'buenas', 'menu', 'ayuda']
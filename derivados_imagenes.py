@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Derivados de las fotos del catálogo: miniatura, mediana y grande en WebP y JPEG
+- Procesa las fotos referenciadas en propiedades.json en un pool de procesos
+- Los archivos se nombran por el hash del contenido: una foto sin cambios no se reprocesa
+- Un manifest JSON relaciona cada foto original con sus variantes
+
+    python derivados_imagenes.py --catalogo propiedades.json --salida imgs/derivados
+
+Requiere Pillow (pip install Pillow); el resto del sistema funciona sin él.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+DERIVADOS_DIR = os.path.join('imgs', 'derivados')
+MANIFEST_NAME = 'manifest.json'
+
+# Variante -> lado mayor en píxeles (nunca se agranda el original)
+VARIANT_SIZES = {
+    'thumb': 320,
+    'medium': 800,
+    'large': 1600,
+}
+
+# Formato -> (extensión, opciones de guardado de Pillow)
+FORMATS = {
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+HASH_LENGTH = 20
+
+
+def content_hash(path: str) -> str:
+    """SHA-256 del archivo (truncado), leído por bloques"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def derivative_name(digest: str, variante: str, formato: str) -> str:
+    extension = FORMATS[formato][0]
+    return f"{digest}-{variante}.{extension}"
+
+
+def _generar_variantes(origen: str, digest: str, salida: str) -> Dict:
+    """Genera todas las variantes de una foto (corre en un proceso del pool)
+
+    Devuelve {'width', 'height', 'variants': {variante: [ancho, alto]}} o {'error'}.
+    """
+    try:
+        with Image.open(origen) as original:
+            imagen = ImageOps.exif_transpose(original)
+            imagen.load()
+        ancho, alto = imagen.size
+        con_alpha = imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info)
+        imagen = imagen.convert('RGBA' if con_alpha else 'RGB')
+
+        variantes = {}
+        for variante, lado in VARIANT_SIZES.items():
+            copia = imagen.copy()
+            copia.thumbnail((lado, lado), Image.LANCZOS)
+            for formato, (_, opciones) in FORMATS.items():
+                destino = os.path.join(salida, derivative_name(digest, variante, formato))
+                if os.path.exists(destino):
+                    continue
+                salida_imagen = copia
+                if formato == 'jpeg' and copia.mode == 'RGBA':
+                    # JPEG no tiene transparencia: se apoya sobre fondo blanco
+                    salida_imagen = Image.new('RGB', copia.size, (255, 255, 255))
+                    salida_imagen.paste(copia, mask=copia.getchannel('A'))
+                temporal = f"{destino}.{os.getpid()}.tmp"
+                salida_imagen.save(temporal, format=formato.upper(), **opciones)
+                os.replace(temporal, destino)
+            variantes[variante] = list(copia.size)
+        return {'width': ancho, 'height': alto, 'variants': variantes}
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def catalog_photos(propiedades: Iterable[Dict]) -> List[str]:
+    """Fotos referenciadas en el catálogo, sin repetir y en orden"""
+    vistas = {}
+    for propiedad in propiedades:
+        for foto in propiedad.get('fotos') or []:
+            if isinstance(foto, str) and foto:
+                vistas.setdefault(foto, None)
+    return list(vistas)
+
+
+def load_manifest(salida: str = DERIVADOS_DIR) -> Dict:
+    """Manifest de derivados ({} si todavía no se generaron)"""
+    try:
+        with open(os.path.join(salida, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _entrada(digest: str, resultado: Dict, url_base: str) -> Dict:
+    """Entrada del manifest para una foto procesada"""
+    variantes = {}
+    for variante, (ancho, alto) in resultado['variants'].items():
+        variantes[variante] = {'width': ancho, 'height': alto}
+        for formato in FORMATS:
+            variantes[variante][formato] = f"{url_base}/{derivative_name(digest, variante, formato)}"
+    return {
+        'hash': digest,
+        'width': resultado['width'],
+        'height': resultado['height'],
+        'variants': variantes,
+    }
+
+
+def _vigente(entrada: Optional[Dict], digest: str, salida: str) -> bool:
+    """True si la entrada anterior corresponde al mismo contenido y sus archivos existen"""
+    if not entrada or entrada.get('hash') != digest:
+        return False
+    return all(
+        os.path.exists(os.path.join(salida, derivative_name(digest, variante, formato)))
+        for variante in VARIANT_SIZES for formato in FORMATS
+    )
+
+
+def build_derivatives(catalogo: str = 'propiedades.json', salida: str = DERIVADOS_DIR,
+                      base_dir: Optional[str] = None, workers: Optional[int] = None) -> Dict:
+    """Genera las variantes que falten y escribe el manifest
+
+    Las rutas de las fotos se resuelven desde base_dir (por defecto, la
+    carpeta del catálogo) y las URLs de las variantes quedan relativas a ella.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow no está instalado: pip install Pillow")
+
+    base_dir = base_dir if base_dir is not None else os.path.dirname(os.path.abspath(catalogo))
+    with open(catalogo, 'r', encoding='utf-8') as f:
+        propiedades = json.load(f)
+    os.makedirs(salida, exist_ok=True)
+    url_base = os.path.relpath(salida, base_dir).replace(os.sep, '/')
+
+    anterior = load_manifest(salida).get('images', {})
+    imagenes: Dict[str, Dict] = {}
+    pendientes: List[Tuple[str, str, str]] = []  # (foto, origen, hash)
+    faltantes = []
+    reutilizadas = 0
+
+    for foto in catalog_photos(propiedades):
+        origen = os.path.join(base_dir, foto)
+        if not os.path.isfile(origen):
+            faltantes.append(foto)
+            continue
+        digest = content_hash(origen)
+        if _vigente(anterior.get(foto), digest, salida):
+            imagenes[foto] = anterior[foto]
+            reutilizadas += 1
+        else:
+            pendientes.append((foto, origen, digest))
+
+    errores = {}
+    if pendientes:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = [pool.submit(_generar_variantes, origen, digest, salida) for _, origen, digest in pendientes]
+            for (foto, _, digest), futuro in zip(pendientes, futuros):
+                resultado = futuro.result()
+                if 'error' in resultado:
+                    errores[foto] = resultado['error']
+                else:
+                    imagenes[foto] = _entrada(digest, resultado, url_base)
+
+    manifest = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sizes': VARIANT_SIZES,
+        'images': imagenes,
+    }
+    temporal = os.path.join(salida, MANIFEST_NAME + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, os.path.join(salida, MANIFEST_NAME))
+
+    manifest['stats'] = {
+        'photos': len(imagenes) + len(errores),
+        'processed': len(pendientes),
+        'reused': reutilizadas,
+        'missing': faltantes,
+        'errors': errores,
+    }
+    return manifest
+
+
+def apply_variants(propiedades: Iterable[Dict], manifest: Dict) -> List[Dict]:
+    """Copias de las propiedades con 'fotos_variantes' (foto original -> variantes)"""
+    imagenes = manifest.get('images', {}) if manifest else {}
+    resultado = []
+    for propiedad in propiedades:
+        variantes = {foto: imagenes[foto]['variants']
+                     for foto in propiedad.get('fotos') or [] if isinstance(foto, str) and foto in imagenes}
+        if variantes:
+            propiedad = dict(propiedad, fotos_variantes=variantes)
+        resultado.append(propiedad)
+    return resultado
+
+
+def smallest_variant(propiedad: Dict, foto: str, min_width: int = 0, formato: str = 'webp') -> str:
+    """URL de la variante más chica con al menos min_width de ancho (o la foto original)"""
+    variantes = (propiedad.get('fotos_variantes') or {}).get(foto)
+    if not variantes:
+        return foto
+    candidatas = sorted(variantes.values(), key=lambda v: v['width'])
+    for variante in candidatas:
+        if variante['width'] >= min_width:
+            return variante[formato]
+    return candidatas[-1][formato]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera miniaturas y variantes WebP/JPEG de las fotos del catálogo')
+    parser.add_argument('--catalogo', default='propiedades.json')
+    parser.add_argument('--salida', default=DERIVADOS_DIR, help='Carpeta de las variantes y el manifest')
+    parser.add_argument('--workers', type=int, default=None, help='Procesos del pool (por defecto, uno por CPU)')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    manifest = build_derivatives(args.catalogo, args.salida, workers=args.workers)
+    stats = manifest['stats']
+    print(f"🖼️ {stats['photos']} fotos: {stats['processed']} procesadas, {stats['reused']} sin cambios "
+          f"({time.perf_counter() - inicio:.1f}s)")
+    for foto in stats['missing']:
+        print(f"⚠️ No existe: {foto}")
+    for foto, error in stats['errors'].items():
+        print(f"❌ {foto}: {error}")
+
+
+if __name__ == '__main__':
+    main()
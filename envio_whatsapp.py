@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Envío de respuestas por la WhatsApp Cloud API
+- Pool de conexiones keep-alive (requests.Session)
+- Límite de mensajes por segundo por cuenta (token bucket)
+- Reintentos con backoff exponencial y archivo de dead-letter
+- Modo prueba de carga contra la API local de stub_whatsapp_api.py
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import registro
+
+logger = registro.get_logger('envio_whatsapp')
+
+# Respuestas que vale la pena reintentar
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Vuelta del worker sin mensaje nuevo (solo vencieron reintentos)
+_SIN_MENSAJE = object()
+
+
+class RateLimiter:
+    """Token bucket: como máximo `rate` envíos por segundo con ráfagas de `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (ahora - self.updated) * self.rate)
+                self.updated = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.rate
+            time.sleep(espera)
+
+
+class WhatsAppSender:
+    """Cola de salida con workers que envían por la WhatsApp Cloud API
+
+    Los mensajes de un mismo destinatario van siempre al mismo worker, así
+    las páginas de una respuesta llegan en orden. Cada mensaje es un POST
+    sobre las conexiones persistentes del pool. Los reintentos no duermen
+    en el worker: esperan en un heap con su hora de vencimiento y mientras
+    tanto se siguen enviando los mensajes de otros destinatarios.
+    """
+
+    def __init__(self, api_url: str, phone_number_id: str, token: str,
+                 api_version: str = 'v19.0', workers: int = 4, pool_size: int = 16,
+                 rate_limit: float = 80, max_retries: int = 5, backoff_base: float = 0.5,
+                 backoff_max: float = 30, timeout: float = 10,
+                 max_queue: int = 10000, dead_letter_file: str = 'whatsapp_dead_letter.jsonl'):
+        self.api_url = api_url.rstrip('/')
+        self.api_version = api_version
+        self.default_account = phone_number_id
+        self.token = token
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.dead_letter_file = dead_letter_file
+        self.rate_limit = rate_limit
+
+        # Conexiones keep-alive compartidas por todos los workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+        })
+
+        per_worker = max(1, max_queue // self.workers)
+        self.queues: List["queue.Queue[Optional[Tuple[str, str, str]]]"] = [
+            queue.Queue(maxsize=per_worker) for _ in range(self.workers)
+        ]
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._dead_letter_lock = threading.Lock()
+
+        # Métricas
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls) -> Optional['WhatsAppSender']:
+        """Crea el sender desde variables de entorno (None si falta la configuración)"""
+        token = os.environ.get('WHATSAPP_TOKEN')
+        phone_number_id = os.environ.get('WHATSAPP_PHONE_NUMBER_ID')
+        if not token or not phone_number_id:
+            return None
+        return cls(
+            api_url=os.environ.get('WHATSAPP_API_URL', 'https://graph.facebook.com'),
+            phone_number_id=phone_number_id,
+            token=token,
+            api_version=os.environ.get('WHATSAPP_API_VERSION', 'v19.0'),
+            workers=int(os.environ.get('WHATSAPP_SENDER_WORKERS', '4')),
+            rate_limit=float(os.environ.get('WHATSAPP_RATE_LIMIT', '80')),
+            max_retries=int(os.environ.get('WHATSAPP_MAX_RETRIES', '5')),
+            dead_letter_file=os.environ.get('WHATSAPP_DEAD_LETTER_FILE', 'whatsapp_dead_letter.jsonl'),
+        )
+
+    def _limiter(self, account: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(account)
+            if limiter is None:
+                limiter = self._limiters[account] = RateLimiter(self.rate_limit)
+            return limiter
+
+    def start(self) -> 'WhatsAppSender':
+        """Lanza los workers de envío (daemon)"""
+        with self._lock:
+            if not self._threads:
+                for n, cola in enumerate(self.queues):
+                    t = threading.Thread(target=self._worker, args=(cola,),
+                                         name=f'whatsapp-sender-{n + 1}', daemon=True)
+                    t.start()
+                    self._threads.append(t)
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """Envía lo pendiente y detiene los workers"""
+        for cola in self.queues:
+            cola.put(None)
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def send(self, phone_number: str, messages: List[str], account: Optional[str] = None):
+        """Encola los mensajes de una respuesta para un destinatario"""
+        account = account or self.default_account
+        cola = self.queues[hash(phone_number) % self.workers]
+        for text in messages:
+            try:
+                cola.put_nowait((account, phone_number, text))
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                self._dead_letter(account, phone_number, text, 'queue full')
+
+    # Permite usar la instancia directamente como sender del MessageDispatcher
+    __call__ = send
+
+    def _worker(self, cola):
+        """Envía los mensajes de un shard hasta recibir None (y terminar los reintentos)
+
+        Un mensaje que espera su reintento retiene a los que llegan después
+        para el mismo destinatario, así no cambia el orden; los de otros
+        destinatarios salen sin esperar.
+        """
+        reintentos: List[Tuple[float, int, int, Tuple[str, str, str]]] = []  # (vence, orden, intento, item)
+        retenidos: Dict[str, Deque[Tuple[str, str, str]]] = {}  # teléfono -> mensajes detrás de un reintento
+        orden = itertools.count()
+        deteniendo = False
+
+        def intentar(item, intento: int) -> bool:
+            """True si el mensaje quedó resuelto (enviado o en dead-letter)"""
+            try:
+                espera = self._attempt(*item, intento)
+            except Exception as e:
+                registro.log_event(logger, 'send_failed', logging.ERROR, exc_info=True, error=str(e))
+                espera = None
+            if espera is None:
+                cola.task_done()
+                return True
+            heapq.heappush(reintentos, (time.monotonic() + espera, next(orden), intento + 1, item))
+            retenidos.setdefault(item[1], deque())
+            return False
+
+        def liberar(phone_number: str):
+            """Envía los mensajes retenidos detrás de un reintento ya resuelto"""
+            pendientes = retenidos.pop(phone_number, deque())
+            while pendientes:
+                if not intentar(pendientes.popleft(), 0):
+                    retenidos[phone_number].extend(pendientes)
+                    return
+
+        while not (deteniendo and not reintentos):
+            espera = max(0.0, reintentos[0][0] - time.monotonic()) if reintentos else None
+            if deteniendo:
+                time.sleep(espera)
+                item = _SIN_MENSAJE
+            else:
+                try:
+                    item = cola.get(timeout=espera)
+                except queue.Empty:
+                    item = _SIN_MENSAJE
+
+            if item is None:
+                cola.task_done()
+                deteniendo = True
+            elif item is not _SIN_MENSAJE:
+                if item[1] in retenidos:
+                    retenidos[item[1]].append(item)
+                else:
+                    intentar(item, 0)
+
+            while reintentos and reintentos[0][0] <= time.monotonic():
+                _, _, intento, item = heapq.heappop(reintentos)
+                if intentar(item, intento):
+                    liberar(item[1])
+
+    def _attempt(self, account: str, phone_number: str, text: str, intento: int = 0) -> Optional[float]:
+        """Un intento de envío: None si quedó resuelto, o los segundos hasta reintentar
+
+        Si falla el último intento (o un error que no se reintenta) el mensaje
+        va al dead-letter.
+        """
+        url = f"{self.api_url}/{self.api_version}/{account}/messages"
+        payload = {
+            'messaging_product': 'whatsapp',
+            'recipient_type': 'individual',
+            'to': phone_number,
+            'type': 'text',
+            'text': {'preview_url': False, 'body': text},
+        }
+        self._limiter(account).acquire()
+        retry_after = None
+        try:
+            response = self.session.post(url, json=payload, timeout=self.timeout)
+            if response.status_code < 300:
+                with self._lock:
+                    self.sent += 1
+                return None
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            reintentable = response.status_code in RETRY_STATUS
+            retry_after = response.headers.get('Retry-After')
+        except requests.RequestException as e:
+            error = str(e)
+            reintentable = True
+
+        if not reintentable or intento >= self.max_retries:
+            self._dead_letter(account, phone_number, text, error)
+            return None
+        with self._lock:
+            self.retried += 1
+        return self._backoff(intento, retry_after)
+
+    def _backoff(self, intento: int, retry_after: Optional[str] = None) -> float:
+        """Espera antes del próximo intento: Retry-After o exponencial con jitter"""
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        espera = min(self.backoff_max, self.backoff_base * (2 ** intento))
+        return espera * random.uniform(0.5, 1.0)
+
+    def _dead_letter(self, account: str, phone_number: str, text: str, error: str):
+        """Guarda un mensaje que no se pudo entregar (una línea JSON por mensaje)"""
+        entrada = {
+            'fecha': datetime.now().isoformat(),
+            'account': account,
+            'to': phone_number,
+            'text': text,
+            'error': error,
+        }
+        with self._dead_letter_lock:
+            with open(self.dead_letter_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+        with self._lock:
+            self.dead_lettered += 1
+
+    def pending(self) -> int:
+        """Mensajes en cola esperando envío"""
+        return sum(cola.qsize() for cola in self.queues)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del envío"""
+        return {
+            'pending': self.pending(),
+            'workers': self.workers,
+            'sent': self.sent,
+            'retried': self.retried,
+            'dead_lettered': self.dead_lettered,
+            'dropped': self.dropped,
+            'rate_limit_per_account': self.rate_limit,
+        }
+
+
+def main():
+    """Prueba de carga del envío contra la API local (o la URL indicada)"""
+    parser = argparse.ArgumentParser(description='Prueba de throughput del envío de WhatsApp')
+    parser.add_argument('--url', help='URL de la API (por defecto levanta el stub local)')
+    parser.add_argument('--mensajes', type=int, default=1000, help='Cantidad de mensajes a enviar')
+    parser.add_argument('--destinatarios', type=int, default=100, help='Cantidad de teléfonos distintos')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=0, help='Límite por cuenta (0 = sin límite)')
+    parser.add_argument('--latencia', type=float, default=0.005, help='Latencia simulada del stub (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Proporción de 500 del stub')
+    args = parser.parse_args()
+
+    stub = None
+    url = args.url
+    if not url:
+        from stub_whatsapp_api import start_stub
+        stub = start_stub(port=0, latency=args.latencia, error_rate=args.error_rate)
+        url = f"http://127.0.0.1:{stub.server_port}"
+        print(f"🧪 API stub local en {url}")
+
+    sender = WhatsAppSender(url, 'TEST_PHONE_ID', 'test-token', workers=args.workers,
+                            pool_size=args.workers, rate_limit=args.rate,
+                            backoff_base=0.05, dead_letter_file='whatsapp_dead_letter_test.jsonl').start()
+
+    inicio = time.perf_counter()
+    for i in range(args.mensajes):
+        sender.send(f"54911{i % args.destinatarios:08d}", [f"Mensaje de prueba {i}"])
+    for cola in sender.queues:
+        cola.join()
+    duracion = time.perf_counter() - inicio
+    sender.stop()
+
+    print(f"📤 {args.mensajes} mensajes en {duracion:.2f}s ({args.mensajes / duracion:.1f} msg/s)")
+    print(f"📊 {json.dumps(sender.stats())}")
+    if stub is not None:
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
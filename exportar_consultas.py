@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Exportación de consultas en CSV y Excel (.xlsx) como generadores de bytes
+- Las filas se producen de a una: la memoria no crece con la cantidad de consultas
+- El .xlsx se arma con zipfile de la biblioteca estándar, sin dependencias externas
+"""
+
+import csv
+import math
+import re
+import zipfile
+from io import StringIO
+from typing import Any, Dict, Iterable, Iterator, List
+from xml.sax.saxutils import escape
+
+EXPORT_COLUMNS = [
+    'ID_Consulta', 'Fecha', 'Nombre', 'Telefono', 'Email',
+    'ID_Propiedad', 'Titulo', 'Barrio', 'Tipo', 'Precio',
+    'Moneda', 'Ambientes', 'Metros_Cuadrados', 'Operacion', 'Descripcion'
+]
+
+# Tamaño aproximado de cada bloque que se entrega al cliente
+CHUNK_SIZE = 64 * 1024
+
+# Caracteres de control que XML 1.0 no admite
+_XML_INVALIDO = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def filas_consultas(consultas: Iterable[Dict]) -> Iterator[List[Any]]:
+    """Una fila por cada propiedad de interés de cada consulta"""
+    for consulta in consultas:
+        for prop in consulta.get('propiedades_interes', []):
+            if not isinstance(prop, dict):
+                continue
+            yield [
+                consulta.get('id', ''),
+                consulta.get('fecha', ''),
+                consulta.get('nombre', ''),
+                consulta.get('telefono', ''),
+                consulta.get('email', ''),
+                prop.get('id_temporal', ''),
+                prop.get('titulo', ''),
+                prop.get('barrio', ''),
+                prop.get('tipo', ''),
+                prop.get('precio', ''),
+                prop.get('moneda_precio', ''),
+                prop.get('ambientes', ''),
+                prop.get('metros_cuadrados', ''),
+                prop.get('operacion', ''),
+                prop.get('descripcion', '')
+            ]
+
+
+def iter_csv(filas: Iterable[List[Any]], columnas: List[str] = EXPORT_COLUMNS,
+             chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """CSV en bloques de ~chunk_size bytes (UTF-8)"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columnas)
+    for fila in filas:
+        writer.writerow(fila)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# ----------------------------------------------------------------------
+# Excel (.xlsx)
+# ----------------------------------------------------------------------
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{nombre}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+SHEET_HEADER_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+SHEET_FOOTER_XML = '</sheetData></worksheet>'
+
+
+class _ChunkBuffer:
+    """Destino de escritura no posicionable: el zip se va entregando por partes"""
+
+    def __init__(self):
+        self.partes: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.partes.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.partes)
+        self.partes = []
+        self.size = 0
+        return data
+
+
+def _columna(n: int) -> str:
+    """Letra de columna de Excel (0 -> A, 26 -> AA)"""
+    letras = ''
+    n += 1
+    while n:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _es_numero(valor: Any) -> bool:
+    """True si el valor se puede escribir como celda numérica"""
+    if isinstance(valor, bool):
+        return False
+    # NaN e infinito no son válidos en <v>: van como texto, igual que en el CSV
+    return isinstance(valor, int) or isinstance(valor, float) and math.isfinite(valor)
+
+
+def _celda(referencia: str, valor: Any) -> str:
+    if _es_numero(valor):
+        return f'<c r="{referencia}"><v>{valor}</v></c>'
+    texto = escape(_XML_INVALIDO.sub('', '' if valor is None else str(valor)))
+    return f'<c r="{referencia}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(numero: int, fila: List[Any]) -> str:
+    celdas = ''.join(_celda(f'{_columna(i)}{numero}', valor) for i, valor in enumerate(fila))
+    return f'<row r="{numero}">{celdas}</row>'
+
+
+def iter_xlsx(filas: Iterable[List[Any]], columnas: List[str] = EXPORT_COLUMNS,
+              hoja: str = 'Consultas', chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Libro .xlsx de una hoja en bloques de bytes
+
+    Las celdas de texto van como inlineStr (sin tabla de strings compartidos)
+    y el zip se escribe en modo streaming, así nada depende de la cantidad de filas.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        zf.writestr('_rels/.rels', RELS_XML)
+        zf.writestr('xl/workbook.xml', WORKBOOK_XML.format(nombre=escape(hoja, {'"': '&quot;'})))
+        zf.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML)
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(SHEET_HEADER_XML.encode('utf-8'))
+            sheet.write(_fila_xml(1, columnas).encode('utf-8'))
+            for numero, fila in enumerate(filas, start=2):
+                sheet.write(_fila_xml(numero, fila).encode('utf-8'))
+                if buffer.size >= chunk_size:
+                    yield buffer.drain()
+            sheet.write(SHEET_FOOTER_XML.encode('utf-8'))
+    yield buffer.drain()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Generador de carga HTTP local para el chatbot y el backend
+- Mezcla webhooks ({"message", "from"}), búsquedas /search?q= y posts a /api/consulta
+- Lazo cerrado (N clientes que repiten sin pausa) o lazo abierto (llegadas a tasa fija)
+- Informa throughput, histograma de latencias y tasa de errores por tipo de request
+
+    python generador_carga.py --chatbot http://127.0.0.1:5000 --concurrencia 16 --duracion 30
+    python generador_carga.py --chatbot http://127.0.0.1:5000 --backend http://127.0.0.1:5001 \\
+        --rate 200 --mix webhook=6,search=3,consulta=1 --salida carga.json
+
+En lazo abierto la latencia se mide desde el momento programado de cada
+request: si el servidor se atrasa, la espera en cola también cuenta.
+"""
+
+import argparse
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from corpus_consultas import FOLLOW_UPS, QUERY_CORPUS
+
+# Límites superiores de los buckets del histograma (ms)
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf')]
+
+DEFAULT_MIX = 'webhook=6,search=3,consulta=1'
+
+# Tipo de request -> servidor que lo atiende
+TARGETS = {'webhook': 'chatbot', 'search': 'chatbot', 'consulta': 'backend'}
+
+
+def _percentil(muestras: List[float], p: float) -> float:
+    if not muestras:
+        return 0.0
+    k = min(len(muestras) - 1, max(0, int(round(p / 100 * (len(muestras) - 1)))))
+    return muestras[k]
+
+
+def parse_mix(texto: str) -> Dict[str, float]:
+    """'webhook=6,search=3' -> {'webhook': 6.0, 'search': 3.0}"""
+    mix = {}
+    for parte in texto.split(','):
+        if not parte.strip():
+            continue
+        nombre, _, peso = parte.partition('=')
+        nombre = nombre.strip()
+        if nombre not in TARGETS:
+            raise ValueError(f"Tipo de request desconocido: {nombre} (válidos: {', '.join(TARGETS)})")
+        mix[nombre] = float(peso or 1)
+    return mix
+
+
+class RequestFactory:
+    """Arma requests realistas: (tipo, método, ruta, cuerpo, headers)"""
+
+    def __init__(self, seed: int = 0, phones: int = 500):
+        self.rng = random.Random(seed)
+        self.phones = phones
+        self._lock = threading.Lock()
+
+    def build(self, tipo: str) -> Tuple[str, str, Optional[bytes], Dict[str, str]]:
+        with self._lock:
+            telefono = f"54911{self.rng.randrange(self.phones):08d}"
+            consulta = self.rng.choice(QUERY_CORPUS)
+            # Un tercio de los webhooks son seguimientos de una búsqueda previa
+            mensaje = self.rng.choice(FOLLOW_UPS) if self.rng.random() < 0.33 else consulta
+            propiedad = f"UF{self.rng.randrange(5):03d}"
+
+        if tipo == 'webhook':
+            cuerpo = json.dumps({'message': mensaje, 'from': telefono}).encode('utf-8')
+            return 'POST', '/webhook', cuerpo, {'Content-Type': 'application/json'}
+        if tipo == 'search':
+            return 'GET', '/search?' + urllib.parse.urlencode({'q': consulta}), None, {}
+        cuerpo = json.dumps({
+            'nombre': 'Prueba de carga',
+            'telefono': telefono,
+            'email': f'carga{telefono[-4:]}@example.com',
+            'propiedades': [{'id_temporal': propiedad, 'titulo': consulta, 'tipo': 'departamento',
+                             'barrio': 'Palermo', 'operacion': 'venta'}],
+        }).encode('utf-8')
+        return 'POST', '/api/consulta', cuerpo, {'Content-Type': 'application/json'}
+
+
+class Worker(threading.Thread):
+    """Cliente con conexiones keep-alive propias; guarda sus mediciones sin locks"""
+
+    def __init__(self, n: int, bases: Dict[str, urllib.parse.SplitResult], factory: RequestFactory,
+                 mix: Dict[str, float], timeout: float, seed: int):
+        super().__init__(name=f'carga-{n}', daemon=True)
+        self.bases = bases
+        self.factory = factory
+        self.tipos = list(mix)
+        self.pesos = list(mix.values())
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.connections: Dict[str, http.client.HTTPConnection] = {}
+        # (tipo, latencia total, latencia de servicio, status o None, error)
+        self.samples: List[Tuple[str, float, float, Optional[int], str]] = []
+        self.next_arrival = None   # (cola, evento de fin) en lazo abierto
+        self.deadline = 0.0
+
+    def _connection(self, servidor: str) -> http.client.HTTPConnection:
+        conn = self.connections.get(servidor)
+        if conn is None:
+            base = self.bases[servidor]
+            clase = http.client.HTTPSConnection if base.scheme == 'https' else http.client.HTTPConnection
+            conn = self.connections[servidor] = clase(base.hostname, base.port, timeout=self.timeout)
+        return conn
+
+    def _request(self, programado: float):
+        tipo = self.rng.choices(self.tipos, self.pesos)[0]
+        servidor = TARGETS[tipo]
+        metodo, ruta, cuerpo, headers = self.factory.build(tipo)
+        inicio = time.perf_counter()
+        status, error = None, ''
+        try:
+            conn = self._connection(servidor)
+            prefijo = self.bases[servidor].path.rstrip('/')
+            conn.request(metodo, prefijo + ruta, body=cuerpo, headers=headers)
+            respuesta = conn.getresponse()
+            respuesta.read()
+            status = respuesta.status
+            if respuesta.will_close:
+                conn.close()
+                self.connections.pop(servidor, None)
+        except Exception as e:
+            error = type(e).__name__
+            conn = self.connections.pop(servidor, None)
+            if conn is not None:
+                conn.close()
+        fin = time.perf_counter()
+        self.samples.append((tipo, fin - programado, fin - inicio, status, error))
+
+    def run(self):
+        if self.next_arrival is None:
+            # Lazo cerrado: un request detrás de otro hasta el fin
+            while time.perf_counter() < self.deadline:
+                self._request(time.perf_counter())
+        else:
+            llegadas, fin = self.next_arrival
+            while True:
+                try:
+                    programado = llegadas.get(timeout=0.1)
+                except queue.Empty:
+                    if fin.is_set():
+                        break
+                    continue
+                if programado is None:
+                    break
+                self._request(programado)
+        for conn in self.connections.values():
+            conn.close()
+
+
+def programar_llegadas(llegadas: "queue.Queue[Optional[float]]", rate: float, duracion: float,
+                       poisson: bool, seed: int, workers: int) -> int:
+    """Encola los instantes de llegada (lazo abierto); devuelve cuántos se programaron"""
+    rng = random.Random(seed)
+    inicio = time.perf_counter()
+    siguiente = inicio
+    programados = 0
+    while siguiente < inicio + duracion:
+        espera = siguiente - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        llegadas.put(siguiente)
+        programados += 1
+        siguiente += rng.expovariate(rate) if poisson else 1.0 / rate
+    for _ in range(workers):
+        llegadas.put(None)
+    return programados
+
+
+def histograma(latencias_ms: List[float]) -> Dict[str, int]:
+    """Cantidad de requests por bucket de latencia ('<=10ms', ..., '>5000ms')"""
+    conteo = defaultdict(int)
+    for latencia in latencias_ms:
+        for limite in HISTOGRAM_BUCKETS_MS:
+            if latencia <= limite:
+                conteo[limite] += 1
+                break
+    resultado = {}
+    anterior = HISTOGRAM_BUCKETS_MS[-2]
+    for limite in HISTOGRAM_BUCKETS_MS:
+        etiqueta = f'>{anterior:g}ms' if limite == float('inf') else f'<={limite:g}ms'
+        resultado[etiqueta] = conteo.get(limite, 0)
+    return resultado
+
+
+def resumir(samples: List[Tuple[str, float, float, Optional[int], str]], duracion: float) -> Dict:
+    """Throughput, latencias, histograma y errores de un conjunto de mediciones"""
+    latencias = sorted(s[1] * 1000 for s in samples)
+    servicio = sorted(s[2] * 1000 for s in samples)
+    errores = defaultdict(int)
+    for _, _, _, status, error in samples:
+        if error:
+            errores[error] += 1
+        elif status is None or status >= 400:
+            errores[f'HTTP {status}'] += 1
+    total_errores = sum(errores.values())
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / duracion, 1) if duracion else 0.0,
+        'errors': total_errores,
+        'error_rate': round(total_errores / len(samples), 4) if samples else 0.0,
+        'errors_by_kind': dict(errores),
+        'latency_ms': {
+            'p50': round(_percentil(latencias, 50), 2),
+            'p90': round(_percentil(latencias, 90), 2),
+            'p99': round(_percentil(latencias, 99), 2),
+            'max': round(latencias[-1], 2) if latencias else 0.0,
+            'mean': round(sum(latencias) / len(latencias), 2) if latencias else 0.0,
+        },
+        'service_ms': {
+            'p50': round(_percentil(servicio, 50), 2),
+            'p99': round(_percentil(servicio, 99), 2),
+        },
+        'histogram': histograma(latencias),
+    }
+
+
+def run_load(bases: Dict[str, str], mix: Dict[str, float], concurrencia: int, duracion: float,
+             rate: float = 0, poisson: bool = False, timeout: float = 10, seed: int = 1) -> Dict:
+    """Corre la prueba y devuelve el informe (lazo abierto si rate > 0)"""
+    mix = {tipo: peso for tipo, peso in mix.items() if peso > 0 and TARGETS[tipo] in bases}
+    if not mix:
+        raise ValueError('Ningún tipo de request tiene un servidor configurado')
+    urls = {servidor: urllib.parse.urlsplit(url) for servidor, url in bases.items()}
+    factory = RequestFactory(seed)
+    workers = [Worker(n, urls, factory, mix, timeout, seed + n + 1) for n in range(concurrencia)]
+
+    inicio = time.perf_counter()
+    programados = None
+    if rate > 0:
+        llegadas: "queue.Queue[Optional[float]]" = queue.Queue()
+        fin = threading.Event()
+        for w in workers:
+            w.next_arrival = (llegadas, fin)
+            w.start()
+        programados = programar_llegadas(llegadas, rate, duracion, poisson, seed, len(workers))
+        fin.set()
+    else:
+        for w in workers:
+            w.deadline = inicio + duracion
+            w.start()
+    for w in workers:
+        w.join()
+    transcurrido = time.perf_counter() - inicio
+
+    samples = [s for w in workers for s in w.samples]
+    por_tipo = defaultdict(list)
+    for s in samples:
+        por_tipo[s[0]].append(s)
+
+    return {
+        'meta': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'targets': bases,
+            'mode': 'open' if rate > 0 else 'closed',
+            'rate': rate,
+            'poisson': poisson,
+            'concurrency': concurrencia,
+            'duration_s': round(transcurrido, 2),
+            'mix': mix,
+            'scheduled': programados,
+        },
+        'total': resumir(samples, transcurrido),
+        'by_type': {tipo: resumir(muestras, transcurrido) for tipo, muestras in sorted(por_tipo.items())},
+    }
+
+
+def imprimir(informe: Dict):
+    meta = informe['meta']
+    modo = f"lazo abierto a {meta['rate']:g} req/s" if meta['mode'] == 'open' else 'lazo cerrado'
+    print(f"\n🚦 {modo}, {meta['concurrency']} clientes, {meta['duration_s']}s")
+    for nombre, r in [('TOTAL', informe['total'])] + list(informe['by_type'].items()):
+        lat = r['latency_ms']
+        print(f"   {nombre:<9} {r['requests']:>7} req  {r['throughput_rps']:>8.1f} req/s  "
+              f"p50 {lat['p50']:>8.2f}ms  p90 {lat['p90']:>8.2f}ms  p99 {lat['p99']:>8.2f}ms  "
+              f"errores {r['error_rate'] * 100:5.1f}%")
+    total = informe['total']
+    if total['errors_by_kind']:
+        print(f"   ❌ {total['errors_by_kind']}")
+    mayor = max(total['histogram'].values()) or 1
+    print("\n   Histograma de latencias")
+    for etiqueta, cantidad in total['histogram'].items():
+        print(f"   {etiqueta:>9} {cantidad:>7} {'█' * int(40 * cantidad / mayor)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de carga para el chatbot y el backend')
+    parser.add_argument('--chatbot', help='URL base de whatsapp_chatbot.py (webhook y search)')
+    parser.add_argument('--backend', help='URL base de chatbot_backend_simple.py (api/consulta)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Pesos por tipo (por defecto {DEFAULT_MIX})')
+    parser.add_argument('--concurrencia', type=int, default=8, help='Clientes en paralelo')
+    parser.add_argument('--duracion', type=float, default=10, help='Segundos de prueba')
+    parser.add_argument('--rate', type=float, default=0, help='Llegadas por segundo (lazo abierto); 0 = lazo cerrado')
+    parser.add_argument('--poisson', action='store_true', help='Llegadas con intervalos exponenciales')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--salida', help='Guardar el informe en JSON')
+    args = parser.parse_args()
+
+    bases = {}
+    if args.chatbot:
+        bases['chatbot'] = args.chatbot
+    if args.backend:
+        bases['backend'] = args.backend
+    if not bases:
+        parser.error('Indicá --chatbot y/o --backend')
+
+    informe = run_load(bases, parse_mix(args.mix), args.concurrencia, args.duracion,
+                       rate=args.rate, poisson=args.poisson, timeout=args.timeout, seed=args.seed)
+    imprimir(informe)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Informe en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Índices en memoria sobre el catálogo de propiedades
+Se construyen una sola vez al cargar propiedades.json y permiten generar
+candidatos por intersección/unión de postings en lugar de recorrer todo el catálogo
+"""
+
+import heapq
+import math
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Amenity detectada -> (campo en propiedades.json, valor que indica que la tiene)
+AMENITY_FIELDS = {
+    'pileta': ('pileta', 'si'),
+    'cochera': ('cochera', 'x'),
+    'balcon': ('balcon', 'x'),
+    'aire': ('aire_acondicionado', 'si'),
+    'mascotas': ('acepta_mascotas', 'si'),
+}
+
+
+# Pesos por defecto de cada señal de relevancia
+DEFAULT_WEIGHTS = {
+    'barrio': 10,
+    'tipo': 8,
+    'operacion': 6,
+    'precio': 5,
+    'ambientes': 4,
+    'metros': 3,
+    'amenity': 2,
+    'texto': 1,
+}
+
+# Campos que forman el texto libre de cada propiedad
+TEXT_FIELDS = ('titulo', 'descripcion', 'direccion')
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Divide un texto en palabras completas en minúsculas"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """Resultado de búsqueda inmutable: referencia a la propiedad y su puntaje"""
+    doc_id: int
+    property_id: str
+    score: float
+
+
+def rank(columns: Dict[str, Dict[int, float]], weights: Dict[str, float],
+         candidatos: Optional[Iterable[int]] = None, constante: float = 0,
+         limit: Optional[int] = None) -> Tuple[List[Tuple[int, float]], int]:
+    """Puntúa todos los candidatos en lote y devuelve (top-k, total con score > 0)
+
+    columns es una matriz dispersa señal -> {id: valor}; el puntaje de cada
+    candidato es el producto de su fila por el vector de pesos más una
+    constante (las señales que comparten todos los candidatos, como los rangos).
+    Si no se indican candidatos se usan los ids presentes en alguna columna.
+    """
+    scores: Dict[int, float] = defaultdict(float)
+    for senal, columna in columns.items():
+        peso = weights.get(senal, 0)
+        if not peso:
+            continue
+        for doc_id, valor in columna.items():
+            scores[doc_id] += peso * valor
+
+    if candidatos is None:
+        candidatos = scores
+    puntuados = []
+    for doc_id in candidatos:
+        puntaje = scores.get(doc_id, 0) + constante
+        if puntaje > 0:
+            puntuados.append((doc_id, puntaje))
+    total = len(puntuados)
+
+    # Mayor puntaje primero; a igual puntaje, el orden del catálogo (id menor)
+    clave = lambda item: (-item[1], item[0])
+    if limit is None or limit >= total:
+        return sorted(puntuados, key=clave), total
+    # Selección parcial con un heap de tamaño k: solo se ordenan los ganadores
+    return heapq.nsmallest(limit, puntuados, key=clave), total
+
+
+def _campo_texto(propiedad: Dict, campo: str) -> str:
+    """Devuelve un campo de texto en minúsculas (vacío si falta)"""
+    valor = propiedad.get(campo, '')
+    return str(valor).lower() if valor is not None else ''
+
+
+def _campo_numerico(propiedad: Dict, campo: str) -> float:
+    """Devuelve un campo numérico (0 si falta o no es un número)"""
+    valor = propiedad.get(campo, 0)
+    if isinstance(valor, (int, float)):
+        return valor
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0
+
+
+class RangeIndex:
+    """Columna ordenada de un campo numérico para filtrar rangos con bisect"""
+
+    def __init__(self, valores: List[float]):
+        orden = sorted(range(len(valores)), key=valores.__getitem__)
+        self.valores = [valores[doc_id] for doc_id in orden]
+        self.ids = orden
+
+    def between(self, minimo: Optional[float] = None, maximo: Optional[float] = None) -> List[int]:
+        """Ids con minimo <= valor <= maximo (un límite en 0/None no filtra)"""
+        inicio = bisect_left(self.valores, minimo) if minimo else 0
+        fin = bisect_right(self.valores, maximo) if maximo else len(self.valores)
+        return self.ids[inicio:fin]
+
+
+class TextIndex:
+    """Índice invertido de texto libre con puntajes BM25"""
+
+    def __init__(self, documentos: List[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.total = len(documentos)
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # término -> [(id, tf)]
+        self.doc_lengths: List[int] = []
+
+        for doc_id, documento in enumerate(documentos):
+            tokens = tokenize(documento)
+            self.doc_lengths.append(len(tokens))
+            for termino, tf in Counter(tokens).items():
+                self.postings[termino].append((doc_id, tf))
+
+        self.avg_length = (sum(self.doc_lengths) / self.total) if self.total else 0
+
+    def idf(self, termino: str) -> float:
+        """IDF de BM25 (siempre positivo)"""
+        df = len(self.postings.get(termino, ()))
+        return math.log(1 + (self.total - df + 0.5) / (df + 0.5))
+
+    def score(self, terminos: Iterable[str], permitidos: Optional[Set[int]] = None) -> Dict[int, float]:
+        """Puntajes BM25 de los documentos que contienen alguno de los términos"""
+        scores: Dict[int, float] = defaultdict(float)
+        avg_length = self.avg_length or 1
+
+        for termino in set(terminos):
+            posting = self.postings.get(termino)
+            if not posting:
+                continue
+            idf = self.idf(termino)
+            for doc_id, tf in posting:
+                if permitidos is not None and doc_id not in permitidos:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return scores
+
+
+class PropertyIndex:
+    """Índice invertido por barrio, tipo, operación y amenities"""
+
+    def __init__(self, propiedades: List[Dict]):
+        self.propiedades = propiedades
+        self.total = len(propiedades)
+
+        # id_temporal -> posición en el catálogo
+        self.by_id: Dict[str, int] = {}
+
+        # Postings: valor normalizado -> ids (posiciones en el catálogo) en orden
+        self.barrio_postings: Dict[str, List[int]] = defaultdict(list)
+        self.tipo_postings: Dict[str, List[int]] = defaultdict(list)
+        self.operacion_postings: Dict[str, List[int]] = defaultdict(list)
+        self.amenity_postings: Dict[str, List[int]] = {amenity: [] for amenity in AMENITY_FIELDS}
+
+        textos: List[str] = []
+
+        # Columnas numéricas para filtros por rango
+        precios: List[float] = []
+        ambientes: List[float] = []
+        metros: List[float] = []
+
+        for doc_id, propiedad in enumerate(propiedades):
+            property_id = propiedad.get('id_temporal')
+            if property_id is not None:
+                self.by_id.setdefault(str(property_id), doc_id)
+
+            self.barrio_postings[_campo_texto(propiedad, 'barrio')].append(doc_id)
+            self.tipo_postings[_campo_texto(propiedad, 'tipo')].append(doc_id)
+            self.operacion_postings[_campo_texto(propiedad, 'operacion')].append(doc_id)
+
+            for amenity, (campo, valor) in AMENITY_FIELDS.items():
+                if _campo_texto(propiedad, campo) == valor:
+                    self.amenity_postings[amenity].append(doc_id)
+
+            textos.append(' '.join(str(propiedad.get(campo) or '') for campo in TEXT_FIELDS))
+
+            precios.append(_campo_numerico(propiedad, 'precio'))
+            ambientes.append(_campo_numerico(propiedad, 'ambientes'))
+            metros.append(_campo_numerico(propiedad, 'metros_cuadrados'))
+
+        self.precio_index = RangeIndex(precios)
+        self.ambientes_index = RangeIndex(ambientes)
+        self.metros_index = RangeIndex(metros)
+        self.text_index = TextIndex(textos)
+
+    @staticmethod
+    def _lookup(postings: Dict[str, List[int]], termino: str) -> Set[int]:
+        """Une los postings de todos los valores que contienen el término"""
+        termino = termino.lower()
+        ids: Set[int] = set()
+        # El vocabulario (barrios, tipos, operaciones) es chico: se recorre
+        # el vocabulario, no el catálogo
+        for valor, posting in postings.items():
+            if termino in valor:
+                ids.update(posting)
+        return ids
+
+    def barrio_ids(self, barrio: str) -> Set[int]:
+        """Propiedades cuyo barrio contiene el término buscado"""
+        return self._lookup(self.barrio_postings, barrio)
+
+    def tipo_ids(self, tipo: str) -> Set[int]:
+        """Propiedades cuyo tipo contiene el término buscado"""
+        return self._lookup(self.tipo_postings, tipo)
+
+    def operacion_ids(self, operacion: str) -> Set[int]:
+        """Propiedades cuya operación contiene el término buscado"""
+        return self._lookup(self.operacion_postings, operacion)
+
+    def amenity_ids(self, amenity: str) -> Set[int]:
+        """Propiedades que tienen la amenity indicada"""
+        return set(self.amenity_postings.get(amenity, ()))
+
+    def texto_scores(self, texto: str, permitidos: Optional[Set[int]] = None,
+                     memo: Optional[Dict] = None) -> Dict[int, float]:
+        """Puntajes BM25 del texto libre (solo palabras de más de 3 letras)
+
+        Con memo los puntajes de cada término se calculan una sola vez y se
+        reutilizan en otras consultas (búsquedas en lote); el resultado es el mismo.
+        """
+        terminos = [termino for termino in tokenize(texto) if len(termino) > 3]
+        if memo is None:
+            return self.text_index.score(terminos, permitidos)
+        scores: Dict[int, float] = defaultdict(float)
+        for termino in set(terminos):
+            parciales = memo.get(('texto', termino))
+            if parciales is None:
+                parciales = memo[('texto', termino)] = self.text_index.score([termino])
+            for doc_id, valor in parciales.items():
+                if permitidos is None or doc_id in permitidos:
+                    scores[doc_id] += valor
+        return scores
+
+    def range_ids(self, precio: Tuple = (None, None), ambientes: Tuple = (None, None),
+                  metros: Tuple = (None, None)) -> Optional[Set[int]]:
+        """Intersección de los filtros numéricos (None si no hay ningún filtro)"""
+        rangos = [
+            (self.precio_index, precio),
+            (self.ambientes_index, ambientes),
+            (self.metros_index, metros),
+        ]
+        slices = [indice.between(minimo, maximo)
+                  for indice, (minimo, maximo) in rangos if minimo or maximo]
+        if not slices:
+            return None
+
+        # Se parte del rango más chico para que la intersección sea barata
+        slices.sort(key=len)
+        ids = set(slices[0])
+        for otro in slices[1:]:
+            if not ids:
+                break
+            ids.intersection_update(otro)
+        return ids
+
+    def all_ids(self) -> Iterable[int]:
+        """Todos los ids del catálogo"""
+        return range(self.total)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Versión inmutable del catálogo con sus índices ya construidos
+
+    Se reemplaza entera al recargar: quien lea self.catalog una vez trabaja
+    siempre sobre una versión completa y consistente.
+    """
+    propiedades: List[Dict]
+    index: PropertyIndex
+    version: int
+
+    @classmethod
+    def build(cls, propiedades: List[Dict], version: int) -> 'CatalogSnapshot':
+        """Construye los índices de un catálogo nuevo"""
+        return cls(propiedades, PropertyIndex(propiedades), version)
+
+    def get(self, result: SearchResult) -> Optional[Dict]:
+        """Resuelve un resultado, aunque provenga de otra versión del catálogo"""
+        doc_id = result.doc_id
+        if 0 <= doc_id < len(self.propiedades):
+            propiedad = self.propiedades[doc_id]
+            if str(propiedad.get('id_temporal')) == str(result.property_id):
+                return propiedad
+        doc_id = self.index.by_id.get(str(result.property_id))
+        return self.propiedades[doc_id] if doc_id is not None else None
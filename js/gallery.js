@@ -118,7 +118,7 @@ class PropertyGallery {
     // Renderizar imagen principal
     renderMainImage() {
         const mainImage = document.getElementById('galleryMainImage');
-        mainImage.src = this.currentImages[this.currentIndex];
+        mainImage.src = PropertyManager.getImageVariant(this.currentProperty, this.currentImages[this.currentIndex], 'large');
         mainImage.alt = this.currentProperty.titulo;
     }
 
@@ -129,7 +129,7 @@ class PropertyGallery {
         thumbnailsContainer.innerHTML = this.currentImages.map((image, index) => `
             <div class="gallery-thumbnail ${index === this.currentIndex ? 'active' : ''}" 
                  onclick="PropertyGallery.goToImage(${index})">
-                <img src="${image}" alt="Imagen ${index + 1}" loading="lazy">
+                <img src="${PropertyManager.getImageVariant(this.currentProperty, image, 'thumb')}" alt="Imagen ${index + 1}" loading="lazy">
             </div>
         `).join('');
     }
@@ -113,6 +113,7 @@ class PropertyManager {
             info_multimedia: Utils.String.clean(property.info_multimedia || ''),
             documentos: Array.isArray(property.documentos) ? property.documentos : [],
             fotos: Array.isArray(property.fotos) ? property.fotos : [],
+            fotos_variantes: property.fotos_variantes || {},
             fecha_procesamiento: property.fecha_procesamiento || new Date().toISOString()
         };
 
@@ -328,6 +329,13 @@ class PropertyManager {
         return this.generateDefaultImage(property);
     }
 
+    // Obtener la variante de una foto (thumb, medium o large) o la original si no hay
+    getImageVariant(property, foto, size = 'medium') {
+        const variantes = property && property.fotos_variantes && property.fotos_variantes[foto];
+        if (!variantes || !variantes[size]) return foto;
+        return variantes[size].webp || variantes[size].jpeg || foto;
+    }
+
     // Obtener todas las imágenes de una propiedad
     getPropertyImages(property) {
         if (!property) return [];
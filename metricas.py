@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Métricas en memoria con exposición en formato de texto de Prometheus
+- Contadores e histogramas con labels, seguros entre hilos
+- Cada observación es un bisect y una suma bajo un lock: se pueden dejar activas
+- Los collectors leen estado existente (caches, colas) recién al exportar
+
+    ETAPA = histogram('chatbot_stage_seconds', 'Latencia por etapa', ['stage'])
+    with ETAPA.labels('parse_query').time():
+        ...
+    texto = REGISTRY.render()
+"""
+
+import abc
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites de los buckets en segundos: de 50 µs (cache) a 10 s (requests lentos)
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Un collector devuelve [(nombre, tipo, ayuda, [(labels, valor)])]
+Collector = Callable[[], Iterable[Tuple[str, str, str, Iterable[Tuple[Dict[str, str], float]]]]]
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_texto(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in labels.items()) + '}'
+
+
+def _numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _Timer:
+    """Context manager que observa la duración del bloque en un histograma"""
+    __slots__ = ('child', 'inicio')
+
+    def __init__(self, child: '_HistogramChild'):
+        self.child = child
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.inicio)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # el último es +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, valor: float):
+        i = bisect_left(self.buckets, valor)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += valor
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Metric(abc.ABC):
+    """Métrica con una serie por combinación de labels"""
+    tipo = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _nuevo(self):
+        """Serie vacía para una combinación de labels nueva"""
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Líneas de las series en formato de texto de Prometheus"""
+
+    def labels(self, *values, **kwargs):
+        """Serie de la métrica para esos labels (conviene guardarla para no buscarla cada vez)"""
+        if kwargs:
+            values = tuple(kwargs[nombre] for nombre in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} espera los labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(key, self._nuevo())
+        return child
+
+    def _series(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    """Contador monótono (sufijo _total por convención)"""
+    tipo = 'counter'
+
+    def _nuevo(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1, **labels):
+        self.labels(**labels).inc(amount)
+
+    def render(self) -> List[str]:
+        lineas = []
+        for key, child in self._series():
+            lineas.append(f'{self.name}{_labels_texto(dict(zip(self.labelnames, key)))} {_numero(child.value)}')
+        return lineas
+
+
+class Histogram(_Metric):
+    """Histograma de latencias con buckets fijos (en segundos)"""
+    tipo = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _nuevo(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, valor: float, **labels):
+        self.labels(**labels).observe(valor)
+
+    def time(self, **labels) -> _Timer:
+        return self.labels(**labels).time()
+
+    def render(self) -> List[str]:
+        lineas = []
+        for key, child in self._series():
+            labels = dict(zip(self.labelnames, key))
+            counts, total = child.snapshot()
+            acumulado = 0
+            for limite, cantidad in zip(self.buckets + (float('inf'),), counts):
+                acumulado += cantidad
+                lineas.append(f'{self.name}_bucket{_labels_texto(dict(labels, le=_numero(limite)))} {acumulado}')
+            lineas.append(f'{self.name}_sum{_labels_texto(labels)} {repr(total)}')
+            lineas.append(f'{self.name}_count{_labels_texto(labels)} {acumulado}')
+        return lineas
+
+
+class Registry:
+    """Conjunto de métricas de un proceso"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Registra la métrica; si ya existe una con ese nombre y tipo, devuelve esa"""
+        with self._lock:
+            existente = self._metrics.get(metric.name)
+            if existente is not None:
+                if type(existente) is not type(metric):
+                    raise ValueError(f'La métrica {metric.name} ya existe con otro tipo')
+                return existente
+            self._metrics[metric.name] = metric
+            return metric
+
+    def add_collector(self, collector: Collector):
+        """Agrega una función que aporta métricas calculadas al exportar"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus"""
+        with self._lock:
+            metricas = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f'# HELP {metrica.name} {metrica.documentation}')
+            lineas.append(f'# TYPE {metrica.name} {metrica.tipo}')
+            lineas.extend(metrica.render())
+        for collector in collectors:
+            try:
+                familias = list(collector())
+            except Exception as e:
+                lineas.append(f'# collector con error: {_escapar(e)}')
+                continue
+            for nombre, tipo, ayuda, muestras in familias:
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} {tipo}')
+                for labels, valor in muestras:
+                    lineas.append(f'{nombre}{_labels_texto(labels)} {_numero(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = (),
+            registry: Optional[Registry] = None) -> Counter:
+    return (registry or REGISTRY).register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = None) -> Histogram:
+    return (registry or REGISTRY).register(Histogram(name, documentation, labelnames, buckets))
+
+
+def timed(child: _HistogramChild):
+    """Decorador: observa la duración de cada llamada en la serie indicada"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - inicio)
+        return envoltura
+    return decorador
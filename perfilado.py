@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Perfilado bajo demanda de requests en producción (cProfile + tracemalloc)
+- Se activa por variable de entorno con una tasa de muestreo, o por request
+  con el header X-Profile: <PROFILE_TOKEN>
+- Cada captura queda en PROFILE_DIR como .prof (pstats) y un .json con los
+  datos del request, la memoria pico y las líneas que más asignaron
+- El directorio rota: se conservan las PROFILE_MAX_FILES capturas más nuevas
+- summary() suma todas las capturas y devuelve las funciones más costosas
+
+    PROFILE_SAMPLE_RATE=0.01 PROFILE_TOKEN=secreto python whatsapp_chatbot.py
+    curl -H 'X-Profile: secreto' 'localhost:5000/search?q=casa con pileta'
+    curl -H 'X-Profile: secreto' localhost:5000/debug/profiles
+"""
+
+import cProfile
+import glob
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+PROFILE_HEADER = 'X-Profile'
+SUMMARY_PATH = '/debug/profiles'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'perfiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '50'))
+PROFILE_MEMORY = os.environ.get('PROFILE_MEMORY', '1') != '0'
+
+# Líneas de asignación de memoria que se guardan por captura
+TOP_ALLOCATIONS = 10
+
+
+class Capture:
+    """Perfilado de un request en curso (start/stop desde hooks distintos)"""
+
+    def __init__(self, profiler: 'RequestProfiler', label: str, details: Dict):
+        self.profiler = profiler
+        self.label = label
+        self.details = details
+        self.profile = cProfile.Profile()
+        self.inicio = 0.0
+        self.memoria = False
+
+    def start(self) -> 'Capture':
+        self.memoria = self.profiler.memory and not tracemalloc.is_tracing()
+        if self.memoria:
+            tracemalloc.start()
+        self.inicio = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def stop(self, **extra) -> Optional[str]:
+        """Detiene el perfilado, guarda la captura y devuelve la ruta del .prof"""
+        self.profile.disable()
+        duracion = time.perf_counter() - self.inicio
+        datos = dict(self.details, label=self.label, duration_ms=round(duracion * 1000, 3), **extra)
+        if self.memoria:
+            snapshot = tracemalloc.take_snapshot()
+            datos['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+            datos['allocations'] = [
+                {'line': str(stat.traceback[0]), 'kb': round(stat.size / 1024, 1), 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+            ]
+        try:
+            return self.profiler._guardar(self, datos)
+        finally:
+            self.profiler._liberar()
+
+
+class RequestProfiler:
+    """Decide qué requests perfilar y administra el directorio de capturas
+
+    Solo un request se perfila a la vez (cProfile y tracemalloc son globales
+    del proceso): si ya hay una captura en curso, el request sigue sin perfilar.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 token: str = PROFILE_TOKEN, max_files: int = PROFILE_MAX_FILES, memory: bool = PROFILE_MEMORY):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.max_files = max_files
+        self.memory = memory
+        self._busy = threading.Lock()
+        self._rng = random.Random()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.token)
+
+    def authorized(self, header_value: Optional[str]) -> bool:
+        """True si el header trae el token de administración"""
+        return bool(self.token and header_value) and hmac.compare_digest(header_value, self.token)
+
+    def begin(self, label: str, header_value: Optional[str] = None, **details) -> Optional[Capture]:
+        """Empieza a perfilar si el request fue elegido (por token o por muestreo)"""
+        if not self.enabled:
+            return None
+        elegido = self.authorized(header_value) or (self.sample_rate > 0 and self._rng.random() < self.sample_rate)
+        if not elegido or not self._busy.acquire(blocking=False):
+            return None
+        try:
+            return Capture(self, label, details).start()
+        except Exception:
+            self._busy.release()
+            raise
+
+    def _liberar(self):
+        self._busy.release()
+
+    def _guardar(self, capture: Capture, datos: Dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', capture.label).strip('_')[:60] or 'request'
+        base = os.path.join(self.directory, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{slug}")
+        capture.profile.dump_stats(base + '.prof')
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, indent=2)
+        self._rotar()
+        return base + '.prof'
+
+    def _capturas(self) -> List[str]:
+        """Archivos .prof del directorio, del más viejo al más nuevo"""
+        return sorted(glob.glob(os.path.join(self.directory, '*.prof')))
+
+    def _rotar(self):
+        capturas = self._capturas()
+        for vieja in capturas[:max(0, len(capturas) - self.max_files)]:
+            for ruta in (vieja, vieja[:-len('.prof')] + '.json'):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+
+    def summary(self, limit: int = 25, sort: str = 'tottime') -> Dict:
+        """Funciones más costosas sumando todas las capturas del directorio
+
+        sort: 'tottime' (tiempo propio), 'cumtime' (con llamadas internas) o 'calls'.
+        """
+        capturas = self._capturas()
+        muestras = []
+        for ruta in capturas:
+            try:
+                with open(ruta[:-len('.prof')] + '.json', 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+            except (OSError, ValueError):
+                datos = {}
+            muestras.append({'file': os.path.basename(ruta), **{k: v for k, v in datos.items() if k != 'allocations'}})
+        resumen = {'samples': muestras, 'functions': []}
+        if not capturas:
+            return resumen
+
+        stats = None
+        for ruta in capturas:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(ruta)
+                else:
+                    stats.add(ruta)
+            except (OSError, TypeError, ValueError, EOFError):
+                continue   # rotada o a medio escribir
+        if stats is None:
+            return resumen
+        indice = {'tottime': 2, 'cumtime': 3, 'calls': 1}.get(sort, 2)
+        filas = sorted(stats.stats.items(), key=lambda item: item[1][indice], reverse=True)
+        for (archivo, linea, funcion), (_, llamadas, tottime, cumtime, _) in filas[:limit]:
+            resumen['functions'].append({
+                'function': f"{os.path.basename(archivo)}:{linea}({funcion})",
+                'calls': llamadas,
+                'tottime_ms': round(tottime * 1000, 3),
+                'cumtime_ms': round(cumtime * 1000, 3),
+                'per_sample_ms': round(cumtime * 1000 / len(capturas), 3),
+            })
+        return resumen
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Logging estructurado en JSON que no bloquea a quien registra
+- Los registros pasan por una cola y un hilo aparte los formatea y escribe
+- Muestreo por evento para los de alto volumen (LOG_SAMPLE="message_received=0.1")
+- Enmascara teléfonos en los campos y en el texto (LOG_REDACT_PHONES=0 lo desactiva)
+- Si la cola se llena, los registros se descartan y se cuentan
+
+    logger = registro.get_logger(__name__)
+    registro.log_event(logger, 'message_received', phone_number=numero, text=mensaje)
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_REDACT_PHONES = os.environ.get('LOG_REDACT_PHONES', '1') != '0'
+
+# Campos que siempre se tratan como teléfonos
+PHONE_FIELDS = {'phone', 'phone_number', 'from', 'to', 'telefono'}
+
+# 10 o más dígitos seguidos (admite +, espacios y guiones): no toca fechas ni IPs
+PHONE_PATTERN = re.compile(r'\+?\d(?:[\s\-]?\d){9,}')
+
+# Atributos propios de LogRecord: lo demás que llegue en extra es un campo del evento
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional['NonBlockingQueueHandler'] = None
+_lock = threading.Lock()
+
+
+def parse_sample_rates(texto: str) -> Dict[str, float]:
+    """'message_received=0.1,werkzeug=0.01' -> {'message_received': 0.1, 'werkzeug': 0.01}"""
+    tasas = {}
+    for parte in (texto or '').split(','):
+        nombre, _, tasa = parte.partition('=')
+        if nombre.strip():
+            tasas[nombre.strip()] = min(1.0, max(0.0, float(tasa or 1)))
+    return tasas
+
+
+def redact_phone(numero) -> str:
+    """Deja solo los últimos 4 dígitos: '5491155551234' -> '*********1234'"""
+    digitos = re.sub(r'\D', '', str(numero))
+    if len(digitos) <= 4:
+        return '*' * len(digitos)
+    return '*' * (len(digitos) - 4) + digitos[-4:]
+
+
+def redact_text(texto: str) -> str:
+    """Enmascara los números de teléfono que aparezcan en un texto libre"""
+    return PHONE_PATTERN.sub(lambda m: redact_phone(m.group(0)), texto)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar una fracción de los registros de cada evento (o logger)
+
+    Corre en el hilo que registra, antes de encolar: lo descartado no cuesta
+    más que un random(). Warnings y errores nunca se muestrean.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        tasa = self.rates.get(getattr(record, 'event', None) or record.name)
+        if tasa is None or tasa >= 1.0:
+            return True
+        record.sample_rate = tasa
+        return random.random() < tasa
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que nunca espera: con la cola llena descarta y cuenta"""
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Solo lo indispensable en el hilo que registra; el JSON se arma en el listener
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro con los campos del evento"""
+
+    def __init__(self, redact_phones: bool = LOG_REDACT_PHONES):
+        super().__init__()
+        self.redact_phones = redact_phones
+
+    def _valor(self, clave: str, valor):
+        if not self.redact_phones:
+            return valor
+        if clave in PHONE_FIELDS and valor:
+            return redact_phone(valor)
+        if isinstance(valor, str):
+            return redact_text(valor)
+        return valor
+
+    def format(self, record: logging.LogRecord) -> str:
+        evento = getattr(record, 'event', None)
+        datos = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': evento or 'log',
+        }
+        mensaje = record.getMessage()
+        if mensaje and mensaje != evento:
+            datos['msg'] = self._valor('msg', mensaje)
+        for clave, valor in vars(record).items():
+            if clave not in _RECORD_ATTRS and clave != 'event':
+                datos[clave] = self._valor(clave, valor)
+        if record.exc_text:
+            datos['exc'] = record.exc_text
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, sample_rates: Optional[Dict[str, float]] = None,
+                      redact_phones: bool = LOG_REDACT_PHONES, stream=None,
+                      queue_size: int = LOG_QUEUE_SIZE) -> NonBlockingQueueHandler:
+    """Instala el logging en JSON con cola en el logger raíz (una sola vez por proceso)
+
+    Las tasas de muestreo se leen de LOG_SAMPLE si no se indican.
+    """
+    global _listener, _handler
+    with _lock:
+        if _handler is not None:
+            return _handler
+        if sample_rates is None:
+            sample_rates = parse_sample_rates(os.environ.get('LOG_SAMPLE', ''))
+
+        salida = logging.StreamHandler(stream or sys.stderr)
+        salida.setFormatter(JsonFormatter(redact_phones))
+        cola: queue.Queue = queue.Queue(queue_size)
+        handler = NonBlockingQueueHandler(cola)
+        handler.addFilter(SamplingFilter(sample_rates))
+
+        raiz = logging.getLogger()
+        raiz.setLevel(level)
+        for anterior in list(raiz.handlers):
+            raiz.removeHandler(anterior)
+        raiz.addHandler(handler)
+
+        _listener = QueueListener(cola, salida, respect_handler_level=True)
+        _listener.start()
+        _handler = handler
+        return handler
+
+
+def shutdown_logging():
+    """Escribe lo que quede en la cola y detiene el hilo del listener"""
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger().removeHandler(_handler)
+        _listener = _handler = None
+
+
+def dropped_records() -> int:
+    """Registros descartados por cola llena desde que se configuró el logging"""
+    return _handler.dropped if _handler is not None else 0
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, exc_info=None, **fields):
+    """Registra un evento con campos estructurados"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra=dict(fields, event=event))
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Repositorio SQLite de consultas para búsquedas paginadas
+Se alimenta del log de consultas (almacen_consultas.py) y usa solo la biblioteca estándar
+"""
+
+import json
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS consultas (
+    seq INTEGER PRIMARY KEY,
+    id TEXT,
+    fecha TEXT,
+    nombre TEXT,
+    telefono TEXT,
+    email TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_consultas_fecha ON consultas(fecha);
+CREATE INDEX IF NOT EXISTS idx_consultas_telefono ON consultas(telefono);
+CREATE INDEX IF NOT EXISTS idx_consultas_email ON consultas(email);
+CREATE INDEX IF NOT EXISTS idx_consultas_id ON consultas(id);
+
+CREATE TABLE IF NOT EXISTS propiedades_interes (
+    consulta_seq INTEGER NOT NULL REFERENCES consultas(seq),
+    property_id TEXT,
+    titulo TEXT,
+    barrio TEXT,
+    tipo TEXT,
+    operacion TEXT,
+    precio REAL,
+    moneda TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_interes_property ON propiedades_interes(property_id, consulta_seq);
+CREATE INDEX IF NOT EXISTS idx_interes_consulta ON propiedades_interes(consulta_seq);
+
+-- log_offset: consultas del log ya indexadas (se avanza en la misma transacción)
+CREATE TABLE IF NOT EXISTS estado (
+    clave TEXT PRIMARY KEY,
+    valor INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS estadisticas_diarias (
+    fecha TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    cantidad INTEGER NOT NULL,
+    PRIMARY KEY (fecha, dimension, valor)
+);
+"""
+
+# Dimensión de las estadísticas -> (campo de la propiedad, clave en la respuesta)
+STATS_DIMENSIONS = {
+    'tipo': ('tipo', 'tipos_propiedades_interes'),
+    'barrio': ('barrio', 'barrios_interes'),
+    'operacion': ('operacion', 'operaciones_interes'),
+}
+
+
+def _contar_consulta(consulta: Dict, contador: Counter):
+    """Suma una consulta a los contadores (fecha, dimensión, valor)"""
+    dia = str(consulta.get('fecha') or '')[:10]
+    contador[(dia, 'consultas', '')] += 1
+    for prop in consulta.get('propiedades_interes') or []:
+        if not isinstance(prop, dict):
+            continue
+        for dimension, (campo, _) in STATS_DIMENSIONS.items():
+            contador[(dia, dimension, str(prop.get(campo, 'No especificado')))] += 1
+
+
+def fecha_hasta(valor: str) -> Tuple[str, str]:
+    """Convierte un límite superior en (operador, valor) para comparar fechas ISO
+
+    Una fecha sola (YYYY-MM-DD) incluye todo ese día.
+    """
+    if len(valor) == 10:
+        try:
+            siguiente = date.fromisoformat(valor) + timedelta(days=1)
+            return '<', siguiente.isoformat()
+        except ValueError:
+            pass
+    return '<=', valor
+
+
+class LeadRepository:
+    """Consultas y sus propiedades de interés en SQLite, indexadas para filtrar"""
+
+    def __init__(self, path: str = 'consultas.sqlite3'):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        # Bases creadas antes del offset tenían una fila por consulta del log
+        conn.execute("INSERT OR IGNORE INTO estado (clave, valor) "
+                     "SELECT 'log_offset', COUNT(*) FROM consultas")
+        conn.commit()
+        self._totals: Optional[Counter] = None  # (dimensión, valor) -> cantidad histórica
+
+        # Base creada antes de los acumulados: se calculan una vez
+        sin_acumulados = conn.execute('SELECT 1 FROM estadisticas_diarias LIMIT 1').fetchone() is None
+        if sin_acumulados and self.count():
+            self.rebuild_stats()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Una conexión por hilo (WAL permite leer mientras se escribe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def count(self) -> int:
+        """Cantidad de consultas indexadas"""
+        return self._connection().execute('SELECT COUNT(*) FROM consultas').fetchone()[0]
+
+    def log_offset(self) -> int:
+        """Cantidad de consultas del log (en orden) que ya están en la base"""
+        row = self._connection().execute("SELECT valor FROM estado WHERE clave = 'log_offset'").fetchone()
+        return row[0] if row else 0
+
+    def add_many(self, consultas: Iterable[Dict]):
+        """Inserta las consultas que siguen en el log, en una sola transacción
+
+        El offset del log avanza en la misma transacción: si algo falla no
+        queda nada a medias y el lote se puede volver a entregar.
+        """
+        rollup = Counter()
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                agregadas = 0
+                for consulta in consultas:
+                    agregadas += 1
+                    _contar_consulta(consulta, rollup)
+                    cursor = conn.execute(
+                        'INSERT INTO consultas (id, fecha, nombre, telefono, email, data) VALUES (?, ?, ?, ?, ?, ?)',
+                        (
+                            consulta.get('id'),
+                            consulta.get('fecha'),
+                            consulta.get('nombre'),
+                            consulta.get('telefono'),
+                            consulta.get('email'),
+                            json.dumps(consulta, ensure_ascii=False),
+                        ),
+                    )
+                    seq = cursor.lastrowid
+                    conn.executemany(
+                        'INSERT INTO propiedades_interes '
+                        '(consulta_seq, property_id, titulo, barrio, tipo, operacion, precio, moneda) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        [
+                            (
+                                seq,
+                                prop.get('id_temporal'),
+                                prop.get('titulo'),
+                                prop.get('barrio'),
+                                prop.get('tipo'),
+                                prop.get('operacion'),
+                                prop.get('precio') if isinstance(prop.get('precio'), (int, float)) else None,
+                                prop.get('moneda_precio'),
+                            )
+                            for prop in consulta.get('propiedades_interes') or []
+                            if isinstance(prop, dict)
+                        ],
+                    )
+                self._add_rollup(conn, rollup)
+                conn.execute("UPDATE estado SET valor = valor + ? WHERE clave = 'log_offset'", (agregadas,))
+            self._update_totals(rollup)
+
+    @staticmethod
+    def _add_rollup(conn: sqlite3.Connection, rollup: Counter):
+        """Suma los contadores de un lote a los acumulados diarios"""
+        conn.executemany(
+            'INSERT INTO estadisticas_diarias (fecha, dimension, valor, cantidad) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(fecha, dimension, valor) DO UPDATE SET cantidad = cantidad + excluded.cantidad',
+            [(dia, dimension, valor, cantidad) for (dia, dimension, valor), cantidad in rollup.items()],
+        )
+
+    def _update_totals(self, rollup: Counter):
+        """Actualiza los totales en memoria (si ya se cargaron)"""
+        if self._totals is None:
+            return
+        for (dia, dimension, valor), cantidad in rollup.items():
+            self._totals[(dimension, valor)] += cantidad
+            if dimension == 'consultas':
+                self._totals[('fecha', dia)] += cantidad
+
+    def sync_from(self, consultas: Iterable[Dict], batch_size: int = 1000) -> int:
+        """Indexa las consultas del log que todavía no están en la base
+
+        consultas es el log completo en orden; se saltean las primeras
+        log_offset(), que ya se indexaron.
+        """
+        ya_indexadas = self.log_offset()
+        lote: List[Dict] = []
+        agregadas = 0
+        for n, consulta in enumerate(consultas):
+            if n < ya_indexadas:
+                continue
+            lote.append(consulta)
+            if len(lote) >= batch_size:
+                self.add_many(lote)
+                agregadas += len(lote)
+                lote = []
+        if lote:
+            self.add_many(lote)
+            agregadas += len(lote)
+        return agregadas
+
+    def rebuild(self, consultas: Iterable[Dict]) -> int:
+        """Borra el índice y lo vuelve a armar desde el log"""
+        with self._write_lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('DELETE FROM propiedades_interes')
+                conn.execute('DELETE FROM consultas')
+                conn.execute('DELETE FROM estadisticas_diarias')
+                conn.execute("UPDATE estado SET valor = 0 WHERE clave = 'log_offset'")
+            self._totals = None
+        return self.sync_from(consultas)
+
+    def rebuild_stats(self) -> int:
+        """Recalcula los acumulados diarios desde las consultas guardadas"""
+        with self._write_lock:
+            conn = self._connection()
+            rollup = Counter()
+            total = 0
+            for (data,) in conn.execute('SELECT data FROM consultas ORDER BY seq'):
+                _contar_consulta(json.loads(data), rollup)
+                total += 1
+            with conn:
+                conn.execute('DELETE FROM estadisticas_diarias')
+                self._add_rollup(conn, rollup)
+            self._totals = None
+        return total
+
+    def _load_totals(self) -> Counter:
+        """Totales históricos a partir de los acumulados diarios"""
+        with self._write_lock:
+            if self._totals is None:
+                totals = Counter()
+                sql = 'SELECT fecha, dimension, valor, cantidad FROM estadisticas_diarias'
+                for dia, dimension, valor, cantidad in self._connection().execute(sql):
+                    totals[(dimension, valor)] += cantidad
+                    if dimension == 'consultas':
+                        totals[('fecha', dia)] += cantidad
+                self._totals = totals
+            return Counter(self._totals)
+
+    def estadisticas(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> Dict[str, Any]:
+        """Estadísticas de consultas, históricas o de un rango de fechas
+
+        Sin rango se responde con los totales en memoria; con rango se suman
+        los acumulados diarios de esos días.
+        """
+        if not desde and not hasta:
+            totals = self._load_totals()
+        else:
+            condiciones, params = [], []
+            if desde:
+                condiciones.append('fecha >= ?')
+                params.append(desde[:10])
+            if hasta:
+                condiciones.append('fecha <= ?')
+                params.append(hasta[:10])
+            sql = ('SELECT fecha, dimension, valor, SUM(cantidad) FROM estadisticas_diarias WHERE '
+                   + ' AND '.join(condiciones) + ' GROUP BY fecha, dimension, valor')
+            totals = Counter()
+            for dia, dimension, valor, cantidad in self._connection().execute(sql, params):
+                totals[(dimension, valor)] += cantidad
+                if dimension == 'consultas':
+                    totals[('fecha', dia)] += cantidad
+
+        stats = {
+            'total_consultas': totals.get(('consultas', ''), 0),
+            'consultas_por_fecha': {},
+            **{clave: {} for _, clave in STATS_DIMENSIONS.values()},
+        }
+        por_dimension = {dimension: clave for dimension, (_, clave) in STATS_DIMENSIONS.items()}
+        for (dimension, valor), cantidad in sorted(totals.items(), key=lambda item: (item[0][0], -item[1], item[0][1])):
+            if dimension == 'fecha':
+                stats['consultas_por_fecha'][valor] = cantidad
+            elif dimension in por_dimension:
+                stats[por_dimension[dimension]][valor] = cantidad
+        stats['consultas_por_fecha'] = dict(sorted(stats['consultas_por_fecha'].items()))
+        if desde or hasta:
+            stats['desde'] = desde
+            stats['hasta'] = hasta
+        return stats
+
+    @staticmethod
+    def _where(cursor: Optional[int] = None, desde: Optional[str] = None, hasta: Optional[str] = None,
+               telefono: Optional[str] = None, email: Optional[str] = None,
+               property_id: Optional[str] = None) -> Tuple[str, List]:
+        """Arma el WHERE de los filtros (todos usan índices)"""
+        condiciones: List[str] = []
+        params: List = []
+        if cursor is not None:
+            condiciones.append('c.seq > ?')
+            params.append(cursor)
+        if desde:
+            condiciones.append('c.fecha >= ?')
+            params.append(desde)
+        if hasta:
+            operador, valor = fecha_hasta(hasta)
+            condiciones.append(f'c.fecha {operador} ?')
+            params.append(valor)
+        if telefono:
+            condiciones.append('c.telefono = ?')
+            params.append(telefono)
+        if email:
+            condiciones.append('c.email = ?')
+            params.append(email)
+        if property_id:
+            condiciones.append('c.seq IN (SELECT consulta_seq FROM propiedades_interes WHERE property_id = ?)')
+            params.append(property_id)
+        where = (' WHERE ' + ' AND '.join(condiciones)) if condiciones else ''
+        return where, params
+
+    def next_cursor(self, limit: int, **filtros) -> Optional[int]:
+        """Cursor de la página siguiente (None si esta es la última)
+
+        Solo lee los seq de la página, así se conoce antes de transmitir las filas.
+        """
+        where, params = self._where(**filtros)
+        sql = f'SELECT c.seq FROM consultas c{where} ORDER BY c.seq LIMIT ?'
+        seqs = [row[0] for row in self._connection().execute(sql, params + [limit + 1])]
+        return seqs[limit - 1] if len(seqs) > limit else None
+
+    def iter_json(self, limit: Optional[int] = 100, **filtros) -> Iterator[Tuple[int, str]]:
+        """Recorre (seq, JSON de la consulta) en orden de llegada, fila por fila
+
+        Filtros: cursor (seq de la última consulta ya recibida), desde, hasta
+        (fechas ISO; una fecha sola incluye el día completo), telefono, email
+        y property_id.
+        """
+        where, params = self._where(**filtros)
+        sql = f'SELECT c.seq, c.data FROM consultas c{where} ORDER BY c.seq'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        for seq, data in self._connection().execute(sql, params):
+            yield seq, data
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Reemplazo local de la WhatsApp Cloud API para pruebas de carga sin conexión
+Usa solo el servidor HTTP estándar de Python
+
+    python stub_whatsapp_api.py --port 8090 --latencia 0.01 --error-rate 0.05
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MESSAGES_PATH = re.compile(r'^/v[\d.]+/([^/]+)/messages$')
+
+
+class StubState:
+    """Configuración y contadores compartidos por todos los requests"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, rate_limit: float = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.received = 0
+        self.errors = 0
+        self.throttled = 0
+        self.window_start = time.monotonic()
+        self.window_count = 0
+
+    def throttle(self) -> bool:
+        """True si se superó el límite de mensajes por segundo"""
+        if self.rate_limit <= 0:
+            return False
+        with self.lock:
+            ahora = time.monotonic()
+            if ahora - self.window_start >= 1:
+                self.window_start = ahora
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count > self.rate_limit
+
+
+class StubWhatsAppHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como la API real
+    # Respuesta en un solo write (headers + body): evita la espera de delayed ACK
+    wbufsize = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for clave, valor in (headers or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        """GET /stats devuelve los contadores del stub"""
+        state = self.server.state
+        if self.path == '/stats':
+            self._send_json(200, {
+                'received': state.received,
+                'errors': state.errors,
+                'throttled': state.throttled,
+            })
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        """POST /{version}/{phone_number_id}/messages como la Cloud API"""
+        state = self.server.state
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length)
+
+        if not MESSAGES_PATH.match(self.path):
+            self._send_json(404, {'error': {'message': 'Unknown path', 'code': 100}})
+            return
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self._send_json(401, {'error': {'message': 'Invalid OAuth access token', 'code': 190}})
+            return
+        try:
+            payload = json.loads(raw.decode('utf-8'))
+            to = payload['to']
+            payload['text']['body']
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {'error': {'message': 'Invalid parameter', 'code': 100}})
+            return
+
+        if state.latency:
+            time.sleep(state.latency)
+
+        if state.throttle():
+            with state.lock:
+                state.throttled += 1
+            self._send_json(429, {'error': {'message': 'Rate limit hit', 'code': 130429}},
+                            {'Retry-After': '1'})
+            return
+        if state.error_rate and random.random() < state.error_rate:
+            with state.lock:
+                state.errors += 1
+            self._send_json(500, {'error': {'message': 'Temporary error', 'code': 2}})
+            return
+
+        with state.lock:
+            state.received += 1
+        self._send_json(200, {
+            'messaging_product': 'whatsapp',
+            'contacts': [{'input': to, 'wa_id': to}],
+            'messages': [{'id': f"wamid.STUB{next(state.ids):012d}"}],
+        })
+
+
+def build_stub(host: str = '127.0.0.1', port: int = 8090, latency: float = 0.0,
+               error_rate: float = 0.0, rate_limit: float = 0) -> ThreadingHTTPServer:
+    """Crea el servidor del stub (sin iniciarlo)"""
+    server = ThreadingHTTPServer((host, port), StubWhatsAppHandler)
+    server.daemon_threads = True
+    server.state = StubState(latency, error_rate, rate_limit)
+    return server
+
+
+def start_stub(host: str = '127.0.0.1', port: int = 8090, latency: float = 0.0,
+               error_rate: float = 0.0, rate_limit: float = 0) -> ThreadingHTTPServer:
+    """Levanta el stub en un hilo de fondo y devuelve el servidor"""
+    server = build_stub(host, port, latency, error_rate, rate_limit)
+    threading.Thread(target=server.serve_forever, name='whatsapp-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API local que imita la WhatsApp Cloud API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latencia', type=float, default=0.0, help='Latencia por request (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Proporción de respuestas 500')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Mensajes/s antes de responder 429')
+    args = parser.parse_args()
+
+    server = build_stub(args.host, args.port, args.latencia, args.error_rate, args.rate_limit)
+    print(f"🧪 Stub de WhatsApp Cloud API en http://{args.host}:{args.port}")
+    print(f"   POST /v19.0/<phone_number_id>/messages  |  GET /stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stub detenido.")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests del log de consultas (group commit, recuperación e importación) sin servidores
+"""
+
+import json
+import os
+import threading
+
+from almacen_consultas import IMPORT_SUFFIX, LeadStore
+
+
+def consulta(n, **extra):
+    return {'id': f'C{n:05d}', 'nombre': f'Cliente {n}', 'fecha': f'2025-01-{n % 28 + 1:02d}T10:00:00', **extra}
+
+
+def test_group_commit_junta_escrituras_concurrentes(tmp_path):
+    store = LeadStore(str(tmp_path / 'log'), flush_interval=0.02, fsync=False, legacy_file=None)
+    lotes = []
+    store.listeners.append(lambda consultas: lotes.append(len(consultas)))
+
+    def escribir(hilo):
+        for n in range(25):
+            store.append(consulta(hilo * 100 + n))
+
+    hilos = [threading.Thread(target=escribir, args=(h,)) for h in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    store.close()
+
+    guardadas = [c['id'] for c in store.iter_consultas()]
+    assert sorted(guardadas) == sorted(consulta(h * 100 + n)['id'] for h in range(8) for n in range(25))
+    # Cada hilo ve sus consultas en el orden en que las escribió
+    for h in range(8):
+        propias = [i for i in guardadas if int(i[1:]) // 100 == h]
+        assert propias == sorted(propias)
+    assert store.records_written == 200 == sum(lotes)
+    assert store.commits == len(lotes) < 200
+
+
+def test_reabrir_recupera_y_cierra_la_linea_cortada(tmp_path):
+    directorio = str(tmp_path / 'log')
+    store = LeadStore(directorio, flush_interval=0, fsync=False, legacy_file=None)
+    for n in range(3):
+        store.append(consulta(n))
+    store.close()
+
+    # Corte a mitad de una escritura: queda una línea incompleta al final
+    with open(store.segments()[-1], 'a', encoding='utf-8') as f:
+        f.write('{"id": "C99999", "nom')
+
+    store = LeadStore(directorio, flush_interval=0, fsync=False, legacy_file=None)
+    store.append(consulta(3))
+    store.close()
+    assert [c['id'] for c in store.iter_consultas()] == ['C00000', 'C00001', 'C00002', 'C00003']
+
+
+def test_rotacion_y_compactacion_conservan_todo(tmp_path):
+    store = LeadStore(str(tmp_path / 'log'), flush_interval=0, fsync=False,
+                      segment_max_bytes=300, compact_after=0, legacy_file=None)
+    for n in range(40):
+        store.append(consulta(n))
+    assert len(store.segments()) > 3
+    antes = list(store.iter_consultas())
+    assert store.compact() > 0
+    assert len(store.segments()) == 2
+    store.append(consulta(40))
+    store.close()
+    assert list(store.iter_consultas()) == antes + [consulta(40)]
+
+
+def test_rotacion_dispara_la_compactacion(tmp_path):
+    directorio = str(tmp_path / 'log')
+    store = LeadStore(directorio, flush_interval=0, fsync=False,
+                      segment_max_bytes=300, compact_after=3, legacy_file=None)
+    for n in range(80):
+        store.append(consulta(n))
+    store.close()
+
+    # Hubo muchas rotaciones pero los cerrados se fueron uniendo solos
+    assert store._segment_number > 10
+    assert len(store.segments()) < store._segment_number
+    assert not [f for f in os.listdir(directorio) if f.endswith('.compact')]
+    assert [c['id'] for c in store.iter_consultas()] == [consulta(n)['id'] for n in range(80)]
+
+    # Sin compact_after los segmentos se acumulan
+    store = LeadStore(str(tmp_path / 'otro'), flush_interval=0, fsync=False,
+                      segment_max_bytes=300, compact_after=0, legacy_file=None)
+    for n in range(80):
+        store.append(consulta(n))
+    store.close()
+    assert len(store.segments()) == store._segment_number
+
+
+def test_importa_el_formato_anterior_una_sola_vez(tmp_path):
+    legacy = tmp_path / 'consultas_completas.json'
+    legacy.write_text(json.dumps([consulta(n) for n in range(5)]), encoding='utf-8')
+    directorio = str(tmp_path / 'log')
+
+    store = LeadStore(directorio, fsync=False, legacy_file=str(legacy))
+    store.append(consulta(5))
+    store.close()
+    store = LeadStore(directorio, fsync=False, legacy_file=str(legacy))
+    store.close()
+    assert [c['id'] for c in store.iter_consultas()] == [consulta(n)['id'] for n in range(6)]
+
+
+def test_importacion_cortada_se_repite_completa(tmp_path):
+    legacy = tmp_path / 'consultas_completas.json'
+    legacy.write_text(json.dumps([consulta(n) for n in range(5)]), encoding='utf-8')
+    directorio = tmp_path / 'log'
+    directorio.mkdir()
+    # Lo que deja un proceso que murió importando: solo el temporal, a medias
+    parcial = os.path.join(str(directorio), 'consultas-000001.jsonl' + IMPORT_SUFFIX)
+    with open(parcial, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(consulta(0)) + '\n')
+
+    store = LeadStore(str(directorio), fsync=False, legacy_file=str(legacy))
+    store.close()
+    assert [c['id'] for c in store.iter_consultas()] == [consulta(n)['id'] for n in range(5)]
+    assert not os.path.exists(parcial)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests de la cache LRU con expiración (sin servidores)
+"""
+
+import cache_consultas
+from cache_consultas import LRUCache
+
+
+class Reloj:
+    """Reemplazo de time.monotonic que avanza a mano"""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def test_descarta_el_menos_usado():
+    cache = LRUCache(maxsize=2, ttl=None)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1          # 'a' pasa a ser el más reciente
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_expira_por_ttl(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache_consultas.time, 'monotonic', reloj)
+    cache = LRUCache(maxsize=10, ttl=30)
+    cache.set('q', 'resultado')
+    reloj.ahora += 29.9
+    assert cache.get('q') == 'resultado'
+    reloj.ahora += 0.2
+    assert cache.get('q', 'vencida') == 'vencida'
+    assert len(cache) == 0              # la entrada vencida se borra al leerla
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_set_renueva_la_expiracion(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache_consultas.time, 'monotonic', reloj)
+    cache = LRUCache(maxsize=10, ttl=10)
+    cache.set('q', 1)
+    reloj.ahora += 8
+    cache.set('q', 2)
+    reloj.ahora += 8
+    assert cache.get('q') == 2
+
+
+def test_clear_invalida_y_conserva_contadores():
+    cache = LRUCache(maxsize=10, ttl=None)
+    cache.set('q', 1)
+    assert cache.get('q') == 1
+    cache.clear()
+    assert cache.get('q') is None
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_tamano_cero_no_guarda():
+    cache = LRUCache(maxsize=0)
+    cache.set('q', 1)
+    assert cache.get('q') is None and len(cache) == 0
+
+
+def test_pop_quita_la_entrada():
+    cache = LRUCache(maxsize=10, ttl=None)
+    cache.set('q', 1)
+    assert cache.pop('q') == 1
+    assert cache.pop('q', 'no') == 'no'
+    assert cache.get('q') is None
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests del backend HTTP sobre un puerto local efímero (log y base en un directorio temporal)
+"""
+
+import http.client
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import chatbot_backend_simple as backend
+from repositorio_consultas import LeadRepository
+
+
+@pytest.fixture
+def levantar(tmp_path, monkeypatch):
+    """Levanta servidores en puertos efímeros; se detienen al terminar el test"""
+    directorio = str(tmp_path / 'consultas_log')
+    monkeypatch.setattr(backend, 'CONSULTAS_DIR', directorio)
+    monkeypatch.setattr(backend, 'CONSULTAS_DB', os.path.join(directorio, 'consultas.sqlite3'))
+    monkeypatch.setattr(backend, 'CONSULTAS_FILE', str(tmp_path / 'no_existe.json'))
+    monkeypatch.setattr(backend, 'CONSULTAS_FSYNC', False)
+    monkeypatch.setattr(backend, '_lead_store', None)
+    monkeypatch.setattr(backend, '_lead_repository', None)
+    servidores = []
+
+    def levantar_servidor(**opciones):
+        server = backend.PooledHTTPServer(('127.0.0.1', 0), backend.ChatbotHandler, **opciones)
+        hilo = threading.Thread(target=server.serve_forever, daemon=True)
+        hilo.start()
+        servidores.append((server, hilo))
+        return server
+
+    yield levantar_servidor
+    for server, hilo in servidores:
+        server.shutdown()
+        server.server_close()
+        hilo.join(timeout=5)
+    if backend._lead_store is not None:
+        backend._lead_store.close()
+
+
+@pytest.fixture
+def servidor(levantar):
+    return levantar(workers=4)
+
+
+def pedir(server, metodo, ruta, body=None, headers=None):
+    conexion = http.client.HTTPConnection(*server.server_address, timeout=5)
+    try:
+        datos = json.dumps(body).encode('utf-8') if body is not None else None
+        conexion.request(metodo, ruta, body=datos, headers=headers or {})
+        respuesta = conexion.getresponse()
+        contenido = respuesta.read()
+        return respuesta.status, json.loads(contenido) if contenido else None
+    finally:
+        conexion.close()
+
+
+@pytest.fixture
+def rebuilds(monkeypatch):
+    llamadas = []
+    original = LeadRepository.rebuild_stats
+
+    def rebuild_stats(self):
+        llamadas.append(self)
+        return original(self)
+
+    monkeypatch.setattr(LeadRepository, 'rebuild_stats', rebuild_stats)
+    return llamadas
+
+
+def test_rebuild_requiere_el_token_de_administracion(servidor, rebuilds, monkeypatch):
+    monkeypatch.setattr(backend, 'ADMIN_TOKEN', 'secreto-admin')
+    monkeypatch.setattr(backend.profiler, 'token', 'secreto-perfilado')
+    for _ in range(2):
+        assert pedir(servidor, 'POST', '/api/consulta', {'nombre': 'Ana', 'propiedades': [{'tipo': 'casa'}]})[0] == 200
+
+    ruta = '/api/estadisticas?rebuild=1'
+    assert pedir(servidor, 'GET', ruta)[0] == 403
+    assert pedir(servidor, 'GET', ruta, headers={'X-Admin-Token': 'otro'})[0] == 403
+    assert pedir(servidor, 'GET', ruta, headers={'X-Admin-Token': 'señal'})[0] == 403
+    # El token de perfilado no da permisos de administración
+    assert pedir(servidor, 'GET', ruta, headers={'X-Profile': 'secreto-perfilado'})[0] == 403
+    assert rebuilds == []
+
+    status, stats = pedir(servidor, 'GET', ruta, headers={'X-Admin-Token': 'secreto-admin'})
+    assert status == 200 and stats['total_consultas'] == 2 and len(rebuilds) == 1
+    # Leer las estadísticas sigue siendo público
+    assert pedir(servidor, 'GET', '/api/estadisticas')[1] == stats
+
+
+def test_sin_admin_token_no_hay_rebuild(servidor, rebuilds, monkeypatch):
+    monkeypatch.setattr(backend, 'ADMIN_TOKEN', '')
+    assert pedir(servidor, 'GET', '/api/estadisticas?rebuild=1', headers={'X-Admin-Token': ''})[0] == 403
+    assert rebuilds == []
+
+
+def conectar(server):
+    conexion = http.client.HTTPConnection(*server.server_address, timeout=10)
+    conexion.connect()
+    return conexion
+
+
+def test_keep_alive_inactiva_libera_el_hilo(levantar, monkeypatch):
+    monkeypatch.setattr(backend.ChatbotHandler, 'timeout', 15)
+    monkeypatch.setattr(backend.ChatbotHandler, 'idle_timeout', 0.3)
+    server = levantar(workers=1)
+
+    # Una pestaña abierta: un request y la conexión queda inactiva
+    inactiva = conectar(server)
+    inactiva.request('GET', '/api/estadisticas')
+    assert inactiva.getresponse().read() and server.saturated() is False
+
+    # Con el único hilo retenido, otro cliente espera solo el idle_timeout
+    inicio = time.monotonic()
+    assert pedir(server, 'POST', '/api/consulta', {'nombre': 'Ana', 'propiedades': []})[0] == 200
+    assert time.monotonic() - inicio < 3
+    inactiva.close()
+
+
+def test_keep_alive_sigue_si_el_cliente_responde_a_tiempo(levantar):
+    server = levantar(workers=2)
+    conexion = conectar(server)
+    socket_inicial = conexion.sock
+    for _ in range(3):
+        conexion.request('GET', '/api/estadisticas')
+        respuesta = conexion.getresponse()
+        assert respuesta.status == 200 and respuesta.read()
+        time.sleep(0.05)
+    # Los tres requests usaron el mismo socket
+    assert conexion.sock is socket_inicial
+    conexion.close()
+
+
+def test_pool_lleno_responde_503_y_shutdown_no_se_cuelga(levantar, monkeypatch):
+    monkeypatch.setattr(backend.ChatbotHandler, 'idle_timeout', 5)
+    server = levantar(workers=1, max_pending=1)
+
+    # El único hilo queda esperando a un cliente keep-alive y otro cliente en cola
+    ocupada = conectar(server)
+    ocupada.request('GET', '/api/estadisticas')
+    ocupada.getresponse().read()
+    en_cola = conectar(server)
+    deadline = time.monotonic() + 5
+    while not server.saturated():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    # Lo que no entra en la cola se rechaza enseguida, sin bloquear el accept
+    assert pedir(server, 'GET', '/api/estadisticas')[0] == 503
+    assert server.rejected == 1
+
+    inicio = time.monotonic()
+    server.shutdown()
+    assert time.monotonic() - inicio < 2
+    ocupada.close()
+    en_cola.close()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests de la cola de mensajes del webhook (orden por teléfono, cola llena y apagado)
+"""
+
+import random
+import threading
+import time
+
+from cola_mensajes import MessageDispatcher
+
+
+def esperar(condicion, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        assert time.monotonic() < limite, 'timeout esperando la condición'
+        time.sleep(0.005)
+
+
+class Anotador:
+    """handler y sender que anotan lo procesado; liberar controla cuándo terminan"""
+
+    def __init__(self, bloquear=False):
+        self.liberar = threading.Event()
+        if not bloquear:
+            self.liberar.set()
+        self.procesados = []
+        self.enviados = []
+        self.lock = threading.Lock()
+
+    def handler(self, texto, telefono):
+        self.liberar.wait()
+        time.sleep(random.random() / 1000)
+        with self.lock:
+            self.procesados.append((telefono, texto))
+        return [texto.upper()]
+
+    def sender(self, telefono, mensajes):
+        with self.lock:
+            self.enviados.append((telefono, mensajes))
+
+
+def test_mismo_telefono_en_orden():
+    anotador = Anotador()
+    dispatcher = MessageDispatcher(anotador.handler, anotador.sender, workers=4, max_queue=1000).start()
+    telefonos = [f'54911{n:04d}' for n in range(12)]
+    for i in range(20):
+        for telefono in telefonos:
+            assert dispatcher.submit(f'm{i}', telefono) is not None
+    dispatcher.stop()
+
+    for telefono in telefonos:
+        assert [t for tel, t in anotador.procesados if tel == telefono] == [f'm{i}' for i in range(20)]
+    assert len(anotador.enviados) == 240 and anotador.enviados[0][1] == [anotador.procesados[0][1].upper()]
+    stats = dispatcher.stats()
+    assert stats['processed'] == stats['enqueued'] == 240 and stats['rejected'] == 0
+
+
+def test_cola_llena_rechaza():
+    anotador = Anotador(bloquear=True)
+    dispatcher = MessageDispatcher(anotador.handler, anotador.sender, workers=1, max_queue=2).start()
+    assert dispatcher.submit('en curso', 'A') is not None
+    esperar(lambda: dispatcher.stats()['in_flight'] == 1)
+    assert dispatcher.submit('uno', 'A') is not None
+    assert dispatcher.submit('dos', 'B') is not None
+    # Lo que el webhook convierte en 503
+    assert dispatcher.submit('tres', 'A') is None
+    assert dispatcher.stats()['rejected'] == 1 and dispatcher.stats()['queue_depth'] == 2
+
+    anotador.liberar.set()
+    dispatcher.stop()
+    assert [t for _, t in anotador.procesados] == ['en curso', 'uno', 'dos']
+
+
+def test_stop_con_la_cola_llena_vacia_y_termina():
+    anotador = Anotador(bloquear=True)
+    dispatcher = MessageDispatcher(anotador.handler, anotador.sender, workers=2, max_queue=4).start()
+    enviados = [dispatcher.submit(f'm{i}', telefono) for telefono in ('A', 'B', 'C', 'D') for i in range(4)]
+    assert None in enviados   # las colas quedaron llenas
+
+    threading.Timer(0.1, anotador.liberar.set).start()
+    inicio = time.monotonic()
+    dispatcher.stop(timeout=5)
+    assert time.monotonic() - inicio < 5
+    assert dispatcher.stats()['workers_alive'] == 0
+    assert len(anotador.procesados) == sum(1 for e in enviados if e is not None)
+    # Detenido ya no acepta mensajes
+    assert dispatcher.submit('tarde', 'A') is None
+
+
+def test_stop_no_se_cuelga_si_un_handler_no_termina():
+    anotador = Anotador(bloquear=True)
+    dispatcher = MessageDispatcher(anotador.handler, anotador.sender, workers=1, max_queue=2).start()
+    dispatcher.submit('trabado', 'A')
+    esperar(lambda: dispatcher.stats()['in_flight'] == 1)
+    dispatcher.submit('uno', 'A')
+    dispatcher.submit('dos', 'A')
+
+    inicio = time.monotonic()
+    dispatcher.stop(timeout=0.2)
+    assert time.monotonic() - inicio < 1
+    anotador.liberar.set()
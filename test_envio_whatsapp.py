@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests del envío por la WhatsApp Cloud API con una sesión HTTP falsa (sin red)
+"""
+
+import json
+import threading
+import time
+
+from envio_whatsapp import WhatsAppSender
+
+
+class Respuesta:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = '{}'
+
+
+class SesionFalsa:
+    """Registra cada POST y responde según el destinatario"""
+
+    def __init__(self, fallas):
+        self.fallas = dict(fallas)   # teléfono -> cantidad de 503 antes de aceptar (-1 = siempre)
+        self.enviados = []           # (momento, teléfono, texto) de los aceptados
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, timeout=None):
+        with self.lock:
+            telefono = json['to']
+            pendientes = self.fallas.get(telefono, 0)
+            if pendientes:
+                self.fallas[telefono] = pendientes - 1
+                return Respuesta(503)
+            self.enviados.append((time.monotonic(), telefono, json['text']['body']))
+            return Respuesta(200)
+
+
+def crear_sender(tmp_path, fallas, **opciones):
+    sender = WhatsAppSender('http://stub', 'PHONE_ID', 'token', workers=1, rate_limit=0,
+                            dead_letter_file=str(tmp_path / 'dead_letter.jsonl'), **opciones)
+    sender.session = SesionFalsa(fallas)
+    return sender
+
+
+def test_reintento_no_bloquea_a_otros_destinatarios(tmp_path):
+    sender = crear_sender(tmp_path, {'A': 2}, max_retries=5)
+    sender._backoff = lambda intento, retry_after=None: 0.4
+    inicio = time.monotonic()
+    sender.start()
+    sender.send('A', ['a1', 'a2'])
+    sender.send('B', ['b1', 'b2'])
+    sender.queues[0].join()
+    sender.stop()
+
+    enviados = sender.session.enviados
+    por_telefono = {t: [texto for _, tel, texto in enviados if tel == t] for t in ('A', 'B')}
+    # Los de B salen enseguida, sin esperar los dos reintentos de A
+    assert por_telefono['B'] == ['b1', 'b2']
+    assert all(momento - inicio < 0.3 for momento, tel, _ in enviados if tel == 'B')
+    # Los de A llegan en orden: a2 espera detrás del reintento de a1
+    assert por_telefono['A'] == ['a1', 'a2']
+    assert [tel for _, tel, _ in enviados] == ['B', 'B', 'A', 'A']
+    assert sender.stats()['sent'] == 4 and sender.stats()['retried'] == 2
+
+
+def test_agotados_los_reintentos_va_al_dead_letter(tmp_path):
+    sender = crear_sender(tmp_path, {'A': -1}, max_retries=2)
+    sender._backoff = lambda intento, retry_after=None: 0.01
+    sender.start()
+    sender.send('A', ['perdido'])
+    sender.send('B', ['entregado'])
+    sender.queues[0].join()
+    sender.stop()
+
+    assert [texto for _, _, texto in sender.session.enviados] == ['entregado']
+    with open(tmp_path / 'dead_letter.jsonl', encoding='utf-8') as f:
+        entradas = [json.loads(linea) for linea in f]
+    assert [(e['to'], e['text']) for e in entradas] == [('A', 'perdido')]
+    assert entradas[0]['error'].startswith('HTTP 503')
+    assert sender.stats()['retried'] == 2 and sender.stats()['dead_lettered'] == 1
+
+
+def test_stop_espera_los_reintentos_pendientes(tmp_path):
+    sender = crear_sender(tmp_path, {'A': 1})
+    sender._backoff = lambda intento, retry_after=None: 0.05
+    sender.start()
+    sender.send('A', ['tarde'])
+    sender.stop()
+    assert [texto for _, _, texto in sender.session.enviados] == ['tarde']
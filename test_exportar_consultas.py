@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests de la exportación de consultas en CSV y .xlsx (sin servidores)
+"""
+
+import csv
+import io
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from exportar_consultas import EXPORT_COLUMNS, filas_consultas, iter_csv, iter_xlsx
+
+NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def consultas(n):
+    return [{'id': f'C{i}', 'fecha': '2025-01-02T10:00:00', 'nombre': f'Ana, "la" {i}', 'telefono': '11',
+             'propiedades_interes': [{'id_temporal': f'P{i}', 'tipo': 'casa', 'precio': 1000 + i},
+                                     {'id_temporal': f'Q{i}', 'titulo': 'Depto\ncon <patio> & más', 'precio': 2.5},
+                                     'no es un dict']}
+            for i in range(n)]
+
+
+def leer_xlsx(data):
+    """Filas de la hoja como listas de (tipo, valor) por celda"""
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        assert {'[Content_Types].xml', 'xl/workbook.xml', 'xl/worksheets/sheet1.xml'} <= set(zf.namelist())
+        hoja = ElementTree.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+    filas = []
+    for row in hoja.iterfind('.//x:row', NS):
+        celdas = []
+        for c in row.iterfind('x:c', NS):
+            if c.get('t') == 'inlineStr':
+                celdas.append(('s', c.find('x:is/x:t', NS).text or ''))
+            else:
+                celdas.append(('n', c.find('x:v', NS).text))
+        filas.append(celdas)
+    return filas
+
+
+def test_filas_por_propiedad_de_interes():
+    filas = list(filas_consultas(consultas(2)))
+    assert [f[5] for f in filas] == ['P0', 'Q0', 'P1', 'Q1']
+    assert all(len(f) == len(EXPORT_COLUMNS) for f in filas)
+
+
+def test_csv_en_bloques_equivale_a_uno_solo():
+    filas = list(filas_consultas(consultas(300)))
+    bloques = list(iter_csv(filas, chunk_size=1024))
+    assert len(bloques) > 1
+    leidas = list(csv.reader(io.StringIO(b''.join(bloques).decode('utf-8'))))
+    assert leidas[0] == EXPORT_COLUMNS
+    assert leidas[1:] == [[str(v) for v in f] for f in filas]
+    assert b''.join(bloques) == b''.join(iter_csv(filas, chunk_size=10 ** 9))
+
+
+def test_xlsx_valido_con_numeros_y_texto_escapado():
+    filas = list(filas_consultas(consultas(300)))
+    bloques = list(iter_xlsx(filas, chunk_size=4096))
+    assert len(bloques) > 1
+    hoja = leer_xlsx(b''.join(bloques))
+    assert hoja[0] == [('s', c) for c in EXPORT_COLUMNS]
+    assert len(hoja) == len(filas) + 1
+    assert hoja[1][9] == ('n', '1000') and hoja[2][9] == ('n', '2.5')
+    assert hoja[2][6] == ('s', 'Depto\ncon <patio> & más')
+    assert hoja[1][2] == ('s', 'Ana, "la" 0')
+
+
+def test_xlsx_valores_no_finitos_y_caracteres_de_control():
+    fila = [float('nan'), float('inf'), float('-inf'), True, None, 'a\x00b\x1fc', 3]
+    data = b''.join(iter_xlsx([fila], columnas=[str(i) for i in range(len(fila))]))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        xml = zf.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    # Ninguna celda numérica con un valor que Excel rechaza
+    assert not re.search(r'<v>(nan|inf|-inf)</v>', xml)
+    assert leer_xlsx(data)[1] == [('s', 'nan'), ('s', 'inf'), ('s', '-inf'), ('s', 'True'),
+                                  ('s', ''), ('s', 'abc'), ('n', '3')]
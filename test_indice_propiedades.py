@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests de los índices del catálogo (sin servidores)
+Verifica el ranking top-k contra un ordenamiento completo y el orden BM25
+"""
+
+import math
+import random
+
+from benchmark_chatbot import generar_propiedades
+from indice_propiedades import PropertyIndex, TextIndex, rank
+
+
+def _ranking_completo(columns, weights, candidatos, constante):
+    """Referencia: puntúa todo y ordena estable por puntaje (empates en orden de id)"""
+    ids = sorted(candidatos) if candidatos is not None else sorted(
+        {doc_id for columna in columns.values() for doc_id in columna})
+    puntuados = []
+    for doc_id in ids:
+        puntaje = constante + sum(weights.get(senal, 0) * columna.get(doc_id, 0)
+                                  for senal, columna in columns.items())
+        if puntaje > 0:
+            puntuados.append((doc_id, puntaje))
+    puntuados.sort(key=lambda item: item[1], reverse=True)
+    return puntuados
+
+
+def test_rank_top_k_igual_al_ordenamiento_completo():
+    r = random.Random(7)
+    weights = {'barrio': 10, 'tipo': 8, 'amenity': 2}
+    for _ in range(200):
+        total = r.randint(0, 60)
+        # Valores enteros chicos: muchos empates
+        columns = {senal: {doc_id: r.randint(0, 2) for doc_id in r.sample(range(total), r.randint(0, total))}
+                   for senal in weights}
+        candidatos = set(r.sample(range(total), r.randint(0, total))) if r.random() < 0.5 else None
+        constante = r.choice([0, 0, 5])
+        esperado = _ranking_completo(columns, weights, candidatos, constante)
+        for limit in (None, 0, 1, 3, 10, total, total + 5):
+            top, cantidad = rank(columns, weights, candidatos, constante, limit)
+            assert cantidad == len(esperado)
+            assert top == (esperado if limit is None else esperado[:limit])
+
+
+def test_rank_empates_respetan_el_orden_del_catalogo():
+    columns = {'barrio': {doc_id: 1 for doc_id in (9, 4, 7, 1, 3)}}
+    # Candidatos desordenados (un set puede iterar en cualquier orden)
+    top, total = rank(columns, {'barrio': 10}, [9, 4, 7, 1, 3], limit=3)
+    assert total == 5
+    assert top == [(1, 10), (3, 10), (4, 10)]
+
+
+def test_rank_descarta_puntaje_cero():
+    top, total = rank({'tipo': {0: 1}}, {'tipo': 8}, range(4))
+    assert top == [(0, 8)]
+    assert total == 1
+
+
+def test_bm25_puntaje_de_la_formula():
+    docs = ['pileta pileta terraza', 'pileta', 'terraza amplia luminosa con parrilla', 'cochera']
+    indice = TextIndex(docs)
+    promedio = sum(len(d.split()) for d in docs) / len(docs)
+    idf = math.log(1 + (4 - 2 + 0.5) / (2 + 0.5))
+    scores = indice.score(['pileta'])
+    for doc_id, tf in ((0, 2), (1, 1)):
+        norm = 1.2 * (1 - 0.75 + 0.75 * len(docs[doc_id].split()) / promedio)
+        assert math.isclose(scores[doc_id], idf * tf * 2.2 / (tf + norm))
+    assert set(scores) == {0, 1}
+
+
+def test_bm25_orden():
+    indice = TextIndex([
+        'departamento con terraza',                                    # 0: corto
+        'departamento con terraza y vista abierta a la plaza central',  # 1: largo
+        'terraza terraza departamento',                                # 2: tf alto
+        'departamento en esquina',                                     # 3: sin el término
+        'departamento con quincho',                                    # 4: término raro
+    ])
+    scores = indice.score(['terraza'])
+    # Más repeticiones primero; a igual tf, el documento más corto
+    assert sorted(scores, key=scores.get, reverse=True) == [2, 0, 1]
+    assert 3 not in scores
+    # Un término raro pesa más que uno que aparece en casi todos
+    assert indice.idf('quincho') > indice.idf('terraza') > indice.idf('departamento')
+    permitidos = indice.score(['terraza'], permitidos={1, 3})
+    assert set(permitidos) == {1} and permitidos[1] == scores[1]
+
+
+def test_texto_scores_con_memo_igual_sin_memo():
+    index = PropertyIndex(list(generar_propiedades(300, seed=3)))
+    memo = {}
+    for texto in ('departamento luminoso con terraza', 'casa reciclada con quincho y parrilla',
+                  'terraza', 'luminoso amplio departamento con terraza'):
+        for permitidos in (None, set(range(0, 300, 2))):
+            assert index.texto_scores(texto, permitidos, memo) == index.texto_scores(texto, permitidos)
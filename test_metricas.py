@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests de las métricas en memoria y su exportación en formato Prometheus
+"""
+
+import pytest
+
+import metricas
+from metricas import Registry, _Metric
+
+
+def test_subclase_sin_nuevo_falla_al_crearse():
+    class SinSeries(_Metric):
+        tipo = 'gauge'
+
+        def render(self):
+            return []
+
+    with pytest.raises(TypeError):
+        SinSeries('x', 'ayuda')
+    with pytest.raises(TypeError):
+        _Metric('x', 'ayuda')
+
+
+def test_contador_e_histograma_en_texto():
+    registry = Registry()
+    pedidos = metricas.counter('pedidos_total', 'Pedidos', ['ruta'], registry=registry)
+    latencia = metricas.histogram('latencia_seconds', 'Latencia', buckets=(0.1, 1), registry=registry)
+    pedidos.labels('/a').inc()
+    pedidos.inc(2, ruta='/b')
+    latencia.labels().observe(0.05)
+    latencia.labels().observe(0.5)
+
+    texto = registry.render()
+    assert '# TYPE pedidos_total counter' in texto
+    assert 'pedidos_total{ruta="/a"} 1' in texto and 'pedidos_total{ruta="/b"} 2' in texto
+    assert 'latencia_seconds_bucket{le="0.1"} 1' in texto
+    assert 'latencia_seconds_bucket{le="+Inf"} 2' in texto and 'latencia_seconds_count 2' in texto
+    # Registrar de nuevo el mismo nombre devuelve la métrica existente
+    assert metricas.counter('pedidos_total', 'Pedidos', ['ruta'], registry=registry) is pedidos
+    with pytest.raises(ValueError):
+        metricas.histogram('pedidos_total', 'Otro tipo', registry=registry)
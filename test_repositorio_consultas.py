@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests del índice SQLite de consultas: puesta al día con el log y paginación (sin servidores)
+"""
+
+import json
+import sqlite3
+
+import almacen_consultas
+from almacen_consultas import LeadStore
+from repositorio_consultas import LeadRepository
+
+
+def consulta(n):
+    return {'id': f'C{n:05d}', 'nombre': f'Cliente {n}', 'telefono': f'11{n % 3}',
+            'fecha': f'2025-01-{n % 28 + 1:02d}T10:00:00',
+            'propiedades_interes': [{'id_temporal': f'P{n % 4}', 'tipo': 'casa', 'barrio': 'Palermo'}]}
+
+
+def abrir(tmp_path):
+    store = LeadStore(str(tmp_path / 'log'), flush_interval=0, fsync=False, legacy_file=None)
+    repository = LeadRepository(str(tmp_path / 'consultas.sqlite3'))
+    repository.sync_from(store.iter_consultas())
+    store.listeners.append(repository.add_many)
+    return store, repository
+
+
+def ids(repository):
+    return [json.loads(data)['id'] for _, data in repository.iter_json(limit=None)]
+
+
+def test_falla_del_indice_se_recupera_al_reiniciar(tmp_path, monkeypatch):
+    monkeypatch.setattr(almacen_consultas, 'LISTENER_RETRY_DELAY', 0)
+    store, repository = abrir(tmp_path)
+    for n in range(3):
+        store.append(consulta(n))
+
+    # El índice falla siempre: el listener se desconecta en vez de saltear lotes
+    def falla(consultas):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    store.listeners[:] = [falla]
+    store.append(consulta(3))
+    assert store.listeners == [] and store.stats()['detached_listeners'] == 1
+    store.append(consulta(4))
+    store.close()
+    assert ids(repository) == ['C00000', 'C00001', 'C00002'] and repository.log_offset() == 3
+
+    # Al reiniciar se indexa exactamente lo que falta, sin duplicar
+    store, repository = abrir(tmp_path)
+    store.append(consulta(5))
+    store.close()
+    assert ids(repository) == [f'C{n:05d}' for n in range(6)]
+    assert repository.log_offset() == repository.count() == 6
+    assert repository.estadisticas()['total_consultas'] == 6
+
+
+def test_falla_transitoria_se_reintenta(tmp_path, monkeypatch):
+    monkeypatch.setattr(almacen_consultas, 'LISTENER_RETRY_DELAY', 0)
+    store, repository = abrir(tmp_path)
+    fallas = [sqlite3.OperationalError('database is locked')]
+
+    def add_many(consultas):
+        if fallas:
+            raise fallas.pop()
+        repository.add_many(consultas)
+
+    store.listeners[:] = [add_many]
+    for n in range(4):
+        store.append(consulta(n))
+    store.close()
+    assert store.listeners == [add_many] and not store.detached
+    assert ids(repository) == [f'C{n:05d}' for n in range(4)]
+
+
+def test_base_anterior_al_offset(tmp_path):
+    path = str(tmp_path / 'consultas.sqlite3')
+    repository = LeadRepository(path)
+    repository.add_many([consulta(n) for n in range(3)])
+    # Base creada antes de que existiera la tabla estado
+    conn = sqlite3.connect(path)
+    conn.execute('DROP TABLE estado')
+    conn.commit()
+    conn.close()
+
+    repository = LeadRepository(path)
+    assert repository.log_offset() == 3
+    assert repository.sync_from([consulta(n) for n in range(5)]) == 2
+    assert ids(repository) == [f'C{n:05d}' for n in range(5)]
+
+
+def test_rebuild_vuelve_a_indexar_todo(tmp_path):
+    repository = LeadRepository(str(tmp_path / 'consultas.sqlite3'))
+    repository.sync_from([consulta(n) for n in range(4)])
+    assert repository.rebuild([consulta(n) for n in range(4)]) == 4
+    assert repository.count() == repository.log_offset() == 4
+
+
+def test_paginacion_por_cursor_y_filtros(tmp_path):
+    repository = LeadRepository(str(tmp_path / 'consultas.sqlite3'))
+    repository.sync_from([consulta(n) for n in range(25)])
+
+    vistos, cursor = [], None
+    while True:
+        pagina = list(repository.iter_json(limit=10, cursor=cursor))
+        vistos += [json.loads(data)['id'] for _, data in pagina]
+        siguiente = repository.next_cursor(10, cursor=cursor)
+        if siguiente is None:
+            break
+        assert siguiente == pagina[-1][0]
+        cursor = siguiente
+    assert vistos == [f'C{n:05d}' for n in range(25)]
+
+    por_propiedad = [json.loads(d)['id'] for _, d in repository.iter_json(limit=None, property_id='P1')]
+    assert por_propiedad == [f'C{n:05d}' for n in range(25) if n % 4 == 1]
+    por_telefono = [json.loads(d)['id'] for _, d in repository.iter_json(limit=None, telefono='112', hasta='2025-01-10')]
+    assert por_telefono == [f'C{n:05d}' for n in range(25) if n % 3 == 2 and n % 28 + 1 <= 10]
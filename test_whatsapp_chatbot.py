@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Tests del motor del chatbot sobre catálogos sintéticos (sin servidores)
+Ranking, caches, recarga del catálogo, sesiones y búsqueda en lote (POST /search/batch)
+"""
+
+import json
+import os
+import threading
+
+import pytest
+
+# Sin vigilante de catálogo ni workers del webhook al importar la app
+os.environ.setdefault('CATALOG_RELOAD_INTERVAL', '0')
+os.environ.setdefault('WEBHOOK_MODE', 'sync')
+
+import whatsapp_chatbot  # noqa: E402
+from benchmark_chatbot import generar_propiedades  # noqa: E402
+from whatsapp_chatbot import ChatbotAI, SearchQuery, WhatsAppChatbot  # noqa: E402
+
+AMENITY_CAMPOS = {'pileta': ('pileta', 'si'), 'cochera': ('cochera', 'x'), 'balcon': ('balcon', 'x'),
+                  'aire': ('aire_acondicionado', 'si'), 'mascotas': ('acepta_mascotas', 'si')}
+
+
+def escribir(path, propiedades):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(propiedades, f, ensure_ascii=False)
+    return str(path)
+
+
+@pytest.fixture
+def catalogo(tmp_path):
+    return escribir(tmp_path / 'propiedades.json', list(generar_propiedades(400, seed=11)))
+
+
+def busqueda_lineal(propiedades, query):
+    """El recorrido lineal original (sin texto libre, que ahora puntúa BM25)"""
+    resultados = []
+    for propiedad in propiedades:
+        score = 0
+        for barrio in query.barrios or []:
+            if barrio.lower() in propiedad.get('barrio', '').lower():
+                score += 10
+        for tipo in query.tipos or []:
+            if tipo.lower() in propiedad.get('tipo', '').lower():
+                score += 8
+        for operacion in query.operaciones or []:
+            if operacion.lower() in propiedad.get('operacion', '').lower():
+                score += 6
+        filtros_ok = True
+        for campo, minimo, maximo, peso in (
+                ('precio', query.precio_min, query.precio_max, 5),
+                ('ambientes', query.ambientes_min, query.ambientes_max, 4),
+                ('metros_cuadrados', query.metros_min, query.metros_max, 3)):
+            valor = propiedad.get(campo, 0)
+            if (minimo and valor < minimo) or (maximo and valor > maximo):
+                filtros_ok = False
+            if minimo or maximo:
+                score += peso
+        if not filtros_ok:
+            continue
+        for amenity in query.amenities or []:
+            campo, valor = AMENITY_CAMPOS.get(amenity, (None, None))
+            if campo and propiedad.get(campo, '').lower() == valor:
+                score += 2
+        if score > 0:
+            resultados.append((propiedad['id_temporal'], score))
+    resultados.sort(key=lambda item: item[1], reverse=True)
+    return resultados
+
+
+CONSULTAS_ESTRUCTURADAS = [
+    SearchQuery(barrios=['palermo']),
+    SearchQuery(tipos=['departamento'], operaciones=['venta']),
+    SearchQuery(barrios=['palermo', 'belgrano'], tipos=['casa'], amenities=['pileta', 'cochera']),
+    SearchQuery(precio_max=200000),
+    SearchQuery(precio_min=100000, precio_max=300000, tipos=['departamento']),
+    SearchQuery(ambientes_min=2, ambientes_max=3, amenities=['balcon']),
+    SearchQuery(metros_min=50, metros_max=120, operaciones=['alquiler'], barrios=['recoleta']),
+    SearchQuery(precio_min=500000, ambientes_min=4, metros_min=200),
+    SearchQuery(amenities=['mascotas', 'aire', 'expensas']),
+    SearchQuery(precio_max=1),
+]
+
+
+@pytest.mark.parametrize('query', CONSULTAS_ESTRUCTURADAS)
+def test_ranking_igual_al_recorrido_lineal(catalogo, query):
+    ai = ChatbotAI(catalogo)
+    esperado = busqueda_lineal(ai.propiedades, query)
+    for limit in (None, 1, 10):
+        resultados, total = ai.rank_properties(query, limit)
+        assert total == len(esperado)
+        obtenido = [(r.property_id, r.score) for r in resultados]
+        assert obtenido == (esperado if limit is None else esperado[:limit])
+
+
+def test_search_properties_no_modifica_el_catalogo(catalogo):
+    ai = ChatbotAI(catalogo)
+    resultados = ai.search_properties(SearchQuery(barrios=['palermo']), limit=5)
+    assert resultados and all('relevance_score' in p for p in resultados)
+    assert not any('relevance_score' in p for p in ai.propiedades)
+
+
+def test_set_synonyms_recompila_el_matcher(catalogo):
+    ai = ChatbotAI(catalogo)
+    assert ai.parse_query('depto en soho').barrios == []
+    # Reemplazo en el lugar: misma tabla, misma cantidad de sinónimos
+    ai.set_synonyms('barrios', 'palermo', ['palermo', 'soho', 'palermo hollywood', 'palermo viejo'])
+    assert ai.parse_query('depto en soho').barrios == ['palermo']
+    assert ai.parse_query('depto en palermo soho').barrios == ['palermo']
+
+
+def test_tablas_de_sinonimos_de_solo_lectura(catalogo):
+    ai = ChatbotAI(catalogo)
+    assert ai.parse_query('busco un ph').tipos == []
+    # Sin set_synonyms no hay forma de dejar el matcher desactualizado
+    with pytest.raises(TypeError):
+        ai.tipos_synonyms['casa'] = ['casa', 'ph']
+    with pytest.raises((TypeError, AttributeError)):
+        ai.tipos_synonyms['casa'].append('ph')
+    with pytest.raises(ValueError):
+        ai.set_synonyms('colores', 'rojo', ['rojo'])
+
+    ai.set_synonyms('tipos', 'ph', ['ph', 'p.h.'])
+    assert ai.parse_query('busco un ph').tipos == ['ph']
+    assert ai.tipos_synonyms['ph'] == ('ph', 'p.h.') and 'casa' in ai.tipos_synonyms
+
+
+def test_cache_de_resultados_devuelve_lo_mismo_que_sin_cache(catalogo):
+    ai = ChatbotAI(catalogo)
+    query = ai.parse_query('Departamento en Palermo con pileta hasta 300000 USD')
+    primero = ai.rank_properties(query, 10)
+    assert ai.rank_properties(query, 10) == primero
+    assert ai.results_cache.hits == 1
+    # Mensajes que dan la misma consulta canónica comparten la entrada
+    ai.rank_properties(ai.parse_query('departamento  en palermo, con pileta hasta 300000 usd!'), 10)
+    assert ai.results_cache.hits == 2
+    ai.results_cache.clear()
+    assert ai.rank_properties(query, 10) == primero
+
+
+def test_cache_no_se_contamina_al_modificar_lo_devuelto(catalogo):
+    ai = ChatbotAI(catalogo)
+    query = ai.parse_query('casa en belgrano')
+    query.barrios.append('palermo')
+    assert ai.parse_query('casa en belgrano').barrios == ['belgrano']
+    resultados, _ = ai.rank_properties(ai.parse_query('casa en belgrano'), 5)
+    resultados.clear()
+    assert len(ai.rank_properties(ai.parse_query('casa en belgrano'), 5)[0]) == 5
+
+
+def test_recarga_cambia_el_catalogo_entero(tmp_path):
+    propiedades = list(generar_propiedades(50, seed=5))
+    path = escribir(tmp_path / 'propiedades.json', propiedades)
+    ai = ChatbotAI(path)
+    anterior = ai.catalog
+    query = SearchQuery(barrios=['palermo'])
+    resultados, _ = ai.rank_properties(query)
+    vistos = []
+    ai.catalog_listeners.append(lambda catalog: vistos.append((catalog.version, ai.catalog_version)))
+
+    # Catálogo nuevo con otro orden y sin la primera propiedad encontrada
+    borrada = resultados[0].property_id
+    nuevas = [p for p in reversed(propiedades) if p['id_temporal'] != borrada]
+    escribir(tmp_path / 'propiedades.json', nuevas)
+    assert ai.reload_propiedades()
+
+    assert ai.catalog_version == 2 and ai.propiedades == nuevas
+    assert vistos == [(2, 1)]            # los listeners corren antes del reemplazo
+    assert len(ai.results_cache) == 0
+    # La versión anterior sigue completa para quien la haya tomado
+    assert anterior.version == 1 and len(anterior.propiedades) == 50
+    # Resultados de la versión anterior se resuelven por id aunque cambie la posición
+    assert ai.get_property(resultados[0]) is None
+    for resultado in resultados[1:]:
+        assert ai.get_property(resultado)['id_temporal'] == resultado.property_id
+    assert [r.property_id for r in ai.rank_properties(query)[0]] == [
+        p for p, _ in busqueda_lineal(nuevas, query)]
+
+
+def test_recarga_invalida_mantiene_la_version_vigente(tmp_path):
+    path = escribir(tmp_path / 'propiedades.json', list(generar_propiedades(20, seed=5)))
+    ai = ChatbotAI(path)
+    catalogo = ai.catalog
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[{"id_temporal": "A1",')      # archivo a medio escribir
+    assert not ai.reload_propiedades()
+    escribir(tmp_path / 'propiedades.json', {'no': 'es una lista'})
+    assert not ai.reload_propiedades()
+    assert ai.catalog is catalogo and ai.catalog_version == 1
+
+
+def test_busquedas_durante_recargas(tmp_path):
+    chico = list(generar_propiedades(30, seed=1))
+    grande = list(generar_propiedades(300, seed=2))
+    path = escribir(tmp_path / 'propiedades.json', chico)
+    ai = ChatbotAI(path, cache_size=0)
+    errores = []
+    listo = threading.Event()
+
+    def buscar():
+        while not listo.is_set():
+            try:
+                catalog = ai.catalog
+                resultados, total = ai._rank_uncached(catalog, SearchQuery(tipos=['casa']), None)
+                assert total == sum(1 for p in catalog.propiedades if p['tipo'] == 'casa')
+                assert all(catalog.get(r) is not None for r in resultados)
+            except Exception as e:
+                errores.append(e)
+
+    hilos = [threading.Thread(target=buscar) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    for n in range(10):
+        escribir(tmp_path / 'propiedades.json', grande if n % 2 == 0 else chico)
+        assert ai.reload_propiedades()
+    listo.set()
+    for hilo in hilos:
+        hilo.join()
+    assert not errores and ai.catalog_version == 11
+
+
+def test_sesion_numero_mas_y_todas(catalogo):
+    bot = WhatsAppChatbot(catalogo, session_results=10)
+    telefono = '5491100000001'
+    generador = bot.response_generator
+    resultados, total = bot.ai.rank_properties(bot.ai.parse_query('departamento en palermo'), limit=10)
+    assert total > 6 and len(resultados) == 10
+    propiedades = [bot.ai.get_property(r) for r in resultados]
+
+    respuesta = bot.reply('departamento en palermo', telefono)
+    assert respuesta == [generador.format_search_results_message(propiedades[:3], 'departamento en palermo', total,
+                                                                 disponibles=10)]
+
+    # Un número muestra el detalle del resultado guardado
+    assert bot.reply('2', telefono) == [generador.format_property_message(propiedades[1])]
+    assert bot.reply('#10.', telefono) == [generador.format_property_message(propiedades[9])]
+    assert bot.reply('11', telefono) == [generador.format_invalid_option_message(10)]
+
+    # 'Más' avanza de a una página sin modificar la sesión guardada
+    sesion = bot.sessions.get(telefono)
+    assert bot.reply('Más', telefono) == [generador.format_search_results_message(
+        propiedades[3:6], 'departamento en palermo', total, start=4, disponibles=10)]
+    assert sesion.cursor == 3 and bot.sessions.get(telefono).cursor == 6
+    assert bot.reply('ver mas', telefono) == [generador.format_search_results_message(
+        propiedades[6:9], 'departamento en palermo', total, start=7, disponibles=10)]
+
+    # 'Todas' lista los guardados y después 'Más' ya no tiene qué mostrar
+    assert bot.reply('Todas', telefono) == generador.format_all_results_pages(propiedades, total)
+    assert bot.reply('mas', telefono) == [generador.format_no_more_results_message(10, total)]
+
+
+def test_mas_no_promete_resultados_que_no_se_guardaron(tmp_path):
+    bot = WhatsAppChatbot(escribir(tmp_path / 'propiedades.json', list(generar_propiedades(2000, seed=3))))
+    telefono = '5491100000003'
+    _, total = bot.ai.rank_properties(bot.ai.parse_query('departamento'))
+    assert total > bot.session_results == 50
+
+    respuesta = bot.reply('departamento', telefono)[0]
+    assert f'Encontré {total} propiedades' in respuesta
+    assert 'Y 47 propiedades más' in respuesta and f'primeras 50 de {total}' in respuesta
+
+    # Cada 'Más' anuncia exactamente los que quedan por mostrar
+    mostradas = 3
+    while mostradas < 50:
+        respuesta = bot.reply('Más', telefono)[0]
+        mostradas = min(mostradas + 3, 50)
+        if mostradas < 50:
+            assert f'Y {50 - mostradas} propiedades más' in respuesta
+        else:
+            assert 'propiedades más' not in respuesta
+    final = bot.reply('Más', telefono)[0]
+    assert f'primeras 50 de {total}' in final and 'Afiná tu búsqueda' in final
+
+
+def test_sesiones_separadas_por_telefono(catalogo):
+    bot = WhatsAppChatbot(catalogo)
+    bot.reply('casa en belgrano', '1')
+    bot.reply('departamento en recoleta', '2')
+    detalle = bot.reply('1', '1')[0]
+    assert detalle == bot.response_generator.format_property_message(
+        bot.ai.get_property(bot.sessions.get('1').results[0]))
+    assert detalle != bot.reply('1', '2')[0]
+    # Sin búsqueda previa un número es una búsqueda nueva
+    assert bot.sessions.get('3') is None
+    bot.reply('1', '3')
+
+
+def test_busqueda_sin_resultados_descarta_la_sesion(catalogo):
+    bot = WhatsAppChatbot(catalogo)
+    telefono = '5491100000002'
+    bot.reply('departamento en palermo', telefono)
+    sesion = bot.sessions.get(telefono)
+    detalle_anterior = [bot.response_generator.format_property_message(bot.ai.get_property(sesion.results[0]))]
+    assert bot.reply('1', telefono) == detalle_anterior
+    respuesta = bot.reply('casa hasta 1 usd', telefono)
+    assert respuesta == [bot.response_generator.format_no_results_message('casa hasta 1 usd')]
+    assert bot.sessions.get(telefono) is None
+    # '1' ya no responde sobre la búsqueda anterior
+    assert bot.reply('1', telefono) != detalle_anterior
+
+
+@pytest.fixture
+def api(catalogo, monkeypatch):
+    bot = WhatsAppChatbot(catalogo)
+    monkeypatch.setattr(whatsapp_chatbot, 'chatbot', bot)
+    return whatsapp_chatbot.app.test_client(), bot
+
+
+@pytest.mark.parametrize('body, status', [
+    (None, 400),
+    ([], 400),
+    ({}, 400),
+    ({'queries': []}, 400),
+    ({'queries': 'casa'}, 400),
+    ({'queries': ['casa', 3]}, 400),
+    ({'queries': ['casa'], 'filters': ['palermo']}, 400),
+    ({'queries': ['casa'], 'filters': {'color': 'rojo'}}, 400),
+    ({'queries': ['casa'], 'limit': 'diez'}, 400),
+])
+def test_search_batch_valida_el_body(api, body, status):
+    client, _ = api
+    respuesta = client.post('/search/batch', json=body) if body is not None else client.post(
+        '/search/batch', data='no es json', content_type='application/json')
+    assert respuesta.status_code == status and 'error' in respuesta.get_json()
+
+
+def test_search_batch_limita_la_cantidad_de_consultas(api, monkeypatch):
+    client, _ = api
+    monkeypatch.setattr(whatsapp_chatbot, 'SEARCH_BATCH_MAX', 3)
+    assert client.post('/search/batch', json={'queries': ['casa'] * 4}).status_code == 413
+    assert client.post('/search/batch', json={'queries': ['casa'] * 3}).status_code == 200
+
+
+def test_search_batch_igual_a_search(api):
+    client, bot = api
+    consultas = ['casa en belgrano', 'departamento 3 ambientes', 'casa en belgrano', 'ph con patio']
+    respuesta = client.post('/search/batch', json={'queries': consultas, 'limit': 10})
+    assert respuesta.status_code == 200
+    data = respuesta.get_json()
+    assert data['catalog_version'] == bot.ai.catalog_version and data['total_queries'] == 4
+    for consulta, lote in zip(consultas, data['results']):
+        individual = client.get('/search', query_string={'q': consulta}).get_json()
+        assert lote == individual
+
+
+def test_search_batch_aplica_los_filtros_a_todas(api):
+    client, bot = api
+    filtros = {'barrio': 'palermo', 'precio_max': 300000}
+    data = client.post('/search/batch', json={'queries': ['casa', 'departamento'], 'filters': filtros,
+                                              'limit': 50}).get_json()
+    por_id = {p['id_temporal']: p for p in bot.ai.propiedades}
+    assert any(lote['results'] for lote in data['results'])
+    for lote in data['results']:
+        for resultado in lote['results']:
+            propiedad = por_id[resultado['id']]
+            assert 'palermo' in propiedad['barrio'].lower() and propiedad['precio'] <= 300000
+
+
+def test_search_batch_usa_una_sola_version_del_catalogo(api, monkeypatch):
+    client, bot = api
+    propiedades = list(bot.ai.propiedades)
+    original = bot.ai.search_batch
+    vistas = []
+
+    def buscar_y_recargar(*args, **kwargs):
+        lote = original(*args, **kwargs)
+        # Recarga entre el ranking y el armado de la respuesta, sin la primera encontrada
+        vistas.append(lote[0][1][0].property_id)
+        nuevas = [p for p in reversed(propiedades) if p['id_temporal'] != vistas[0]]
+        escribir(bot.ai.propiedades_file, nuevas)
+        assert bot.ai.reload_propiedades()
+        return lote
+
+    monkeypatch.setattr(bot.ai, 'search_batch', buscar_y_recargar)
+    data = client.post('/search/batch', json={'queries': ['casa en palermo'], 'limit': 5}).get_json()
+    assert bot.ai.catalog_version == 2
+    assert data['catalog_version'] == 1
+    ids = [r['id'] for r in data['results'][0]['results']]
+    assert ids[0] == vistas[0] and len(ids) == 5
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Vigilancia de propiedades.json para recargar el catálogo sin reiniciar
+Hace polling del mtime en un hilo de fondo y llama a un callback al detectar cambios
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Optional, Tuple
+
+import registro
+
+logger = registro.get_logger('vigilante_catalogo')
+
+
+class FileWatcher:
+    """Detecta cambios de un archivo por mtime/tamaño y ejecuta un callback"""
+
+    def __init__(self, path: str, callback: Callable[[], bool], interval: float = 5.0):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self._signature = self._stat()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        """Firma del archivo (None si no existe)"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def check(self) -> bool:
+        """Verifica una vez si el archivo cambió; devuelve True si se recargó"""
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        # Se registra la firma aunque la recarga falle: un JSON roto no se
+        # reintenta hasta que el archivo vuelva a cambiar
+        self._signature = signature
+        return bool(self.callback())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                registro.log_event(logger, 'watch_failed', logging.ERROR, path=self.path, error=str(e))
+
+    def start(self) -> 'FileWatcher':
+        """Inicia el hilo de vigilancia (daemon)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='catalog-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Detiene el hilo de vigilancia"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
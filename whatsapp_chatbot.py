@@ -15,14 +15,42 @@ Fecha: 2025-11-22
 """
 
 import json
+import logging
 import re
 import os
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
-from flask import Flask, request, jsonify
+from types import MappingProxyType
+from typing import Callable, List, Dict, Any, Mapping, Optional, Tuple
+from dataclasses import dataclass, replace
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 
+import metricas
+import registro
+from perfilado import PROFILE_DIR, PROFILE_HEADER, SUMMARY_PATH, RequestProfiler
+from cache_consultas import LRUCache
+from cola_mensajes import MessageDispatcher
+from derivados_imagenes import DERIVADOS_DIR, apply_variants, load_manifest, smallest_variant
+from envio_whatsapp import WhatsAppSender
+from indice_propiedades import DEFAULT_WEIGHTS, CatalogSnapshot, PropertyIndex, SearchResult, rank, tokenize
+from vigilante_catalogo import FileWatcher
+
+logger = registro.get_logger('whatsapp_chatbot')
+
+# Métricas por etapa (se exponen en /metrics)
+STAGE_SECONDS = metricas.histogram('chatbot_stage_seconds', 'Latencia de cada etapa del procesamiento de un mensaje', ['stage'])
+NORMALIZE_SECONDS = STAGE_SECONDS.labels('normalize')
+PARSE_SECONDS = STAGE_SECONDS.labels('parse_query')
+SEARCH_SECONDS = STAGE_SECONDS.labels('search')
+FORMAT_SECONDS = STAGE_SECONDS.labels('format')
+BATCH_SECONDS = STAGE_SECONDS.labels('search_batch')
+MESSAGES = metricas.counter('chatbot_messages_total', 'Mensajes procesados por tipo', ['kind'])
+ZERO_RESULTS = metricas.counter('chatbot_zero_result_queries_total', 'Búsquedas sin resultados')
+ERRORS = metricas.counter('chatbot_errors_total', 'Errores por componente', ['where'])
+
 # =============================================================================
 # 🧠 MOTOR DE IA PARA PROCESAMIENTO DE CONSULTAS
 # =============================================================================
@@ -42,28 +70,138 @@ class SearchQuery:
     amenities: List[str] = None
     texto_libre: str = ""
 
+# Filtros estrictos aceptados por search_batch (POST /search/batch)
+BATCH_FILTERS = ('barrio', 'tipo', 'operacion', 'amenities', 'precio_min', 'precio_max',
+                 'ambientes_min', 'ambientes_max', 'metros_min', 'metros_max')
+
+class SynonymMatcher:
+    """Reconoce todas las entidades de las tablas de sinónimos en una sola pasada"""
+    
+    def __init__(self, tablas: Dict[str, Dict[str, List[str]]], normalizar: Callable[[str], str]):
+        self.tablas = tablas
+        self.entidades = {}  # sinónimo normalizado -> [(categoría, canónico)]
+        
+        for categoria, tabla in tablas.items():
+            for canonico, synonyms in tabla.items():
+                for synonym in synonyms:
+                    clave = normalizar(synonym)
+                    if clave and (categoria, canonico) not in self.entidades.get(clave, []):
+                        self.entidades.setdefault(clave, []).append((categoria, canonico))
+        
+        # Alternativa única, de mayor a menor longitud, con límites de palabra
+        # y plural opcional. El lookahead permite coincidencias solapadas
+        # ('palermo soho' y 'soho' se reportan ambas si existieran).
+        alternativas = '|'.join(re.escape(clave) for clave in sorted(self.entidades, key=len, reverse=True))
+        self.pattern = re.compile(rf'(?<!\w)(?=({alternativas})(?:es|s)?(?!\w))') if alternativas else None
+    
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """Devuelve las entidades canónicas por categoría, en el orden de las tablas"""
+        encontradas = set()
+        if self.pattern is not None:
+            for m in self.pattern.finditer(text):
+                encontradas.update(self.entidades[m.group(1)])
+        
+        return {
+            categoria: [canonico for canonico in tabla if (categoria, canonico) in encontradas]
+            for categoria, tabla in self.tablas.items()
+        }
+
 class ChatbotAI:
     """Motor de inteligencia artificial para procesar consultas WhatsApp"""
     
-    def __init__(self, propiedades_file: str):
+    def __init__(self, propiedades_file: str, weights: Optional[Dict[str, float]] = None,
+                 cache_size: int = 1024, cache_ttl: Optional[float] = 300):
         self.propiedades_file = propiedades_file
-        self.propiedades = self._load_propiedades()
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.catalog = CatalogSnapshot.build(self._load_propiedades(), version=1)
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        # Se llaman con cada versión nueva del catálogo (p. ej. para precalcular respuestas)
+        self.catalog_listeners: List[Callable[[CatalogSnapshot], None]] = []
+        
+        # Caches: texto normalizado -> SearchQuery y consulta canónica -> ranking
+        self.parse_cache = LRUCache(cache_size, cache_ttl)
+        self.results_cache = LRUCache(cache_size, cache_ttl)
+        
         self._load_knowledge_base()
     
+    @property
+    def propiedades(self) -> List[Dict]:
+        """Propiedades de la versión vigente del catálogo"""
+        return self.catalog.propiedades
+    
+    @property
+    def index(self) -> PropertyIndex:
+        """Índices de la versión vigente del catálogo"""
+        return self.catalog.index
+    
+    @property
+    def catalog_version(self) -> int:
+        """Número de versión del catálogo (aumenta en cada recarga)"""
+        return self.catalog.version
+    
+    def reload_propiedades(self) -> bool:
+        """Recarga propiedades.json, reconstruye los índices e invalida las caches
+        
+        El catálogo nuevo se arma completo antes de reemplazar al actual en una
+        sola asignación, así que las búsquedas en curso nunca ven un índice a
+        medio construir. Si el archivo es inválido se mantiene la versión vigente.
+        """
+        with self._reload_lock:
+            try:
+                propiedades = self._read_propiedades()
+            except Exception as e:
+                registro.log_event(logger, 'catalog_reload_failed', logging.ERROR,
+                                   version=self.catalog_version, error=str(e))
+                return False
+            
+            catalog = CatalogSnapshot.build(propiedades, version=self.catalog_version + 1)
+            for listener in self.catalog_listeners:
+                listener(catalog)
+            self.catalog = catalog
+            self.parse_cache.clear()
+            self.results_cache.clear()
+        
+        registro.log_event(logger, 'catalog_reloaded', propiedades=len(propiedades), version=self.catalog_version)
+        return True
+    
+    def start_catalog_watcher(self, interval: float = 5.0) -> FileWatcher:
+        """Vigila propiedades.json y lo recarga en segundo plano cuando cambia"""
+        if self._watcher is None:
+            self._watcher = FileWatcher(self.propiedades_file, self.reload_propiedades, interval)
+        return self._watcher.start()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Contadores de hits/misses de las caches de consultas"""
+        return {
+            'catalog_version': self.catalog_version,
+            'parse': self.parse_cache.stats(),
+            'results': self.results_cache.stats(),
+        }
+    
+    def _read_propiedades(self) -> List[Dict]:
+        """Lee y valida el archivo JSON de propiedades (lanza excepción si es inválido)"""
+        with open(self.propiedades_file, 'r', encoding='utf-8') as f:
+            propiedades = json.load(f)
+        if not isinstance(propiedades, list) or not all(isinstance(p, dict) for p in propiedades):
+            raise ValueError("propiedades.json debe ser una lista de objetos")
+        # Variantes de las fotos (miniatura, mediana, grande) si ya se generaron
+        manifest = load_manifest(os.path.join(os.path.dirname(self.propiedades_file), DERIVADOS_DIR))
+        return apply_variants(propiedades, manifest)
+    
     def _load_propiedades(self) -> List[Dict]:
         """Carga las propiedades desde el archivo JSON"""
         try:
-            with open(self.propiedades_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return self._read_propiedades()
         except Exception as e:
-            print(f"❌ Error cargando propiedades: {e}")
+            registro.log_event(logger, 'catalog_load_failed', logging.ERROR, path=self.propiedades_file, error=str(e))
             return []
     
     def _load_knowledge_base(self):
         """Carga la base de conocimiento para sinónimos y patrones"""
         
         # Sinónimos de barrios (más completos)
-        self.barrios_synonyms = {
+        barrios = {
             'palermo': ['palermo', 'palermo soho', 'palermo hollywood', 'palermo viejo'],
             'microcentro': ['microcentro', 'centro', 'downtown', 'congreso', 'plaza mayo'],
             'recoleta': ['recoleta', 'cementerio', 'alvear', 'ayacucho'],
@@ -79,7 +217,7 @@ class ChatbotAI:
         }
         
         # Sinónimos de tipos de propiedades
-        self.tipos_synonyms = {
+        tipos = {
             'departamento': ['departamento', 'depto', 'apartamento', 'unidad'],
             'casa': ['casa', 'chalet', 'vivienda'],
             'monoambiente': ['monoambiente', '1 ambiente', 'estudio', 'loft'],
@@ -89,13 +227,13 @@ class ChatbotAI:
         }
         
         # Sinónimos de operaciones
-        self.operaciones_synonyms = {
+        operaciones = {
             'venta': ['venta', 'comprar', 'compra', 'vendo'],
             'alquiler': ['alquiler', 'alquilar', 'renta', 'rentar']
         }
         
         # Sinónimos de amenities
-        self.amenities_synonyms = {
+        amenities = {
             'pileta': ['pileta', 'piscina', 'pool', 'natación'],
             'cochera': ['cochera', 'garage', 'estacionamiento', 'auto'],
             'balcon': ['balcón', 'balcon', 'terraza', 'balcon privado'],
@@ -103,6 +241,61 @@ class ChatbotAI:
             'mascotas': ['acepta mascotas', 'mascotas', 'pet friendly', 'pets'],
             'expensas': ['expensas', 'expensas bajas', 'sin expensas']
         }
+        
+        # Las tablas solo cambian con set_synonyms: afuera se ven de solo lectura
+        self._synonyms = {
+            categoria: {canonico: tuple(synonyms) for canonico, synonyms in tabla.items()}
+            for categoria, tabla in (('barrios', barrios), ('tipos', tipos),
+                                     ('operaciones', operaciones), ('amenities', amenities))
+        }
+        self._kb_version = 0
+        self.invalidate_matcher()
+    
+    @property
+    def barrios_synonyms(self) -> Mapping[str, Tuple[str, ...]]:
+        """Sinónimos de barrios (solo lectura: se cambian con set_synonyms)"""
+        return MappingProxyType(self._synonyms['barrios'])
+    
+    @property
+    def tipos_synonyms(self) -> Mapping[str, Tuple[str, ...]]:
+        """Sinónimos de tipos de propiedad (solo lectura: se cambian con set_synonyms)"""
+        return MappingProxyType(self._synonyms['tipos'])
+    
+    @property
+    def operaciones_synonyms(self) -> Mapping[str, Tuple[str, ...]]:
+        """Sinónimos de operaciones (solo lectura: se cambian con set_synonyms)"""
+        return MappingProxyType(self._synonyms['operaciones'])
+    
+    @property
+    def amenities_synonyms(self) -> Mapping[str, Tuple[str, ...]]:
+        """Sinónimos de amenities (solo lectura: se cambian con set_synonyms)"""
+        return MappingProxyType(self._synonyms['amenities'])
+    
+    def invalidate_matcher(self):
+        """Descarta el matcher compilado y las consultas ya analizadas
+        
+        set_synonyms la llama en cada cambio; el matcher se vuelve a compilar
+        en el próximo uso.
+        """
+        self._kb_version += 1
+        self._matcher = None
+        self.parse_cache.clear()
+    
+    def set_synonyms(self, categoria: str, canonico: str, synonyms: List[str]):
+        """Reemplaza los sinónimos de una entidad ('barrios', 'tipos', 'operaciones' o 'amenities')"""
+        if categoria not in self._synonyms:
+            raise ValueError(f"Categoría desconocida: {categoria}")
+        # Copia nueva: un matcher en uso sigue viendo las tablas con las que se compiló
+        tabla = {**self._synonyms[categoria], canonico: tuple(synonyms)}
+        self._synonyms = {**self._synonyms, categoria: tabla}
+        self.invalidate_matcher()
+    
+    def _get_matcher(self) -> SynonymMatcher:
+        """Devuelve el matcher compilado (se arma de nuevo tras invalidate_matcher)"""
+        matcher = self._matcher
+        if matcher is None:
+            matcher = self._matcher = SynonymMatcher(self._synonyms, self._normalize_text)
+        return matcher
     
     def _normalize_text(self, text: str) -> str:
         """Normaliza el texto para mejor procesamiento"""
@@ -128,45 +321,61 @@ class ChatbotAI:
     
     def _detect_amenities(self, text: str) -> List[str]:
         """Detecta amenidades mencionadas en el texto"""
-        detected_amenities = []
-        
-        for amenity, synonyms in self.amenities_synonyms.items():
-            for synonym in synonyms:
-                if synonym in text:
-                    detected_amenities.append(amenity)
-                    break
-        
-        return detected_amenities
+        return self._get_matcher().match(text)['amenities']
     
     def parse_query(self, message: str) -> SearchQuery:
         """Parsea un mensaje de WhatsApp en una consulta estructurada"""
-        message = self._normalize_text(message)
+        with PARSE_SECONDS.time():
+            with NORMALIZE_SECONDS.time():
+                message = self._normalize_text(message)
+            
+            return self._copy_query(self._parse_cached(message))
+    
+    def _parse_cached(self, message: str) -> SearchQuery:
+        """Consulta de un mensaje ya normalizado, desde la cache (no modificar)"""
+        key = (message, self._kb_version)
+        query = self.parse_cache.get(key)
+        if query is None:
+            query = self._parse_normalized(message)
+            self.parse_cache.set(key, query)
+        return query
+    
+    @staticmethod
+    def _copy_query(query: SearchQuery) -> SearchQuery:
+        """Copia una consulta para que el valor cacheado no se pueda modificar"""
+        return replace(
+            query,
+            barrios=list(query.barrios or []),
+            tipos=list(query.tipos or []),
+            operaciones=list(query.operaciones or []),
+            amenities=list(query.amenities or []),
+        )
+    
+    @staticmethod
+    def _query_key(query: SearchQuery) -> tuple:
+        """Forma canónica de una consulta (lo único que influye en el ranking)"""
+        return (
+            tuple(query.barrios or ()),
+            tuple(query.tipos or ()),
+            tuple(query.operaciones or ()),
+            tuple(query.amenities or ()),
+            query.precio_min or None, query.precio_max or None,
+            query.ambientes_min or None, query.ambientes_max or None,
+            query.metros_min or None, query.metros_max or None,
+            frozenset(termino for termino in tokenize(query.texto_libre or '') if len(termino) > 3),
+        )
+    
+    def _parse_normalized(self, message: str) -> SearchQuery:
+        """Parsea un mensaje ya normalizado"""
         query = SearchQuery()
         query.texto_libre = message
         
-        # Extraer barrios
-        query.barrios = []
-        for barrio, synonyms in self.barrios_synonyms.items():
-            for synonym in synonyms:
-                if synonym in message:
-                    query.barrios.append(barrio)
-                    break
-        
-        # Extraer tipos
-        query.tipos = []
-        for tipo, synonyms in self.tipos_synonyms.items():
-            for synonym in synonyms:
-                if synonym in message:
-                    query.tipos.append(tipo)
-                    break
-        
-        # Extraer operaciones
-        query.operaciones = []
-        for operacion, synonyms in self.operaciones_synonyms.items():
-            for synonym in synonyms:
-                if synonym in message:
-                    query.operaciones.append(operacion)
-                    break
+        # Extraer barrios, tipos, operaciones y amenities en una sola pasada
+        entidades = self._get_matcher().match(message)
+        query.barrios = entidades['barrios']
+        query.tipos = entidades['tipos']
+        query.operaciones = entidades['operaciones']
+        query.amenities = entidades['amenities']
         
         # Extraer números (precios, ambientes, metros)
         numbers = self._extract_numbers(message)
@@ -185,110 +394,213 @@ class ChatbotAI:
                 query.metros_min = min(numbers)
                 query.metros_max = max(numbers)
         
-        # Detectar amenidades
-        query.amenities = self._detect_amenities(message)
-        
         return query
     
-    def search_properties(self, query: SearchQuery) -> List[Dict]:
-        """Busca propiedades basadas en la consulta"""
-        results = []
+    def _collect_features(self, index: PropertyIndex, query: SearchQuery,
+                          permitidos: Optional[set], memo: Optional[Dict] = None) -> Dict[str, Dict[int, float]]:
+        """Arma las columnas de señales (matriz dispersa) de los candidatos
         
-        for propiedad in self.propiedades:
-            score = 0
-            
-            # Buscar por barrio
-            if query.barrios:
-                barrio_normalized = propiedad.get('barrio', '').lower()
-                for barrio_buscado in query.barrios:
-                    if barrio_buscado.lower() in barrio_normalized:
-                        score += 10
-            
-            # Buscar por tipo
-            if query.tipos:
-                tipo_normalized = propiedad.get('tipo', '').lower()
-                for tipo_buscado in query.tipos:
-                    if tipo_buscado.lower() in tipo_normalized:
-                        score += 8
-            
-            # Buscar por operación
-            if query.operaciones:
-                operacion_normalized = propiedad.get('operacion', '').lower()
-                for operacion_buscada in query.operaciones:
-                    if operacion_buscada.lower() in operacion_normalized:
-                        score += 6
-            
-            # Buscar por precio
-            precio = propiedad.get('precio', 0)
-            if query.precio_min and precio < query.precio_min:
-                continue
-            if query.precio_max and precio > query.precio_max:
-                continue
-            if query.precio_min or query.precio_max:
-                score += 5
-            
-            # Buscar por ambientes
-            ambientes = propiedad.get('ambientes', 0)
-            if query.ambientes_min and ambientes < query.ambientes_min:
-                continue
-            if query.ambientes_max and ambientes > query.ambientes_max:
-                continue
-            if query.ambientes_min or query.ambientes_max:
-                score += 4
-            
-            # Buscar por metros
-            metros = propiedad.get('metros_cuadrados', 0)
-            if query.metros_min and metros < query.metros_min:
-                continue
-            if query.metros_max and metros > query.metros_max:
-                continue
-            if query.metros_min or query.metros_max:
-                score += 3
-            
-            # Buscar por amenities
-            if query.amenities:
-                amenities_match = 0
-                for amenity in query.amenities:
-                    if amenity in ['pileta']:
-                        if propiedad.get('pileta', '').lower() == 'si':
-                            amenities_match += 1
-                    elif amenity in ['cochera']:
-                        if propiedad.get('cochera', '').lower() == 'x':
-                            amenities_match += 1
-                    elif amenity in ['balcon']:
-                        if propiedad.get('balcon', '').lower() == 'x':
-                            amenities_match += 1
-                    elif amenity in ['aire']:
-                        if propiedad.get('aire_acondicionado', '').lower() == 'si':
-                            amenities_match += 1
-                    elif amenity in ['mascotas']:
-                        if propiedad.get('acepta_mascotas', '').lower() == 'si':
-                            amenities_match += 1
-                
-                if amenities_match > 0:
-                    score += amenities_match * 2
-            
-            # Buscar coincidencias en texto libre
-            if query.texto_libre:
-                texto_comparar = f"{propiedad.get('titulo', '')} {propiedad.get('descripcion', '')} {propiedad.get('direccion', '')}".lower()
-                palabras = query.texto_libre.split()
-                for palabra in palabras:
-                    if len(palabra) > 3 and palabra in texto_comparar:
-                        score += 1
-            
-            # Solo incluir propiedades con score > 0
-            if score > 0:
-                propiedad['relevance_score'] = score
-                results.append(propiedad)
+        memo guarda los postings ya buscados para reutilizarlos entre consultas
+        de un mismo lote.
+        """
+        columns = {senal: defaultdict(float) for senal in ('barrio', 'tipo', 'operacion', 'amenity')}
+        
+        def postings(buscar, termino):
+            if memo is None:
+                return buscar(termino)
+            key = (buscar.__name__, termino)
+            ids = memo.get(key)
+            if ids is None:
+                ids = memo[key] = buscar(termino)
+            return ids
+        
+        def sumar(senal, ids):
+            if permitidos is not None:
+                ids = ids & permitidos
+            columna = columns[senal]
+            for doc_id in ids:
+                columna[doc_id] += 1
+        
+        # Buscar por barrio, tipo y operación (unión de postings)
+        for barrio_buscado in query.barrios or []:
+            sumar('barrio', postings(index.barrio_ids, barrio_buscado))
+        for tipo_buscado in query.tipos or []:
+            sumar('tipo', postings(index.tipo_ids, tipo_buscado))
+        for operacion_buscada in query.operaciones or []:
+            sumar('operacion', postings(index.operacion_ids, operacion_buscada))
         
-        # Ordenar por relevancia
-        results.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
-        return results
+        # Buscar por amenities
+        for amenity in query.amenities or []:
+            sumar('amenity', postings(index.amenity_ids, amenity))
+        
+        # Buscar coincidencias en texto libre (BM25 sobre palabras completas)
+        if query.texto_libre:
+            columns['texto'] = index.texto_scores(query.texto_libre, permitidos, memo)
+        
+        return columns
+    
+    def rank_properties(self, query: SearchQuery, limit: Optional[int] = None) -> Tuple[List[SearchResult], int]:
+        """Rankea propiedades para la consulta: devuelve (top-k resultados, total)"""
+        with SEARCH_SECONDS.time():
+            catalog = self.catalog
+            key = (catalog.version, self._query_key(query), limit)
+            cached = self.results_cache.get(key)
+            if cached is None:
+                results, total = self._rank_uncached(catalog, query, limit)
+                cached = (tuple(results), total)
+                self.results_cache.set(key, cached)
+        if not cached[1]:
+            ZERO_RESULTS.inc()
+        return list(cached[0]), cached[1]
+    
+    def _rank_uncached(self, catalog: CatalogSnapshot, query: SearchQuery, limit: Optional[int],
+                       candidatos: Optional[set] = None, memo: Optional[Dict] = None) -> Tuple[List[SearchResult], int]:
+        """Rankea sobre una versión fija del catálogo, sin pasar por la cache
+        
+        candidatos restringe el ranking a esos ids (filtros de un lote) y memo
+        comparte búsquedas en los índices entre las consultas del lote.
+        """
+        # Filtros numéricos primero: acotan los candidatos con bisect
+        rangos = ((query.precio_min, query.precio_max),
+                  (query.ambientes_min, query.ambientes_max),
+                  (query.metros_min, query.metros_max))
+        if memo is not None and ('rangos', rangos) in memo:
+            permitidos = memo[('rangos', rangos)]
+        else:
+            permitidos = catalog.index.range_ids(*rangos)
+            if memo is not None:
+                memo[('rangos', rangos)] = permitidos
+        if candidatos is not None:
+            permitidos = candidatos if permitidos is None else permitidos & candidatos
+        if permitidos is not None and not permitidos:
+            return [], 0
+        
+        # Con filtros numéricos todas las propiedades que los cumplan suman puntos
+        constante = 0
+        if query.precio_min or query.precio_max:
+            constante += self.weights['precio']
+        if query.ambientes_min or query.ambientes_max:
+            constante += self.weights['ambientes']
+        if query.metros_min or query.metros_max:
+            constante += self.weights['metros']
+        
+        columns = self._collect_features(catalog.index, query, permitidos, memo)
+        top, total = rank(columns, self.weights, permitidos, constante, limit)
+        
+        results = [
+            SearchResult(doc_id, catalog.propiedades[doc_id].get('id_temporal'), score)
+            for doc_id, score in top
+        ]
+        return results, total
+    
+    def get_property(self, result: SearchResult) -> Optional[Dict]:
+        """Devuelve la propiedad referida por un resultado (None si ya no existe)"""
+        return self.catalog.get(result)
+    
+    def search_properties(self, query: SearchQuery, limit: Optional[int] = None) -> List[Dict]:
+        """Busca propiedades basadas en la consulta (copias con relevance_score, sin mutar el catálogo)"""
+        results, _ = self.rank_properties(query, limit)
+        propiedades = [(self.get_property(result), result.score) for result in results]
+        return [dict(propiedad, relevance_score=score) for propiedad, score in propiedades if propiedad]
+    
+    def filter_ids(self, index: PropertyIndex, filters: Optional[Dict]) -> Optional[set]:
+        """Ids que cumplen filtros estrictos (None si no hay filtros)
+        
+        barrio, tipo y operacion aceptan un valor o una lista (alcanza con uno),
+        amenities exige todas y *_min/*_max acotan precio, ambientes y metros.
+        Lanza ValueError si hay un filtro desconocido o un valor inválido.
+        """
+        if not filters:
+            return None
+        desconocidos = set(filters) - set(BATCH_FILTERS)
+        if desconocidos:
+            raise ValueError(f"Filtros desconocidos: {', '.join(sorted(desconocidos))}")
+        
+        conjuntos = []
+        buscadores = {'barrio': index.barrio_ids, 'tipo': index.tipo_ids, 'operacion': index.operacion_ids}
+        for campo, buscar in buscadores.items():
+            valores = filters.get(campo)
+            if valores:
+                valores = [valores] if isinstance(valores, str) else valores
+                conjuntos.append(set().union(*(buscar(self._normalize_text(str(v))) for v in valores)))
+        amenities = filters.get('amenities') or []
+        for amenity in [amenities] if isinstance(amenities, str) else amenities:
+            conjuntos.append(index.amenity_ids(self._normalize_text(str(amenity))))
+        
+        def numero(clave):
+            valor = filters.get(clave)
+            return float(valor) if valor not in (None, '') else None
+        rangos = index.range_ids(
+            precio=(numero('precio_min'), numero('precio_max')),
+            ambientes=(numero('ambientes_min'), numero('ambientes_max')),
+            metros=(numero('metros_min'), numero('metros_max')),
+        )
+        if rangos is not None:
+            conjuntos.append(rangos)
+        if not conjuntos:
+            return None
+        conjuntos.sort(key=len)
+        return conjuntos[0].intersection(*conjuntos[1:])
+    
+    def search_batch(self, messages: List[str], filters: Optional[Dict] = None, limit: Optional[int] = None,
+                     catalog: Optional[CatalogSnapshot] = None) -> List[Tuple[SearchQuery, List[SearchResult], int]]:
+        """Rankea varias consultas sobre una misma versión del catálogo
+        
+        Los mensajes repetidos se normalizan y analizan una sola vez, las
+        consultas equivalentes se rankean una sola vez, los filtros se resuelven
+        una vez para todo el lote y los postings se comparten entre consultas.
+        Devuelve (consulta, resultados, total) por mensaje, en el mismo orden;
+        las consultas pueden estar compartidas entre mensajes y no se deben modificar.
+        catalog fija la versión (por defecto la actual): quien arma la respuesta
+        debe resolver los resultados con esa misma versión.
+        """
+        with BATCH_SECONDS.time():
+            if catalog is None:
+                catalog = self.catalog
+            candidatos = self.filter_ids(catalog.index, filters)
+            filtros_key = tuple(sorted((k, json.dumps(v, sort_keys=True)) for k, v in (filters or {}).items()))
+            memo: Dict = {}
+            normalizados: Dict[str, str] = {}
+            consultas: Dict[str, SearchQuery] = {}
+            rankings: Dict[tuple, tuple] = {}
+            salida = []
+            for message in messages:
+                normalizado = normalizados.get(message)
+                if normalizado is None:
+                    normalizado = normalizados[message] = self._normalize_text(message)
+                query = consultas.get(normalizado)
+                if query is None:
+                    query = consultas[normalizado] = self._parse_cached(normalizado)
+                
+                # Sin filtros la clave es la misma de rank_properties: se comparte la cache
+                key = (catalog.version, self._query_key(query), limit) + ((filtros_key,) if filtros_key else ())
+                ranking = rankings.get(key)
+                if ranking is None:
+                    ranking = self.results_cache.get(key)
+                    if ranking is None:
+                        results, total = self._rank_uncached(catalog, query, limit, candidatos, memo)
+                        ranking = (tuple(results), total)
+                        self.results_cache.set(key, ranking)
+                    rankings[key] = ranking
+                if not ranking[1]:
+                    ZERO_RESULTS.inc()
+                salida.append((query, list(ranking[0]), ranking[1]))
+        return salida
 
 # =============================================================================
 # 📱 GENERADOR DE RESPUESTAS WHATSAPP
 # =============================================================================
 
+# Largo máximo del cuerpo de un mensaje de texto de WhatsApp
+WHATSAPP_MAX_CHARS = 4096
+
+@dataclass(frozen=True)
+class PropertyFragments:
+    """Partes ya formateadas de una propiedad, listas para unir en una respuesta"""
+    card: str        # Tarjeta de detalle completa
+    summary: str     # Resumen de lista, sin el "*N. " inicial
+    amenities: str   # Bloque de amenities ("" si no tiene)
+
 class WhatsAppResponseGenerator:
     """Genera respuestas formateadas para WhatsApp"""
     
@@ -296,9 +608,46 @@ class WhatsAppResponseGenerator:
         self.contact_info = "📞 +54 11 2536-8595"
         self.company_name = "Dante Propiedades"
         self.website_url = "https://tu-usuario.github.io/tu-repositorio/"
+        self.page_size = 3  # Propiedades por resumen de resultados
+        self._results_footer = (
+            "💬 *Para ver detalles completos, responde:*\n"
+            "- El número de la propiedad (1, 2, 3...)\n"
+            "- 'Todas' para ver todos los resultados\n"
+            "- 'Más' para más opciones\n\n"
+            f"🏢 {self.company_name}\n"
+            f"{self.contact_info}"
+        )
+        # (id de propiedad, versión del catálogo) -> (propiedad, fragmentos)
+        self._fragments: Dict[Tuple[str, int], Tuple[Dict, PropertyFragments]] = {}
+        self._fragments_version = None
     
-    def format_property_message(self, propiedad: Dict) -> str:
-        """Formatea una propiedad para respuesta de WhatsApp"""
+    def precompute(self, catalog: CatalogSnapshot):
+        """Arma los fragmentos de todas las propiedades de una versión del catálogo
+        
+        Las propiedades iguales a las de la versión anterior reutilizan sus
+        fragmentos; las que cambiaron (o son nuevas) se vuelven a formatear.
+        """
+        anteriores = self._fragments
+        fragmentos = {}
+        for propiedad in catalog.propiedades:
+            property_id = str(propiedad.get('id_temporal'))
+            previo = anteriores.get((property_id, self._fragments_version))
+            if previo is not None and (previo[0] is propiedad or previo[0] == propiedad):
+                fragmentos[(property_id, catalog.version)] = (propiedad, previo[1])
+            else:
+                fragmentos[(property_id, catalog.version)] = (propiedad, self._build_fragments(propiedad))
+        # Se reemplaza en una sola asignación: las respuestas en curso ven una versión completa
+        self._fragments, self._fragments_version = fragmentos, catalog.version
+    
+    def fragments(self, propiedad: Dict) -> PropertyFragments:
+        """Fragmentos de la propiedad: precalculados si es la del catálogo vigente"""
+        entrada = self._fragments.get((str(propiedad.get('id_temporal')), self._fragments_version))
+        if entrada is not None and entrada[0] is propiedad:
+            return entrada[1]
+        return self._build_fragments(propiedad)
+    
+    def _build_fragments(self, propiedad: Dict) -> PropertyFragments:
+        """Formatea las partes fijas de una propiedad (tarjeta, resumen y amenities)"""
         titulo = propiedad.get('titulo', 'Propiedad')
         barrio = propiedad.get('barrio', '')
         precio = propiedad.get('precio', 0)
@@ -312,19 +661,7 @@ class WhatsAppResponseGenerator:
         moneda = propiedad.get('moneda_precio', 'USD')
         precio_formatted = f"${precio:,} {moneda}"
         
-        # Crear mensaje
-        message = f"🏠 *{titulo}*\n\n"
-        message += f"📍 *Ubicación:* {barrio}\n"
-        message += f"🏷️ *Precio:* {precio_formatted}\n"
-        message += f"🛏️ *Ambientes:* {ambientes}\n"
-        message += f"📐 *Superficie:* {metros} m²\n"
-        message += f"🏢 *Tipo:* {tipo.title()}\n"
-        message += f"💰 *Operación:* {operacion.title()}\n\n"
-        
-        if direccion:
-            message += f"🗺️ *Dirección:* {direccion}\n\n"
-        
-        # Agregar amenities destacadas
+        # Amenities destacadas
         amenities = []
         if propiedad.get('pileta', '').lower() == 'si':
             amenities.append("🏊 Pileta")
@@ -336,61 +673,148 @@ class WhatsAppResponseGenerator:
             amenities.append("❄️ Aire Acondicionado")
         if propiedad.get('acepta_mascotas', '').lower() == 'si':
             amenities.append("🐕 Acepta Mascotas")
+        amenities_block = "✨ *Amenidades:*\n" + "\n".join(amenities) + "\n\n" if amenities else ""
         
-        if amenities:
-            message += "✨ *Amenidades:*\n" + "\n".join(amenities) + "\n\n"
+        # Tarjeta de detalle completa
+        partes = [
+            f"🏠 *{titulo}*\n\n",
+            f"📍 *Ubicación:* {barrio}\n",
+            f"🏷️ *Precio:* {precio_formatted}\n",
+            f"🛏️ *Ambientes:* {ambientes}\n",
+            f"📐 *Superficie:* {metros} m²\n",
+            f"🏢 *Tipo:* {tipo.title()}\n",
+            f"💰 *Operación:* {operacion.title()}\n\n",
+        ]
+        if direccion:
+            partes.append(f"🗺️ *Dirección:* {direccion}\n\n")
+        partes.append(amenities_block)
         
-        # Agregar descripción breve
+        # Descripción breve y cantidad de fotos
         descripcion = propiedad.get('descripcion', '')
         if descripcion:
-            message += f"📝 *Descripción:* {descripcion[:100]}...\n\n"
-        
-        # Agregar foto principal
+            partes.append(f"📝 *Descripción:* {descripcion[:100]}...\n\n")
         fotos = propiedad.get('fotos', [])
         if fotos:
-            message += f"📸 *Fotos:* {len(fotos)} imágenes disponibles\n\n"
+            partes.append(f"📸 *Fotos:* {len(fotos)} imágenes disponibles\n\n")
         
-        # Agregar CTA
-        message += f"💬 *¿Te interesa?*\n"
-        message += f"Responde con un número para ver más detalles\n\n"
-        message += f"🏢 {self.company_name}\n"
-        message += f"{self.contact_info}"
+        # CTA
+        partes.append("💬 *¿Te interesa?*\n"
+                      "Responde con un número para ver más detalles\n\n"
+                      f"🏢 {self.company_name}\n"
+                      f"{self.contact_info}")
         
-        return message
+        # Resumen para listas numeradas (el número se agrega al armar la lista)
+        summary = (
+            f"{titulo}*\n"
+            f"💰 {precio_formatted} | 📍 {barrio}\n"
+            f"🏠 {ambientes} amb | 📐 {metros} m²\n\n"
+        )
+        return PropertyFragments(card="".join(partes), summary=summary, amenities=amenities_block)
     
-    def format_search_results_message(self, propiedades: List[Dict], query_info: str = "") -> str:
-        """Formatea múltiples resultados de búsqueda"""
+    @metricas.timed(FORMAT_SECONDS)
+    def format_property_message(self, propiedad: Dict) -> str:
+        """Formatea una propiedad para respuesta de WhatsApp"""
+        return self.fragments(propiedad).card
+    
+    def format_result_summary(self, numero: int, propiedad: Dict) -> str:
+        """Formatea el resumen de una propiedad dentro de una lista numerada"""
+        return f"*{numero}. {self.fragments(propiedad).summary}"
+    
+    @metricas.timed(FORMAT_SECONDS)
+    def format_search_results_message(self, propiedades: List[Dict], query_info: str = "",
+                                      total: Optional[int] = None, start: int = 1,
+                                      disponibles: Optional[int] = None) -> str:
+        """Formatea múltiples resultados de búsqueda
+        
+        total permite pasar solo una parte de los resultados y start indica el
+        número del primero (para las páginas que siguen a 'Más'). disponibles es
+        cuántos se pueden recorrer con 'Más' (los guardados en la sesión).
+        """
         if not propiedades:
             return self.format_no_results_message(query_info)
+        if total is None:
+            total = len(propiedades)
+        if disponibles is None:
+            disponibles = total
         
-        message = f"🔍 *Resultados de búsqueda*\n\n"
+        partes = ["🔍 *Resultados de búsqueda*\n\n"]
         if query_info:
-            message += f"📋 *Consulta:* {query_info}\n\n"
+            partes.append(f"📋 *Consulta:* {query_info}\n\n")
         
-        message += f"📊 *Encontré {len(propiedades)} propiedades*\n\n"
+        partes.append(f"📊 *Encontré {total} propiedades*\n\n")
         
         # Mostrar máximo 3 propiedades principales
-        max_props = min(3, len(propiedades))
-        for i, propiedad in enumerate(propiedades[:max_props], 1):
-            titulo = propiedad.get('titulo', 'Propiedad')
-            precio = f"${propiedad.get('precio', 0):,} {propiedad.get('moneda_precio', 'USD')}"
-            barrio = propiedad.get('barrio', '')
-            
-            message += f"*{i}. {titulo}*\n"
-            message += f"💰 {precio} | 📍 {barrio}\n"
-            message += f"🏠 {propiedad.get('ambientes', 0)} amb | 📐 {propiedad.get('metros_cuadrados', 0)} m²\n\n"
+        max_props = min(self.page_size, len(propiedades))
+        for i, propiedad in enumerate(propiedades[:max_props], start):
+            partes.append(self.format_result_summary(i, propiedad))
         
-        if len(propiedades) > max_props:
-            message += f"📝 *Y {len(propiedades) - max_props} propiedades más...*\n\n"
+        restantes = min(total, disponibles) - (start - 1) - max_props
+        if restantes > 0:
+            partes.append(f"📝 *Y {restantes} propiedades más...*\n\n")
+        if total > disponibles:
+            partes.append(f"📝 *Se muestran las primeras {disponibles} de {total}. Afiná tu búsqueda para ver otras.*\n\n")
         
-        message += f"💬 *Para ver detalles completos, responde:*\n"
-        message += f"- El número de la propiedad (1, 2, 3...)\n"
-        message += f"- 'Todas' para ver todos los resultados\n"
-        message += f"- 'Más' para más opciones\n\n"
-        message += f"🏢 {self.company_name}\n"
-        message += f"{self.contact_info}"
+        partes.append(self._results_footer)
+        return "".join(partes)
+    
+    @metricas.timed(FORMAT_SECONDS)
+    def format_all_results_pages(self, propiedades: List[Dict], total: Optional[int] = None,
+                                 max_chars: int = WHATSAPP_MAX_CHARS) -> List[str]:
+        """Formatea 'Todas' como una lista de mensajes que respetan el límite de WhatsApp"""
+        if total is None:
+            total = len(propiedades)
         
-        return message
+        footer = ""
+        if total > len(propiedades):
+            footer += f"📝 *Se muestran las primeras {len(propiedades)} de {total}. Afiná tu búsqueda para ver otras.*\n\n"
+        footer += "💬 *Responde con el número de la propiedad para ver el detalle*\n\n"
+        footer += f"🏢 {self.company_name}\n"
+        footer += f"{self.contact_info}"
+        
+        # El encabezado lleva el número de página, que se completa al final;
+        # se reserva lugar para el caso más largo
+        header_template = "📋 *Todas las propiedades ({pagina}/{paginas})*\n\n"
+        header_len = len(header_template.format(pagina=total, paginas=total))
+        
+        bloques = []
+        actual = ""
+        for i, propiedad in enumerate(propiedades, 1):
+            item = self.format_result_summary(i, propiedad)[:max_chars - header_len - len(footer)]
+            if actual and header_len + len(actual) + len(item) + len(footer) > max_chars:
+                bloques.append(actual)
+                actual = ""
+            actual += item
+        bloques.append(actual)
+        
+        paginas = len(bloques)
+        return [
+            header_template.format(pagina=n, paginas=paginas) + bloque + (footer if n == paginas else "")
+            for n, bloque in enumerate(bloques, 1)
+        ]
+    
+    def format_invalid_option_message(self, max_opcion: int) -> str:
+        """Formatea mensaje cuando el número elegido no está en los resultados"""
+        return (
+            f"🤔 *No encontré esa opción*\n\n"
+            f"Responde con un número del 1 al {max_opcion}, 'Más' o 'Todas',\n"
+            f"o escribe una nueva búsqueda.\n\n"
+            f"🏢 {self.company_name}\n"
+            f"{self.contact_info}"
+        )
+    
+    def format_no_more_results_message(self, mostradas: Optional[int] = None, total: Optional[int] = None) -> str:
+        """Formatea mensaje cuando ya se mostraron todos los resultados (o los primeros guardados)"""
+        if mostradas is not None and total is not None and total > mostradas:
+            encabezado = (f"✅ *Ya te mostré las primeras {mostradas} de {total} propiedades*\n\n"
+                          f"Afiná tu búsqueda para ver otras.\n")
+        else:
+            encabezado = "✅ *Ya te mostré todas las propiedades de esta búsqueda*\n\n"
+        return (
+            encabezado +
+            f"Responde con un número para ver el detalle o escribe una nueva búsqueda.\n\n"
+            f"🏢 {self.company_name}\n"
+            f"{self.contact_info}"
+        )
     
     def format_no_results_message(self, query_info: str = "") -> str:
         """Formatea mensaje cuando no hay resultados"""
@@ -433,40 +857,134 @@ class WhatsAppResponseGenerator:
 # 🤖 MANEJADOR PRINCIPAL DE CHATBOT
 # =============================================================================
 
+@dataclass(frozen=True)
+class ConversationSession:
+    """Estado de la última búsqueda de un número de teléfono
+    
+    Es inmutable: cada respuesta guarda una sesión nueva con sessions.set, así
+    dos mensajes simultáneos del mismo número nunca ven un cursor a medio actualizar.
+    """
+    query_info: str
+    results: Tuple[SearchResult, ...]
+    total: int
+    cursor: int = 0  # Cantidad de resultados ya mostrados en resúmenes
+
 class WhatsAppChatbot:
     """Manejador principal del chatbot de WhatsApp"""
     
-    def __init__(self, propiedades_file: str):
+    def __init__(self, propiedades_file: str, max_sessions: int = 10000,
+                 session_ttl: float = 1800, session_results: int = 50):
         self.ai = ChatbotAI(propiedades_file)
         self.response_generator = WhatsAppResponseGenerator()
-        self.conversation_state = {}  # Para manejar estado de conversación
+        # Tarjetas y resúmenes precalculados, rehechos en cada recarga del catálogo
+        self.response_generator.precompute(self.ai.catalog)
+        self.ai.catalog_listeners.append(self.response_generator.precompute)
+        # Sesiones por número: LRU acotada en memoria y con expiración
+        self.sessions = LRUCache(max_sessions, session_ttl)
+        self.session_results = session_results
     
     def process_message(self, message: str, phone_number: str) -> str:
-        """Procesa un mensaje y devuelve la respuesta"""
+        """Procesa un mensaje y devuelve la respuesta como un único texto"""
+        return "\n\n".join(self.reply(message, phone_number))
+    
+    def reply(self, message: str, phone_number: str) -> List[str]:
+        """Procesa un mensaje y devuelve los mensajes de respuesta a enviar"""
         
         # Normalizar mensaje
         message = message.strip()
         
+        # Respuestas a la búsqueda anterior (número, 'Más', 'Todas')
+        session = self.sessions.get(phone_number)
+        if session is not None:
+            follow_up = self._process_follow_up(message, phone_number, session)
+            if follow_up is not None:
+                MESSAGES.labels('follow_up').inc()
+                return follow_up
+        
         # Detectar comando especial
         if self._is_welcome_command(message):
-            return self.response_generator.format_welcome_message()
+            MESSAGES.labels('welcome').inc()
+            return [self.response_generator.format_welcome_message()]
         
+        MESSAGES.labels('search').inc()
         # Parsear consulta
         query = self.ai.parse_query(message)
         
-        # Buscar propiedades
-        resultados = self.ai.search_properties(query)
+        # Buscar propiedades (se guardan los primeros para las respuestas siguientes)
+        resultados, total = self.ai.rank_properties(query, limit=self.session_results)
         
-        # Generar respuesta
+        # Generar respuesta (sin resultados se descarta la búsqueda anterior,
+        # para que un número o 'Más' no responda sobre ella)
         if not resultados:
-            return self.response_generator.format_no_results_message(message)
+            self.sessions.pop(phone_number)
+            return [self.response_generator.format_no_results_message(message)]
+        
+        page_size = self.response_generator.page_size
+        propiedades = self._resolve(resultados[:page_size])
+        if not propiedades:
+            self.sessions.pop(phone_number)
+            return [self.response_generator.format_no_results_message(message)]
+        
+        self.sessions.set(phone_number, ConversationSession(
+            query_info=message,
+            results=tuple(resultados),
+            total=total,
+            cursor=len(propiedades),
+        ))
         
         # Si hay muchos resultados, mostrar resumen
-        if len(resultados) > 1:
-            return self.response_generator.format_search_results_message(resultados, message)
+        if total > 1:
+            return [self.response_generator.format_search_results_message(
+                propiedades, message, total, disponibles=len(resultados))]
         else:
             # Mostrar propiedad completa
-            return self.response_generator.format_property_message(resultados[0])
+            return [self.response_generator.format_property_message(propiedades[0])]
+    
+    def _resolve(self, resultados: List[SearchResult]) -> List[Dict]:
+        """Convierte resultados en propiedades, descartando las que ya no existen"""
+        propiedades = [self.ai.get_property(resultado) for resultado in resultados]
+        return [propiedad for propiedad in propiedades if propiedad]
+    
+    def _process_follow_up(self, message: str, phone_number: str,
+                           session: ConversationSession) -> Optional[List[str]]:
+        """Responde 'Más', 'Todas' o un número usando los resultados guardados
+        
+        Devuelve None si el mensaje no es una respuesta a la búsqueda anterior.
+        """
+        comando = self._normalize_command(message)
+        generator = self.response_generator
+        
+        numero = re.fullmatch(r'#?(\d{1,3})[.)]?', comando)
+        if numero:
+            posicion = int(numero.group(1))
+            if not 1 <= posicion <= len(session.results):
+                return [generator.format_invalid_option_message(len(session.results))]
+            propiedades = self._resolve([session.results[posicion - 1]])
+            if not propiedades:
+                return [generator.format_invalid_option_message(len(session.results))]
+            return [generator.format_property_message(propiedades[0])]
+        
+        if comando in ('mas', 'ver mas', 'mas opciones'):
+            if session.cursor >= len(session.results):
+                return [generator.format_no_more_results_message(len(session.results), session.total)]
+            pagina = session.results[session.cursor:session.cursor + generator.page_size]
+            start = session.cursor + 1
+            self.sessions.set(phone_number, replace(session, cursor=session.cursor + len(pagina)))
+            return [generator.format_search_results_message(
+                self._resolve(pagina), session.query_info, session.total, start=start,
+                disponibles=len(session.results))]
+        
+        if comando in ('todas', 'todos', 'ver todas', 'ver todos'):
+            self.sessions.set(phone_number, replace(session, cursor=len(session.results)))
+            return generator.format_all_results_pages(self._resolve(session.results), session.total)
+        
+        return None
+    
+    @staticmethod
+    def _normalize_command(message: str) -> str:
+        """Normaliza respuestas cortas: minúsculas, sin acentos ni signos"""
+        comando = message.lower().strip().replace('á', 'a')
+        return re.sub(r'[¡!¿?\s]+', ' ', comando).strip()
     
     def _is_welcome_command(self, message: str) -> bool:
         """Detecta si es un comando de bienvenida/ayuda"""
@@ -482,15 +1000,93 @@ class WhatsAppChatbot:
 app = Flask(__name__)
 CORS(app)  # Permitir CORS para desarrollo
 
+# Logs en JSON escritos desde un hilo aparte (LOG_LEVEL, LOG_SAMPLE, LOG_REDACT_PHONES)
+registro.configure_logging()
+
 # Instanciar chatbot
 chatbot = WhatsAppChatbot('propiedades.json')
 
+# Recargar propiedades.json en caliente (CATALOG_RELOAD_INTERVAL=0 lo desactiva)
+CATALOG_RELOAD_INTERVAL = float(os.environ.get('CATALOG_RELOAD_INTERVAL', '5'))
+if CATALOG_RELOAD_INTERVAL > 0:
+    chatbot.ai.start_catalog_watcher(CATALOG_RELOAD_INTERVAL)
+
+# Procesamiento del webhook: 'async' encola y responde 200 enseguida,
+# 'sync' procesa dentro del request (útil para debug)
+WEBHOOK_MODE = os.environ.get('WEBHOOK_MODE', 'async')
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '4'))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', '1000'))
+
+# POST /search/batch: consultas por request y resultados por consulta
+SEARCH_BATCH_MAX = int(os.environ.get('SEARCH_BATCH_MAX', '500'))
+SEARCH_BATCH_MAX_LIMIT = 50
+
+def log_outbound(phone_number: str, responses: List[str]):
+    """Sender por defecto: registra la respuesta generada"""
+    registro.log_event(logger, 'reply_generated', phone_number=phone_number,
+                       messages=len(responses), preview=responses[0][:100] if responses else '')
+
+# Envío por la WhatsApp Cloud API si hay credenciales (WHATSAPP_TOKEN y
+# WHATSAPP_PHONE_NUMBER_ID); si no, las respuestas solo se registran
+whatsapp_sender = WhatsAppSender.from_env()
+if whatsapp_sender is not None:
+    whatsapp_sender.start()
+
+dispatcher = MessageDispatcher(chatbot.reply, whatsapp_sender or log_outbound,
+                               workers=WEBHOOK_WORKERS, max_queue=WEBHOOK_QUEUE_SIZE)
+if WEBHOOK_MODE == 'async':
+    dispatcher.start()
+
+# Latencia y status de cada endpoint
+HTTP_SECONDS = metricas.histogram('http_request_duration_seconds', 'Latencia de los requests HTTP', ['handler'])
+HTTP_REQUESTS = metricas.counter('http_requests_total', 'Requests HTTP por handler y status', ['handler', 'status'])
+
+# Perfilado opt-in (PROFILE_SAMPLE_RATE o header X-Profile con PROFILE_TOKEN)
+profiler = RequestProfiler(os.path.join(PROFILE_DIR, 'chatbot'))
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if request.path != SUMMARY_PATH:
+        g.profile = profiler.begin(f'{request.method} {request.path}', request.headers.get(PROFILE_HEADER),
+                                   query=request.query_string.decode('utf-8', 'replace'))
+
+@app.teardown_request
+def finish_profile(error=None):
+    capture = g.pop('profile', None)
+    if capture is not None:
+        capture.stop(error=repr(error) if error else None)
+
+@app.after_request
+def observe_request(response):
+    handler = request.url_rule.rule if request.url_rule else 'not_found'
+    HTTP_SECONDS.labels(handler).observe(time.perf_counter() - g.request_start)
+    HTTP_REQUESTS.labels(handler, response.status_code).inc()
+    return response
+
+def collect_runtime_metrics():
+    """Caches y cola del webhook, leídas recién al exportar /metrics"""
+    caches = {'parse': chatbot.ai.parse_cache, 'results': chatbot.ai.results_cache, 'sessions': chatbot.sessions}
+    yield ('chatbot_cache_hits_total', 'counter', 'Aciertos de cache',
+           [({'cache': nombre}, cache.hits) for nombre, cache in caches.items()])
+    yield ('chatbot_cache_misses_total', 'counter', 'Fallos de cache',
+           [({'cache': nombre}, cache.misses) for nombre, cache in caches.items()])
+    yield ('chatbot_cache_entries', 'gauge', 'Entradas en cache',
+           [({'cache': nombre}, len(cache)) for nombre, cache in caches.items()])
+    yield ('chatbot_catalog_version', 'gauge', 'Versión del catálogo cargado', [({}, chatbot.ai.catalog_version)])
+    stats = dispatcher.stats()
+    yield ('webhook_queue_depth', 'gauge', 'Mensajes esperando en la cola del webhook', [({}, stats['queue_depth'])])
+    yield ('webhook_messages_total', 'counter', 'Mensajes de la cola del webhook por resultado',
+           [({'result': r}, stats[r]) for r in ('processed', 'failed', 'rejected')])
+
+metricas.REGISTRY.add_collector(collect_runtime_metrics)
+
 @app.route('/webhook', methods=['POST'])
 def whatsapp_webhook():
     """Webhook para recibir mensajes de WhatsApp"""
     try:
         # Obtener datos del webhook (formato genérico)
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
         if not data:
             return jsonify({'error': 'No data received'}), 400
@@ -502,34 +1098,81 @@ def whatsapp_webhook():
         if not message:
             return jsonify({'status': 'No message provided'}), 400
         
-        # Procesar mensaje con el chatbot
-        response = chatbot.process_message(message, phone_number)
+        registro.log_event(logger, 'message_received', phone_number=phone_number, text=message)
         
-        # Aquí iría la lógica para enviar la respuesta via WhatsApp API
-        # Por ahora retornamos la respuesta para debug
+        if WEBHOOK_MODE == 'async':
+            # Encolar y responder enseguida; los workers procesan y envían
+            message_id = dispatcher.submit(message, phone_number)
+            if message_id is None:
+                response = jsonify({'error': 'Queue full, retry later'})
+                response.headers['Retry-After'] = '1'
+                return response, 503
+            return jsonify({
+                'status': 'queued',
+                'message_id': message_id,
+                'phone_number': phone_number
+            })
         
-        print(f"📱 Mensaje recibido de {phone_number}: {message}")
-        print(f"🤖 Respuesta generada: {response[:100]}...")
+        # Procesar mensaje con el chatbot dentro del request
+        responses = chatbot.reply(message, phone_number)
+        response = "\n\n".join(responses)
+        dispatcher.sender(phone_number, responses)
         
         return jsonify({
             'status': 'success',
             'response': response,
+            'responses': responses,
             'phone_number': phone_number
         })
         
     except Exception as e:
-        print(f"❌ Error en webhook: {e}")
+        registro.log_event(logger, 'webhook_error', logging.ERROR, exc_info=True, error=str(e))
+        ERRORS.labels('webhook').inc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/webhook/stats', methods=['GET'])
+def webhook_stats():
+    """Estado de la cola del webhook: profundidad, workers y latencias"""
+    stats = {'mode': WEBHOOK_MODE, **dispatcher.stats()}
+    if whatsapp_sender is not None:
+        stats['outbound'] = whatsapp_sender.stats()
+    return jsonify(stats)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de verificación de salud"""
     return jsonify({
         'status': 'healthy',
         'chatbot': 'active',
+        'cache': chatbot.ai.cache_stats(),
         'timestamp': datetime.now().isoformat()
     })
 
+def search_results_payload(resultados: List[SearchResult], catalog: Optional[CatalogSnapshot] = None) -> List[Dict]:
+    """Resultados de búsqueda como los devuelve la API web (resueltos con catalog o la versión actual)"""
+    if catalog is None:
+        catalog = chatbot.ai.catalog
+    results_data = []
+    for resultado in resultados:
+        prop = catalog.get(resultado)
+        if not prop:
+            continue
+        results_data.append({
+            'id': prop.get('id_temporal'),
+            'titulo': prop.get('titulo'),
+            'barrio': prop.get('barrio'),
+            'precio': prop.get('precio'),
+            'moneda': prop.get('moneda_precio'),
+            'ambientes': prop.get('ambientes'),
+            'metros': prop.get('metros_cuadrados'),
+            'tipo': prop.get('tipo'),
+            'operacion': prop.get('operacion'),
+            'fotos': prop.get('fotos', [])[:3],  # Solo primeras 3 fotos
+            # WhatsApp acepta JPEG/PNG: la variante más chica de al menos 640px
+            'fotos_whatsapp': [smallest_variant(prop, foto, 640, 'jpeg') for foto in prop.get('fotos', [])[:3]]
+        })
+    return results_data
+
 @app.route('/search', methods=['GET'])
 def search_properties_api():
     """API para búsqueda de propiedades (web)"""
@@ -541,35 +1184,75 @@ def search_properties_api():
         # Parsear consulta
         query = chatbot.ai.parse_query(query_text)
         
-        # Buscar propiedades
-        resultados = chatbot.ai.search_properties(query)
-        
-        # Preparar respuesta
-        results_data = []
-        for prop in resultados[:10]:  # Limitar a 10 resultados
-            results_data.append({
-                'id': prop.get('id_temporal'),
-                'titulo': prop.get('titulo'),
-                'barrio': prop.get('barrio'),
-                'precio': prop.get('precio'),
-                'moneda': prop.get('moneda_precio'),
-                'ambientes': prop.get('ambientes'),
-                'metros': prop.get('metros_cuadrados'),
-                'tipo': prop.get('tipo'),
-                'operacion': prop.get('operacion'),
-                'fotos': prop.get('fotos', [])[:3]  # Solo primeras 3 fotos
-            })
+        # Buscar propiedades (limitar a 10 resultados)
+        resultados, total = chatbot.ai.rank_properties(query, limit=10)
         
         return jsonify({
             'query': query_text,
-            'total_results': len(resultados),
-            'results': results_data
+            'total_results': total,
+            'results': search_results_payload(resultados)
         })
         
     except Exception as e:
-        print(f"❌ Error en búsqueda API: {e}")
+        registro.log_event(logger, 'search_error', logging.ERROR, exc_info=True, error=str(e))
+        ERRORS.labels('search').inc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return Response(metricas.REGISTRY.render(), content_type=metricas.CONTENT_TYPE)
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch_api():
+    """Búsqueda de varias consultas en un solo request (CRM y autocompletado)
+    
+    Body: {"queries": [...], "filters": {...}, "limit": 10}. Los filtros son
+    estrictos y valen para todas las consultas (ver BATCH_FILTERS).
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'JSON body required'}), 400
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+            return jsonify({'error': '"queries" must be a non-empty list of strings'}), 400
+        if len(queries) > SEARCH_BATCH_MAX:
+            return jsonify({'error': f'At most {SEARCH_BATCH_MAX} queries per batch'}), 413
+        filters = data.get('filters') or {}
+        if not isinstance(filters, dict):
+            return jsonify({'error': '"filters" must be an object'}), 400
+        # Una sola versión del catálogo para rankear, resolver y reportar,
+        # aunque se recargue mientras se arma la respuesta
+        catalog = chatbot.ai.catalog
+        try:
+            limit = min(max(int(data.get('limit', 10)), 1), SEARCH_BATCH_MAX_LIMIT)
+            lote = chatbot.ai.search_batch([q.strip() for q in queries], filters, limit, catalog)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'catalog_version': catalog.version,
+            'total_queries': len(queries),
+            'results': [
+                {'query': query_text, 'total_results': total, 'results': search_results_payload(resultados, catalog)}
+                for query_text, (_, resultados, total) in zip(queries, lote)
+            ]
+        })
+        
+    except Exception as e:
+        registro.log_event(logger, 'search_batch_error', logging.ERROR, exc_info=True, error=str(e))
+        ERRORS.labels('search_batch').inc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route(SUMMARY_PATH, methods=['GET'])
+def profiles_summary():
+    """Funciones más costosas en las capturas de perfilado (requiere X-Profile)"""
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        return jsonify({'error': 'Not found'}), 404
+    limit = request.args.get('limit', 25, type=int)
+    return jsonify(profiler.summary(limit, request.args.get('sort', 'tottime')))
+
 @app.route('/', methods=['GET'])
 def home():
     """Página principal de la API"""
@@ -578,16 +1261,18 @@ def home():
         'version': '1.0.0',
         'endpoints': {
             '/webhook': 'POST - Webhook de WhatsApp',
+            '/webhook/stats': 'GET - Estado de la cola del webhook',
             '/search': 'GET - Búsqueda de propiedades',
+            '/search/batch': 'POST - Varias búsquedas en un request',
+            '/metrics': 'GET - Métricas (Prometheus)',
             '/health': 'GET - Verificación de salud'
         }
     })
 
 if __name__ == '__main__':
-    print("🚀 Iniciando Chatbot WhatsApp de Dante Propiedades...")
-    print("🤖 Motor de IA cargado")
-    print("📱 Webhook configurado")
-    print("🌐 Servidor listo en puerto 5000")
-    print("=" * 50)
+    # FLASK_DEBUG=1 activa el modo debug (recarga y traza en el navegador); nunca en producción
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    registro.log_event(logger, 'server_starting', port=5000, webhook_mode=WEBHOOK_MODE,
+                       propiedades=len(chatbot.ai.propiedades), debug=debug)
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=debug)
\ No newline at end of file